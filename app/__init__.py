@@ -1,9 +1,17 @@
 from flask import Flask
 from flask_login import LoginManager
-from app.models import db, Usuario
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app.models import db
 from app.routes.auth import auth_bp
 from app.routes.main import main_bp
 from app.routes.admin import admin_bp
+from app.routes.calendario import calendario_bp
+from app.utils.sessao import carregar_usuario
+from app.utils.banco import opcoes_engine
+from app.utils.painel import maximo_conexoes_painel
+from app.utils.metricas import instrumentar_engine
+from app.utils.instrumentacao import instrumentar_app
+from app.cli import registrar_comandos
 import os
 
 def create_app():
@@ -19,6 +27,52 @@ def create_app():
     
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///sistema.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Pool, pre-ping, reciclagem e statement timeout (ver app/utils/banco.py)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    # Séries recorrentes: limite de ocorrências pela quantidade, duração máxima
+    # da regra e quantos dias à frente as ocorrências viram linhas de Reserva
+    app.config['MAX_REPETICOES'] = int(os.environ.get('MAX_REPETICOES', 52))
+    app.config['MAX_DIAS_SERIE'] = int(os.environ.get('MAX_DIAS_SERIE', 730))
+    app.config['SERIES_HORIZONTE_DIAS'] = int(os.environ.get('SERIES_HORIZONTE_DIAS', 60))
+
+    # Reservas concluídas há mais meses que isto vão para reserva_arquivo (flask arquivar-reservas)
+    app.config['ARQUIVO_MESES'] = int(os.environ.get('ARQUIVO_MESES', 12))
+
+    # Feeds .ics: dias no passado incluídos (menos que ARQUIVO_MESES, o feed não lê o arquivo)
+    app.config['CALENDARIO_DIAS'] = int(os.environ.get('CALENDARIO_DIAS', 90))
+
+    # Tamanho máximo do CSV enviado na importação em massa pelo painel (MB)
+    app.config['IMPORTACAO_MAX_MB'] = int(os.environ.get('IMPORTACAO_MAX_MB', 20))
+
+    # Paginação da listagem de reservas
+    app.config['RESERVAS_POR_PAGINA'] = int(os.environ.get('RESERVAS_POR_PAGINA', 50))
+    app.config['MAX_RESERVAS_POR_PAGINA'] = 200
+
+    # Horário de expediente (capacidade das salas nos relatórios)
+    app.config['EXPEDIENTE_INICIO'] = int(os.environ.get('EXPEDIENTE_INICIO', 7))
+    app.config['EXPEDIENTE_FIM'] = int(os.environ.get('EXPEDIENTE_FIM', 19))
+
+    # Duração máxima de cada conexão SSE do painel (o navegador reconecta sozinho),
+    # conexões SSE por worker (acima disto, e com 0, as telas consultam a cada
+    # PAINEL_CONSULTA_SEGUNDOS) e o intervalo dessas consultas
+    app.config['PAINEL_EVENTOS_DURACAO'] = int(os.environ.get('PAINEL_EVENTOS_DURACAO', 300))
+    app.config['PAINEL_SSE_MAX'] = int(os.environ.get('PAINEL_SSE_MAX', maximo_conexoes_painel()))
+    app.config['PAINEL_CONSULTA_SEGUNDOS'] = int(os.environ.get('PAINEL_CONSULTA_SEGUNDOS', 15))
+
+    # Instrumentação por endpoint (opcional) e perfil das requisições lentas
+    app.config['INSTRUMENTACAO'] = os.environ.get('INSTRUMENTACAO') == '1'
+    app.config['PERFIL_LENTAS_MS'] = int(os.environ.get('PERFIL_LENTAS_MS', 0))
+    app.config['PERFIL_FERRAMENTA'] = os.environ.get('PERFIL_FERRAMENTA', 'cprofile')
+    app.config['PERFIL_PASTA'] = os.environ.get('PERFIL_PASTA', os.path.join(app.instance_path, 'perfis'))
+    app.config['METRICAS_TOKEN'] = os.environ.get('METRICAS_TOKEN')
+
+    # Proxies reversos confiáveis na frente da aplicação (no Render, 1). Só esses
+    # saltos do X-Forwarded-For contam: o restante é do cliente e pode ser forjado
+    app.config['PROXY_SALTOS'] = int(os.environ.get('PROXY_SALTOS', 0))
+    if app.config['PROXY_SALTOS']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_SALTOS'],
+                                x_proto=app.config['PROXY_SALTOS'])
 
     # Inicialização das extensões
     db.init_app(app)
@@ -30,23 +84,22 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        return Usuario.query.get(int(user_id))
+        return carregar_usuario(user_id)
         
     # Registro dos Blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(calendario_bp)
+
+    # Criação das tabelas e do admin padrão: `flask --app run init-db` (app/cli.py).
+    # A fábrica não acessa o banco, então importar e subir workers é imediato
+    registrar_comandos(app)
 
     with app.app_context():
-        db.create_all()
-        # Admin padrão
-        if not Usuario.query.filter_by(username='admin').first():
-            print("Criando usuário admin padrão...")
-            admin = Usuario(username='admin', is_admin=True)
-            admin.set_senha('admin123')
-            db.session.add(admin)
-            db.session.commit()
-            
-    return app
+        # Só registra os listeners; nenhuma conexão é aberta aqui
+        instrumentar_engine(db.engine)
+        if app.config['INSTRUMENTACAO']:
+            instrumentar_app(app, db.engine)
 
-app = create_app()
+    return app
@@ -0,0 +1,67 @@
+from datetime import timedelta
+import csv
+import click
+from flask import current_app
+from app.utils.migracoes import inicializar_banco, aplicar_patches
+from app.utils.reservas import materializar_series
+from app.utils.arquivo import arquivar_reservas, corte_arquivo, LOTE_ARQUIVO
+from app.utils.importacao import importar_csv, ErroImportacao, LOTE_IMPORTACAO
+from app.models import db, Usuario
+from app.utils.time_utils import get_now_br_naive
+
+def registrar_comandos(app):
+    @app.cli.command('init-db')
+    @click.option('--sem-patches', is_flag=True, help='Só cria as tabelas e o admin padrão.')
+    def init_db(sem_patches):
+        """Cria as tabelas, o admin padrão e aplica os ajustes de esquema (idempotente)."""
+        inicializar_banco()
+        if not sem_patches:
+            aplicar_patches()
+
+    @app.cli.command('materializar-series')
+    @click.option('--dias', type=int, default=None, help='Horizonte em dias (padrão: SERIES_HORIZONTE_DIAS).')
+    def materializar_series_cmd(dias):
+        """Cria as reservas das séries recorrentes até o horizonte (idempotente; ex.: cron diário)."""
+        dias = dias if dias is not None else current_app.config['SERIES_HORIZONTE_DIAS']
+        total = materializar_series(get_now_br_naive().date() + timedelta(days=dias))
+        print(f"{total} reserva(s) de séries materializada(s).")
+
+    @app.cli.command('arquivar-reservas')
+    @click.option('--lote', type=int, default=LOTE_ARQUIVO, help='Reservas movidas por transação.')
+    def arquivar_reservas_cmd(lote):
+        """Move as reservas concluídas há mais de ARQUIVO_MESES para o arquivo (ex.: cron mensal)."""
+        corte = corte_arquivo(get_now_br_naive(), current_app.config['ARQUIVO_MESES'])
+        total = arquivar_reservas(corte, lote)
+        print(f"{total} reserva(s) terminadas antes de {corte:%d/%m/%Y} arquivada(s).")
+
+    @app.cli.command('importar')
+    @click.argument('tipo', type=click.Choice(['salas', 'usuarios', 'reservas']))
+    @click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--lote', type=int, default=LOTE_IMPORTACAO, help='Linhas validadas e gravadas por transação.')
+    @click.option('--usuario', default='admin', help='Dono das reservas sem a coluna Usuário preenchida.')
+    @click.option('--relatorio', type=click.Path(dir_okay=False), default=None,
+                  help='Grava as linhas com erro (linha;erro) neste CSV.')
+    def importar_cmd(tipo, arquivo, lote, usuario, relatorio):
+        """Importa salas, usuários ou reservas de um CSV (ex.: migração de outro sistema)."""
+        usuario_padrao = db.session.scalar(db.select(Usuario.id).where(Usuario.username == usuario))
+        # utf-8-sig: aceita o BOM gravado pelo Excel e pela exportação de reservas
+        with open(arquivo, encoding='utf-8-sig', newline='') as entrada:
+            try:
+                resultado = importar_csv(tipo, entrada, lote, usuario_padrao=usuario_padrao)
+            except ErroImportacao as e:
+                raise click.ClickException(str(e))
+        print(f"{resultado.importadas} de {resultado.lidas} linha(s) importada(s) em {resultado.duracao:.1f}s "
+              f"({resultado.linhas_por_segundo:.0f} linhas/s); {len(resultado.erros)} com erro.")
+        for linha, mensagem in resultado.erros[:20]:
+            print(f"  linha {linha}: {mensagem}")
+        if len(resultado.erros) > 20:
+            print(f"  ... e mais {len(resultado.erros) - 20}.")
+        if relatorio and resultado.erros:
+            with open(relatorio, 'w', encoding='utf-8-sig', newline='') as saida:
+                writer = csv.writer(saida, delimiter=';')
+                writer.writerow(['Linha', 'Erro'])
+                writer.writerows(resultado.erros)
+            print(f"Relatório de erros gravado em {relatorio}.")
+        if resultado.interrompida:
+            # Código de saída diferente de zero para scripts e cron
+            raise click.ClickException(resultado.aviso_interrupcao())
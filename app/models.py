@@ -1,21 +1,27 @@
+import logging
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from app.utils.time_utils import get_now_br_naive
+from app.utils.recorrencia import Regra, ler_datas, dia_da_semana
+from app.utils.senhas import gerar_hash, verificar_senha
 
 db = SQLAlchemy()
 
+logger = logging.getLogger(__name__)
+
 class Usuario(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
     senha_hash = db.Column(db.String(200), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
 
+    # O hash roda no pool limitado de app.utils.senhas (pode levantar SobrecargaSenhas)
     def set_senha(self, senha):
-        self.senha_hash = generate_password_hash(senha)
+        self.senha_hash = gerar_hash(senha)
 
     def check_senha(self, senha):
-        return check_password_hash(self.senha_hash, senha)
+        return verificar_senha(self.senha_hash, senha)
 
 class Sala(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -24,6 +30,7 @@ class Sala(db.Model):
     ordem = db.Column(db.Integer, default=0)
 
     reservas = db.relationship('Reserva', backref='sala', lazy=True, cascade="all, delete-orphan")
+    series = db.relationship('Serie', backref='sala', lazy=True, cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<Sala {self.nome}>'
@@ -44,5 +51,200 @@ class Reserva(db.Model):
     recorrencia_id = db.Column(db.String(50), nullable=True) # UUID para agrupar séries
     is_recorrente = db.Column(db.Boolean, default=False)
 
+    arquivada = False
+
+    # Índices dos caminhos quentes (conflitos, painel, listagens e séries).
+    # Mantenha em sincronia com INDICES em app/utils/migracoes.py.
+    # AUTOINCREMENT no SQLite: sem ele o maior id, depois de arquivado, seria
+    # reutilizado, e os ids de Reserva e ReservaArquivo deixariam de ser únicos
+    # entre as duas tabelas (UIDs dos feeds, exportação, ordem da listagem).
+    __table_args__ = (
+        db.Index('ix_reserva_sala_inicio_fim', 'sala_id', 'inicio', 'fim'),
+        db.Index('ix_reserva_user_inicio', 'user_id', 'inicio'),
+        db.Index('ix_reserva_inicio_id', 'inicio', 'id'),
+        db.Index('ix_reserva_recorrencia_id', 'recorrencia_id'),
+        {'sqlite_autoincrement': True},
+    )
+
     def __repr__(self):
         return f'<Reserva {self.assunto} em {self.inicio}>'
+
+class ReservaArquivo(db.Model):
+    """Reservas concluídas há mais de ARQUIVO_MESES, movidas de Reserva por `flask arquivar-reservas`.
+
+    Mesmas colunas e ids de Reserva; um id arquivado nunca volta a ser
+    usado em Reserva (sequência no PostgreSQL, AUTOINCREMENT no SQLite).
+    No PostgreSQL a tabela é particionada por mês em `inicio` (as partições
+    são criadas pelo próprio job); no SQLite é uma tabela comum.
+    """
+    __tablename__ = 'reserva_arquivo'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sala_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    assunto = db.Column(db.String(100), nullable=False)
+    nome_solicitante = db.Column(db.String(100), nullable=False)
+    setor = db.Column(db.String(100), nullable=False)
+    telefone = db.Column(db.String(20), nullable=False)
+    inicio = db.Column(db.DateTime, primary_key=True)  # a chave da partição precisa fazer parte da PK
+    fim = db.Column(db.DateTime, nullable=False)
+    data_criacao = db.Column(db.DateTime)
+    recorrencia_id = db.Column(db.String(50), nullable=True)
+    is_recorrente = db.Column(db.Boolean, default=False)
+
+    arquivada = True
+
+    __table_args__ = (
+        db.Index('ix_reserva_arquivo_sala_inicio', 'sala_id', 'inicio'),
+        db.Index('ix_reserva_arquivo_user_inicio', 'user_id', 'inicio'),
+        db.Index('ix_reserva_arquivo_inicio_id', 'inicio', 'id'),
+        {'postgresql_partition_by': 'RANGE (inicio)'},
+    )
+
+    def __repr__(self):
+        return f'<ReservaArquivo {self.assunto} em {self.inicio}>'
+
+# Partição padrão: recebe o que não cair em uma partição mensal (o job cria as mensais antes de mover)
+event.listen(ReservaArquivo.__table__, 'after_create', DDL(
+    "CREATE TABLE reserva_arquivo_padrao PARTITION OF reserva_arquivo DEFAULT"
+).execute_if(dialect='postgresql'))
+
+class Serie(db.Model):
+    """Regra de uma reserva recorrente, gravada uma única vez.
+
+    As ocorrências são expandidas sob demanda (app.utils.recorrencia); só as
+    que caem até `materializado_ate` existem como linhas de Reserva, com
+    `recorrencia_id` igual ao id da série.
+    """
+    id = db.Column(db.String(50), primary_key=True)  # UUID, o mesmo de Reserva.recorrencia_id
+    sala_id = db.Column(db.Integer, db.ForeignKey('sala.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
+    assunto = db.Column(db.String(100), nullable=False)
+    nome_solicitante = db.Column(db.String(100), nullable=False)
+    setor = db.Column(db.String(100), nullable=False)
+    telefone = db.Column(db.String(20), nullable=False)
+
+    # Regra: frequência ('semanal' ou 'mensal'), a cada `intervalo` semanas/meses
+    frequencia = db.Column(db.String(20), nullable=False)
+    intervalo = db.Column(db.Integer, nullable=False, default=1)
+    dias_semana = db.Column(db.String(20), nullable=False, default='')  # '0,2' = segunda e quarta
+    hora_inicio = db.Column(db.Time, nullable=False)
+    hora_fim = db.Column(db.Time, nullable=False)
+    data_inicio = db.Column(db.Date, nullable=False)
+    data_fim = db.Column(db.Date, nullable=False)
+    excecoes = db.Column(db.Text, nullable=False, default='')  # datas ISO canceladas ou em conflito
+
+    materializado_ate = db.Column(db.Date, nullable=False)
+    data_criacao = db.Column(db.DateTime, default=get_now_br_naive)
+
+    __table_args__ = (
+        db.Index('ix_serie_sala_periodo', 'sala_id', 'data_inicio', 'data_fim'),
+        db.Index('ix_serie_user_fim', 'user_id', 'data_fim'),
+    )
+
+    @property
+    def regra(self):
+        return Regra(
+            self.frequencia, self.intervalo, self.dias_gravados(),
+            self.data_inicio, self.data_fim, ler_datas(self.excecoes)
+        )
+
+    def dias_gravados(self, estrito=False):
+        """Dias da semana de `dias_semana` ('0,2' = segunda e quarta).
+
+        Séries gravadas antes da validação podem ter valores fora de 0-6:
+        são ignorados com um aviso no log (leitura) ou, com `estrito`,
+        levantam ValueError (gravação).
+        """
+        dias = []
+        for dia in self.dias_semana.split(','):
+            if not dia:
+                continue
+            try:
+                dias.append(dia_da_semana(dia))
+            except ValueError:
+                if estrito:
+                    raise
+                logger.warning('Série %s: dia da semana inválido %r ignorado', self.id, dia)
+        return dias
+
+    def __repr__(self):
+        return f'<Serie {self.assunto} {self.frequencia} até {self.data_fim}>'
+
+class AlteracaoCalendario(db.Model):
+    """Eventos criados, alterados ou removidos nos feeds .ics (app.utils.calendario).
+
+    As remoções ficam aqui como tombstones. O id crescente é o token `since`
+    da sincronização incremental; sem FKs, para sobreviver à exclusão da
+    sala ou da reserva.
+    """
+    __tablename__ = 'alteracao_calendario'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sala_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    uid = db.Column(db.String(80), nullable=False)        # 'reserva-<id>' ou 'serie-<uuid>'
+    inicio = db.Column(db.DateTime, nullable=False)       # DTSTART, necessário no cancelamento
+    removido = db.Column(db.Boolean, nullable=False, default=False)
+    criado_em = db.Column(db.DateTime, nullable=False, default=get_now_br_naive)
+
+    __table_args__ = (
+        db.Index('ix_alteracao_calendario_sala', 'sala_id', 'id'),
+        db.Index('ix_alteracao_calendario_user', 'user_id', 'id'),
+        db.Index('ix_alteracao_calendario_criado', 'criado_em'),
+    )
+
+    def __repr__(self):
+        return f'<AlteracaoCalendario {self.uid}{" removido" if self.removido else ""}>'
+
+class OcupacaoHora(db.Model):
+    """Agregado de ocupação por dia, hora, sala e setor (mantido por app.utils.relatorios)."""
+    __tablename__ = 'ocupacao_hora'
+
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.Date, nullable=False)
+    hora = db.Column(db.Integer, nullable=False)
+    sala_id = db.Column(db.Integer, nullable=False)
+    setor = db.Column(db.String(100), nullable=False)
+    minutos = db.Column(db.Integer, nullable=False, default=0)      # minutos reservados dentro da hora
+    reservas = db.Column(db.Integer, nullable=False, default=0)     # reservas que começam nesta hora
+    recorrentes = db.Column(db.Integer, nullable=False, default=0)  # ...das quais fazem parte de séries
+    canceladas = db.Column(db.Integer, nullable=False, default=0)   # ocorrências de séries canceladas avulsas
+
+    __table_args__ = (
+        db.UniqueConstraint('data', 'sala_id', 'setor', 'hora', name='uq_ocupacao_hora'),
+    )
+
+    def __repr__(self):
+        return f'<OcupacaoHora {self.data} {self.hora}h sala={self.sala_id}>'
+
+class OcupacaoSerie(db.Model):
+    """Agregado por dia e série recorrente (mantido por app.utils.relatorios)."""
+    __tablename__ = 'ocupacao_serie'
+
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.Date, nullable=False)
+    recorrencia_id = db.Column(db.String(50), nullable=False)
+    sala_id = db.Column(db.Integer, nullable=False)
+    setor = db.Column(db.String(100), nullable=False)
+    recorrentes = db.Column(db.Integer, nullable=False, default=0)  # ocorrências da série gravadas no dia
+    canceladas = db.Column(db.Integer, nullable=False, default=0)   # ...e as canceladas avulsas
+
+    __table_args__ = (
+        db.UniqueConstraint('data', 'recorrencia_id', name='uq_ocupacao_serie'),
+    )
+
+    def __repr__(self):
+        return f'<OcupacaoSerie {self.data} serie={self.recorrencia_id}>'
+
+class Versao(db.Model):
+    """Contadores de versão compartilhados entre os workers (ex.: 'salas').
+
+    Cada gravação relevante incrementa o contador na mesma transação; os
+    caches locais comparam o valor para saber quando se recarregar.
+    """
+    chave = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<Versao {self.chave}={self.valor}>'
@@ -1,11 +1,32 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, Response, abort
 from flask_login import login_required, current_user
-from app.models import db, Usuario, Sala
+from app.models import db, Usuario, Sala, ReservaArquivo, OcupacaoHora, OcupacaoSerie
 from app.utils.decorators import admin_required
+from app.utils.relatorios import relatorio_ocupacao
+from app.utils.catalogo import catalogo_salas, registrar_alteracao_salas
+from app.utils.reservas import invalidar_caches_reservas, registrar_alteracao_reservas
+from app.utils.calendario import registrar_remocao_sala, corte_feed
+from app.utils.sessao import invalidar_usuario
+from app.utils.senhas import SobrecargaSenhas, executor_senhas
+from app.utils.importacao import importar_csv, ErroImportacao, IMPORTADORES, LOTE_IMPORTACAO
+from app.utils.time_utils import get_now_br_naive
+from app.utils.metricas import metricas_pool
+from app.utils.instrumentacao import estatisticas_endpoints, formatar_prometheus
+from datetime import datetime, timedelta
+from sqlalchemy import update, case
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.security import generate_password_hash
+import io
 
 admin_bp = Blueprint('admin', __name__)
 
+@admin_bp.errorhandler(SobrecargaSenhas)
+def senhas_sobrecarregadas(erro):
+    # Criação/alteração de usuário recusada pelo limite de hashes simultâneos
+    db.session.rollback()
+    flash('O sistema está recebendo muitos acessos agora. Tente novamente em instantes.', 'error')
+    return redirect(request.path)
+
 @admin_bp.route('/usuarios', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -48,6 +69,7 @@ def gerenciar_usuarios():
                         usuario.is_admin = is_admin
                         
                     db.session.commit()
+                    invalidar_usuario(usuario.id)
                     flash('Usuário atualizado com sucesso!', 'success')
                 
         elif action == 'delete':
@@ -56,6 +78,7 @@ def gerenciar_usuarios():
             if usuario:
                 db.session.delete(usuario)
                 db.session.commit()
+                invalidar_usuario(usuario.id)
                 flash('Usuário removido com sucesso!', 'success')
                 
     usuarios = Usuario.query.all()
@@ -77,28 +100,144 @@ def gerenciar_salas():
             else:
                 nova_sala = Sala(nome=nome, andar=andar)
                 db.session.add(nova_sala)
+                registrar_alteracao_salas()
                 db.session.commit()
+                catalogo_salas.invalidar()
+                invalidar_caches_reservas()
                 flash('Sala criada com sucesso!', 'success')
                 
         elif action == 'delete':
             sala_id = request.form.get('sala_id')
             sala = Sala.query.get(sala_id)
             if sala:
+                # As reservas da sala saem junto (cascade): salas, reservas e calendário
+                # mudam, nesta ordem (a de versoes.ORDEM_VERSOES)
+                registrar_alteracao_salas()
+                registrar_alteracao_reservas()
+                registrar_remocao_sala(sala.id, corte_feed(get_now_br_naive()))
+                OcupacaoHora.query.filter_by(sala_id=sala.id).delete()
+                OcupacaoSerie.query.filter_by(sala_id=sala.id).delete()
+                ReservaArquivo.query.filter_by(sala_id=sala.id).delete()
                 db.session.delete(sala)
                 db.session.commit()
+                catalogo_salas.invalidar()
+                invalidar_caches_reservas()
                 flash('Sala removida com sucesso!', 'success')
                 
-    salas = Sala.query.order_by(Sala.ordem).all()
-    return render_template('salas.html', salas=salas)
+    return render_template('salas.html', salas=catalogo_salas.todas())
 
 @admin_bp.route('/salas/reordenar', methods=['POST'])
 @login_required
 @admin_required
 def reordenar_salas():
-    order_ids = request.json.get('ordem', [])
-    for index, sala_id in enumerate(order_ids):
-        sala = Sala.query.get(sala_id)
-        if sala:
-            sala.ordem = index
+    try:
+        order_ids = [int(sala_id) for sala_id in request.json.get('ordem', [])]
+    except (TypeError, ValueError):
+        return {'status': 'error', 'message': 'Lista de salas inválida.'}, 400
+
+    # Valida contra as salas existentes: sem IDs desconhecidos nem repetidos
+    existentes = {sala_id for (sala_id,) in db.session.query(Sala.id)}
+    if len(set(order_ids)) != len(order_ids) or not set(order_ids) <= existentes:
+        return {'status': 'error', 'message': 'A lista não corresponde às salas cadastradas.'}, 400
+
+    if order_ids:
+        # Um único UPDATE ... SET ordem = CASE id WHEN ... para todas as salas
+        db.session.execute(
+            update(Sala).where(Sala.id.in_(order_ids)).values(
+                ordem=case({sala_id: index for index, sala_id in enumerate(order_ids)}, value=Sala.id)
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        registrar_alteracao_salas()
     db.session.commit()
+    catalogo_salas.invalidar()
+    invalidar_caches_reservas()
     return {'status': 'success'}, 200
+
+@admin_bp.route('/importar', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def importar():
+    """Importação em massa de salas, usuários ou reservas por upload de CSV."""
+    resultado = None
+    if request.method == 'POST':
+        # Limite só desta rota: o arquivo é lido em fluxo, mas o upload ainda ocupa o worker
+        request.max_content_length = current_app.config['IMPORTACAO_MAX_MB'] * 1024 * 1024
+        try:
+            tipo = request.form.get('tipo')
+            arquivo = request.files.get('arquivo')
+        except RequestEntityTooLarge:
+            flash(f"Arquivo maior que {current_app.config['IMPORTACAO_MAX_MB']} MB. "
+                  "Divida o arquivo ou use o comando flask importar.", 'error')
+            return redirect(url_for('admin.importar'))
+        if tipo not in IMPORTADORES or not arquivo or not arquivo.filename:
+            flash('Escolha o tipo e o arquivo CSV.', 'error')
+            return redirect(url_for('admin.importar'))
+
+        # utf-8-sig: aceita o BOM gravado pelo Excel e pela exportação de reservas
+        texto = io.TextIOWrapper(arquivo.stream, encoding='utf-8-sig', newline='')
+        try:
+            # Hashes de senha limitados à concorrência do worker, como no cadastro
+            resultado = importar_csv(tipo, texto, usuario_padrao=current_user.id,
+                                     concorrencia_senhas=executor_senhas.concorrencia or 1)
+        except ErroImportacao as e:
+            flash(str(e), 'error')
+        else:
+            if resultado.interrompida:
+                flash(resultado.aviso_interrupcao(), 'error')
+            categoria = 'success' if not resultado.erros and not resultado.interrompida else 'error'
+            flash(f"{resultado.importadas} de {resultado.lidas} linha(s) importada(s); "
+                  f"{len(resultado.erros)} com erro.", categoria)
+
+    return render_template('importar.html', resultado=resultado, lote=LOTE_IMPORTACAO)
+
+@admin_bp.route('/relatorios')
+@login_required
+@admin_required
+def relatorios():
+    hoje = get_now_br_naive().date()
+    try:
+        inicio = datetime.strptime(request.args.get('inicio', ''), '%Y-%m-%d').date()
+    except ValueError:
+        inicio = hoje - timedelta(days=29)
+    try:
+        fim = datetime.strptime(request.args.get('fim', ''), '%Y-%m-%d').date()
+    except ValueError:
+        fim = hoje
+    if fim < inicio:
+        inicio, fim = fim, inicio
+    agrupamento = 'mes' if request.args.get('agrupamento') == 'mes' else 'semana'
+
+    expediente = (current_app.config['EXPEDIENTE_INICIO'], current_app.config['EXPEDIENTE_FIM'])
+    dados = relatorio_ocupacao(inicio, fim, agrupamento, expediente)
+    return render_template('relatorios.html', inicio=inicio, fim=fim, agrupamento=agrupamento, **dados)
+
+@admin_bp.route('/metricas/banco')
+@login_required
+@admin_required
+def metricas_banco():
+    """Espera no checkout e rotatividade do pool de conexões deste worker (JSON)."""
+    return metricas_pool.resumo(db.engine.pool)
+
+@admin_bp.route('/desempenho', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def desempenho():
+    """Tempo, SQL e templates por endpoint (deste worker), com INSTRUMENTACAO=1."""
+    if request.method == 'POST':
+        estatisticas_endpoints.limpar()
+        flash('Estatísticas zeradas.', 'success')
+        return redirect(url_for('admin.desempenho'))
+    return render_template('desempenho.html', endpoints=estatisticas_endpoints.resumo(),
+                           pool=metricas_pool.resumo(db.engine.pool),
+                           ativa=current_app.config['INSTRUMENTACAO'])
+
+@admin_bp.route('/metrics')
+def metricas_prometheus():
+    """Métricas no formato do Prometheus. Aceita admin logado ou o Bearer METRICAS_TOKEN."""
+    token = current_app.config['METRICAS_TOKEN']
+    autorizado = token and request.headers.get('Authorization') == f'Bearer {token}'
+    if not autorizado and not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    texto = formatar_prometheus(estatisticas_endpoints.resumo(), metricas_pool.resumo(db.engine.pool))
+    return Response(texto, mimetype='text/plain; version=0.0.4')
@@ -1,6 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from app.models import db, Usuario
+from app.utils.sessao import invalidar_usuario
+from app.utils.senhas import SobrecargaSenhas, limitador_login, precisa_rehash
+from app.utils.calendario import token_feed
+from app.utils.catalogo import catalogo_salas
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -9,11 +13,33 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
+        # Atrás de proxy, o ProxyFix (PROXY_SALTOS) já trouxe o endereço do cliente para remote_addr
+        ip = request.remote_addr
+
+        # Bloqueio antes do hash: tentativas em massa não consomem CPU
+        if limitador_login.bloqueado(username, ip):
+            flash('Muitas tentativas de login. Aguarde alguns minutos e tente novamente.', 'error')
+            return render_template('login.html'), 429
+
         user = Usuario.query.filter_by(username=username).first()
-        
-        if user and user.check_senha(password):
+        try:
+            valida = user is not None and user.check_senha(password)
+        except SobrecargaSenhas:
+            flash('O sistema está recebendo muitos acessos agora. Tente novamente em instantes.', 'error')
+            return render_template('login.html'), 503
+
+        if valida:
+            limitador_login.registrar_sucesso(username)
+            if precisa_rehash(user.senha_hash):
+                # Hash com parâmetros antigos: refeito agora que a senha foi conferida
+                try:
+                    user.set_senha(password)
+                    db.session.commit()
+                except SobrecargaSenhas:
+                    pass  # fica para o próximo login
             login_user(user)
             return redirect(url_for('main.dashboard'))
+        limitador_login.registrar_falha(username, ip)
         flash('Usuário ou senha inválidos', 'error')
     return render_template('login.html')
 
@@ -31,16 +57,29 @@ def perfil():
         nova_senha = request.form.get('nova_senha')
         confirmacao = request.form.get('confirmacao')
         
-        if not current_user.check_senha(senha_atual):
-            flash('Senha atual incorreta.', 'error')
-        elif nova_senha != confirmacao:
-            flash('As novas senhas não coincidem.', 'error')
-        elif len(nova_senha) < 6:
-            flash('A nova senha deve ter pelo menos 6 caracteres.', 'error')
-        else:
-            current_user.set_senha(nova_senha)
-            db.session.commit()
-            flash('Perfil atualizado e senha alterada com sucesso!', 'success')
-            return redirect(url_for('auth.perfil'))
-            
-    return render_template('perfil.html')
+        usuario = db.session.get(Usuario, current_user.id)
+
+        try:
+            if not usuario.check_senha(senha_atual):
+                flash('Senha atual incorreta.', 'error')
+            elif nova_senha != confirmacao:
+                flash('As novas senhas não coincidem.', 'error')
+            elif len(nova_senha) < 6:
+                flash('A nova senha deve ter pelo menos 6 caracteres.', 'error')
+            else:
+                usuario.set_senha(nova_senha)
+                db.session.commit()
+                invalidar_usuario(usuario.id)
+                flash('Perfil atualizado e senha alterada com sucesso!', 'success')
+                return redirect(url_for('auth.perfil'))
+        except SobrecargaSenhas:
+            flash('O sistema está recebendo muitos acessos agora. Tente novamente em instantes.', 'error')
+
+    # Endereços para assinar no Google Agenda/Outlook (o token da URL substitui o login)
+    calendario_usuario = url_for('calendario.feed', token=token_feed('usuario', current_user.id), _external=True)
+    calendarios_salas = [
+        (sala.nome, url_for('calendario.feed', token=token_feed('sala', sala.id), _external=True))
+        for sala in catalogo_salas.por_nome()
+    ]
+    return render_template('perfil.html', calendario_usuario=calendario_usuario,
+                           calendarios_salas=calendarios_salas)
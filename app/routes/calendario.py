@@ -0,0 +1,77 @@
+from flask import Blueprint, Response, request, abort, stream_with_context
+from werkzeug.http import is_resource_modified
+from app.utils.calendario import (FUSO, VERSAO_FEED, ler_token_feed, corte_feed, ultima_alteracao, token_valido,
+                                  eventos_feed, alteracoes_desde, evento_reserva, eventos_series, evento_removido,
+                                  gerar_ics)
+from app.utils.catalogo import catalogo_salas
+from app.utils.sessao import carregar_usuario
+from app.utils.time_utils import get_now_br_naive
+from datetime import datetime
+from itertools import chain
+import hashlib
+
+calendario_bp = Blueprint('calendario', __name__)
+
+@calendario_bp.route('/calendario/<token>.ics')
+def feed(token):
+    """Feed iCalendar de uma sala ou de um usuário, autenticado pelo token assinado da URL.
+
+    Com `since` (o X-Sync-Token de uma resposta anterior) vêm só os eventos
+    alterados desde então, com os removidos como STATUS:CANCELLED. ETag e
+    Last-Modified permitem 304 com uma única consulta indexada ao registro
+    de alterações.
+    """
+    alvo = ler_token_feed(token)
+    if alvo is None:
+        abort(404)
+    tipo, alvo_id = alvo
+    if tipo == 'sala':
+        sala = catalogo_salas.get(alvo_id)
+        if sala is None:
+            abort(404)
+        nome = f'Sala {sala.nome}'
+    else:
+        usuario = carregar_usuario(alvo_id)
+        if usuario is None:
+            abort(404)
+        nome = f'Reservas de {usuario.username}'
+
+    agora = get_now_br_naive()
+    corte = corte_feed(agora)
+    desde = request.args.get('since', 0, type=int)
+
+    # Lida antes dos eventos: uma alteração gravada no meio volta no próximo `since`
+    ultima = ultima_alteracao(tipo, alvo_id)
+    token_sync = ultima.id if ultima else 0
+    if desde and (desde > token_sync or not token_valido(desde)):
+        desde = 0  # token de outro feed ou já podado: feed completo
+
+    etag = hashlib.sha1(repr((VERSAO_FEED, tipo, alvo_id, token_sync, corte, desde)).encode()).hexdigest()[:20]
+    # A janela do feed anda à meia-noite, mesmo sem alterações registradas
+    meia_noite = datetime.combine(agora.date(), datetime.min.time())
+    modificado = FUSO.localize(max(ultima.criado_em, meia_noite) if ultima else meia_noite).replace(microsecond=0)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=modificado):
+        resposta = Response(status=304)
+    else:
+        salas = catalogo_salas.por_id()
+        if desde:
+            reservas, series, removidos = alteracoes_desde(tipo, alvo_id, desde)
+        else:
+            reservas, series = eventos_feed(tipo, alvo_id, corte)
+            removidos = ()
+        eventos = chain(
+            eventos_series(series, salas),
+            (evento_reserva(reserva, salas) for reserva in reservas),
+            (evento_removido(alteracao) for alteracao in removidos),
+        )
+        resposta = Response(stream_with_context(gerar_ics(nome, eventos, token_sync)),
+                            mimetype='text/calendar', headers={
+                                'Content-Disposition': f'inline; filename={tipo}-{alvo_id}.ics'
+                            })
+
+    resposta.set_etag(etag, weak=True)
+    resposta.last_modified = modificado
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    resposta.headers['X-Sync-Token'] = str(token_sync)
+    return resposta
@@ -1,48 +1,178 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
-from app.models import db, Sala, Reserva
+from app.models import db, Usuario, Sala, Reserva, ReservaArquivo, Serie
+from app.utils.decorators import admin_required
 from app.utils.time_utils import get_now_br_naive, get_now_br
+from app.utils.reservas import (criar_reservas, criar_serie, cancelar_serie, cancelar_ocorrencia, ConflitoReserva,
+                                horarios_livres, extensao_series, cache_horarios_livres, invalidar_caches_reservas)
+from app.utils.recorrencia import FREQUENCIAS, NOMES_DIAS, Regra, dia_da_semana, ocorrencia_unica
+from app.utils.catalogo import catalogo_salas
+from app.utils.arquivo import corte_arquivo
+from app.utils.painel import linha_do_tempo, chave_estado, ler_chave_estado, conexoes_painel
+from app.utils.cache import CacheTTL
+from app.utils.condicional import etag_pagina, resposta_condicional
+from app.utils.versoes import ler_versao
+from markupsafe import Markup
 from datetime import datetime, timedelta
-import pytz
+from sqlalchemy import and_, or_
 import uuid
-import calendar
+import csv
+import heapq
+import io
+import tempfile
+import json
+import time
 
 main_bp = Blueprint('main', __name__)
 
+# Parâmetros de filtro aceitos pela listagem e pela exportação
+FILTROS_RESERVAS = ('sala_id', 'data', 'status', 'user_id')
+
+CABECALHO_EXPORTACAO = ['ID', 'Sala', 'Assunto', 'Solicitante', 'Setor', 'Telefone',
+                        'Início', 'Fim', 'Usuário', 'Recorrente']
+LOTE_EXPORTACAO = 1000
+TAMANHO_BLOCO = 64 * 1024
+
+# Maior período aceito pela busca de horários livres
+MAX_DIAS_HORARIOS_LIVRES = 31
+
+# Painel ao vivo (SSE): comentário de keep-alive e espera antes de o navegador reconectar
+INTERVALO_PING_PAINEL = 15
+RECONEXAO_PAINEL_MS = 3000
+
+# HTML dos cards do painel, pelo conteúdo (sala e reserva em andamento):
+# compartilhado entre usuários, telas e o SSE, não precisa de invalidação
+cache_cards = CacheTTL(maximo=512, ttl=600)
+
+@main_bp.before_app_request
+def estender_series():
+    # Materializa as próximas ocorrências das séries (consulta o banco no máximo uma vez por hora;
+    # uma falha fica no log e não derruba a requisição)
+    extensao_series.verificar(current_app.config['SERIES_HORIZONTE_DIAS'])
+
 @main_bp.route('/')
 @login_required
 def dashboard():
-    salas = Sala.query.order_by(Sala.ordem).all()
     agora = get_now_br_naive()
-    
-    status_salas = []
-    for sala in salas:
-        reserva_atual = Reserva.query.filter(
-            Reserva.sala_id == sala.id,
-            Reserva.inicio <= agora,
-            Reserva.fim >= agora
-        ).first()
-        
-        ocupada = reserva_atual is not None
-        status = 'Ocupada' if ocupada else 'Disponível'
-            
-        status_salas.append({
-            'sala': sala,
-            'status': status,
-            'ocupada': ocupada,
-            'reserva': reserva_atual
-        })
 
-    return render_template('dashboard.html', status_salas=status_salas, agora=agora)
+    # Salas e reservas em andamento vêm da linha do tempo em memória (ver app/utils/painel.py)
+    salas, atuais = linha_do_tempo.estado(agora)
+
+    # A página depende só das salas, das reservas em andamento e de o SSE estar
+    # ligado: a ETag sai da memória, sem consultar o banco, e telas sem mudança recebem 304
+    sse = current_app.config['PAINEL_SSE_MAX'] > 0
+    etag = etag_pagina(tuple((sala.id, sala.nome, sala.andar) for sala in salas), tuple(atuais.values()), sse)
+    return resposta_condicional(etag, lambda: render_template(
+        'dashboard.html', cards=[_card_sala(sala, atuais[sala.id]) for sala in salas],
+        agora=agora, chave_estado=chave_estado(atuais), sse=sse
+    ))
+
+@main_bp.route('/painel/eventos')
+@login_required
+def painel_eventos():
+    """Envia via SSE os cards das salas cujo status mudou.
+
+    O estado já exibido pela tela chega em `estado` (ou no Last-Event-ID ao
+    reconectar); a cada evento vai o novo estado como id. A conexão é
+    encerrada após PAINEL_EVENTOS_DURACAO segundos e o navegador reconecta.
+    Acima de PAINEL_SSE_MAX conexões no worker a resposta é 204: o
+    EventSource desiste e a tela passa a usar /painel/estado.
+    """
+    if not conexoes_painel.entrar(current_app.config['PAINEL_SSE_MAX']):
+        return Response(status=204)
+    exibido = ler_chave_estado(request.headers.get('Last-Event-ID') or request.args.get('estado'))
+    duracao = current_app.config['PAINEL_EVENTOS_DURACAO']
+
+    def eventos():
+        enviado = exibido
+        encerrar_em = time.monotonic() + duracao
+        ultimo_envio = time.monotonic()
+        salas_exibidas = list(enviado)
+        yield f'retry: {RECONEXAO_PAINEL_MS}\n\n'
+
+        while time.monotonic() < encerrar_em:
+            agora = get_now_br_naive()
+            mudancas, atuais = _mudancas_painel(agora, enviado, salas_exibidas)
+            # Devolve a conexão ao pool enquanto espera a próxima verificação
+            db.session.close()
+
+            if mudancas is None:
+                # Sala criada, removida ou reordenada: a tela recarrega inteira
+                yield 'event: recarregar\ndata: {}\n\n'
+                return
+            salas_exibidas = list(atuais)
+            if mudancas:
+                chave = chave_estado(atuais)
+                enviado = ler_chave_estado(chave)
+                ultimo_envio = time.monotonic()
+                yield f'id: {chave}\nevent: salas\ndata: {json.dumps(mudancas)}\n\n'
+            elif time.monotonic() - ultimo_envio >= INTERVALO_PING_PAINEL:
+                ultimo_envio = time.monotonic()
+                yield ': ping\n\n'
+
+            # Dorme até a próxima virada de status ou a próxima verificação de versão
+            espera = linha_do_tempo.intervalo
+            proxima = linha_do_tempo.proxima_transicao(agora)
+            if proxima is not None:
+                espera = min(espera, (proxima - get_now_br_naive()).total_seconds())
+            time.sleep(max(espera, 0.05))
+
+    resposta = Response(stream_with_context(eventos()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # O servidor fecha a resposta ao fim do stream ou quando o cliente desconecta
+    resposta.call_on_close(conexoes_painel.sair)
+    return resposta
+
+@main_bp.route('/painel/estado')
+@login_required
+def painel_estado():
+    """Cards que mudaram desde `estado`, para as telas sem SSE (consulta periódica)."""
+    exibido = ler_chave_estado(request.args.get('estado'))
+    mudancas, atuais = _mudancas_painel(get_now_br_naive(), exibido, list(exibido))
+    return {
+        'estado': chave_estado(atuais),
+        'salas': mudancas or [],
+        'recarregar': mudancas is None,
+    }, 200, {'Cache-Control': 'no-cache'}
+
+def _mudancas_painel(agora, enviado, salas_exibidas):
+    """(cards que mudaram em relação a `enviado`, estado atual); None no lugar dos cards se as salas mudaram."""
+    salas, atuais = linha_do_tempo.estado(agora)
+    if salas_exibidas and [sala.id for sala in salas] != salas_exibidas:
+        return None, atuais
+    return [
+        {'id': sala.id, 'html': _card_sala(sala, atuais[sala.id])}
+        for sala in salas
+        if enviado.get(sala.id) != (atuais[sala.id].id if atuais[sala.id] else 0)
+    ], atuais
+
+def _card_sala(sala, reserva_atual):
+    chave = (sala.id, sala.nome, sala.andar, reserva_atual)
+    html = cache_cards.get(chave)
+    if html is None:
+        html = Markup(render_template('_card_sala.html', sala=_status_sala(sala, reserva_atual)))
+        cache_cards.set(chave, html)
+    return html
+
+def _status_sala(sala, reserva_atual):
+    ocupada = reserva_atual is not None
+    return {
+        'sala': sala,
+        'status': 'Ocupada' if ocupada else 'Disponível',
+        'ocupada': ocupada,
+        'reserva': reserva_atual
+    }
 
 @main_bp.route('/reservar', methods=['GET', 'POST'])
 @login_required
 def reservar():
     selected_sala_id = request.args.get('sala_id', type=int)
-    salas = Sala.query.all()
+    salas = catalogo_salas.todas()
     
     if request.method == 'POST':
-        sala_id = request.form.get('sala_id')
+        sala_id = request.form.get('sala_id', type=int)
         assunto = request.form.get('assunto')
         nome_solicitante = request.form.get('nome_solicitante')
         setor = request.form.get('setor')
@@ -56,122 +186,280 @@ def reservar():
             hora_inicio = datetime.strptime(hora_inicio_str, '%H:%M').time()
             hora_fim = datetime.strptime(hora_fim_str, '%H:%M').time()
 
-            # Recorrência
+            dados = {
+                'user_id': current_user.id,
+                'assunto': assunto,
+                'nome_solicitante': nome_solicitante,
+                'setor': setor,
+                'telefone': telefone,
+            }
             tipo_recorrencia = request.form.get('tipo_recorrencia', 'nenhuma')
-            qtd_repeticoes = int(request.form.get('qtd_repeticoes', 1)) if tipo_recorrencia != 'nenhuma' else 1
-            
-            if qtd_repeticoes > 12: qtd_repeticoes = 12
-
-            fuso = pytz.timezone('America/Recife')
-            series_id = str(uuid.uuid4()) if tipo_recorrencia != 'nenhuma' else None
-            
-            reservas_para_criar = []
-            conflitos = []
-
-            for i in range(qtd_repeticoes):
-                if tipo_recorrencia == 'mensal':
-                    new_month = data_base.month + i
-                    new_year = data_base.year + (new_month - 1) // 12
-                    new_month = (new_month - 1) % 12 + 1
-                    last_day = calendar.monthrange(new_year, new_month)[1]
-                    new_day = min(data_base.day, last_day)
-                    nova_data = datetime(new_year, new_month, new_day).date()
-                else:
-                    delta_days = 0
-                    if tipo_recorrencia == 'semanal': delta_days = i * 7
-                    elif tipo_recorrencia == 'quinzenal': delta_days = i * 14
-                    nova_data = data_base + timedelta(days=delta_days)
-                
-                inicio_dt = fuso.localize(datetime.combine(nova_data, hora_inicio))
-                fim_dt = fuso.localize(datetime.combine(nova_data, hora_fim))
-                
-                if fim_dt <= inicio_dt:
-                    fim_dt += timedelta(days=1)
-
-                inicio_naive = inicio_dt.replace(tzinfo=None)
-                fim_naive = fim_dt.replace(tzinfo=None)
-
-                conflito = Reserva.query.filter(
-                    Reserva.sala_id == sala_id,
-                    Reserva.inicio < fim_naive,
-                    Reserva.fim > inicio_naive
-                ).first()
-
-                if conflito:
-                    conflitos.append(f"{nova_data.strftime('%d/%m')}")
-                else:
-                    nova_reserva = Reserva(
-                        sala_id=sala_id,
-                        user_id=current_user.id,
-                        assunto=assunto,
-                        nome_solicitante=nome_solicitante,
-                        setor=setor,
-                        telefone=telefone,
-                        inicio=inicio_naive,
-                        fim=fim_naive,
-                        recorrencia_id=series_id,
-                        is_recorrente=(tipo_recorrencia != 'nenhuma')
-                    )
-                    reservas_para_criar.append(nova_reserva)
+            if tipo_recorrencia == 'nenhuma':
+                ocorrencias = [ocorrencia_unica(data_base, hora_inicio, hora_fim)]
+                reservas_criadas, indices_conflito = criar_reservas(
+                    sala_id, ocorrencias, dict(dados, recorrencia_id=None, is_recorrente=False)
+                )
+                criadas = len(reservas_criadas)
+            else:
+                # A regra é gravada uma vez; só o horizonte próximo vira linhas de Reserva
+                serie = _nova_serie(request.form, tipo_recorrencia, data_base, hora_inicio, hora_fim)
+                serie.sala_id = sala_id
+                for campo, valor in dados.items():
+                    setattr(serie, campo, valor)
+                horizonte = get_now_br_naive().date() + timedelta(days=current_app.config['SERIES_HORIZONTE_DIAS'])
+                ocorrencias, indices_conflito = criar_serie(serie, horizonte)
+                if not ocorrencias:
+                    flash('Erro: A repetição escolhida não gera nenhuma data.', 'error')
+                    return redirect(url_for('main.reservar'))
+                criadas = len(ocorrencias) - len(indices_conflito)
+            conflitos = [ocorrencias[i][0].strftime('%d/%m') for i in sorted(indices_conflito)]
 
             if conflitos:
-                if len(reservas_para_criar) == 0:
+                if criadas == 0:
                     flash(f'Erro: Todos os horários selecionados possuem conflitos: {", ".join(conflitos)}', 'error')
                     return redirect(url_for('main.reservar'))
                 else:
                     flash(f'Algumas reservas foram criadas, mas as seguintes datas tiveram conflitos e foram puladas: {", ".join(conflitos)}', 'warning')
             
-            for r in reservas_para_criar:
-                db.session.add(r)
-            
-            db.session.commit()
-            flash(f'{len(reservas_para_criar)} reserva(s) realizada(s) com sucesso!', 'success')
+            flash(f'{criadas} reserva(s) realizada(s) com sucesso!', 'success')
             return redirect(url_for('main.lista_reservas'))
 
+        except ConflitoReserva:
+            flash('A sala está sendo reservada por outra pessoa neste momento. Tente novamente.', 'error')
+            return redirect(url_for('main.reservar'))
         except Exception as e:
             db.session.rollback()
             flash(f'Erro ao processar reserva: {str(e)}', 'error')
             return redirect(url_for('main.reservar'))
             
-    return render_template('reservar.html', salas=salas, selected_sala_id=selected_sala_id)
+    return render_template('reservar.html', salas=salas, selected_sala_id=selected_sala_id, nomes_dias=NOMES_DIAS)
+
+def _nova_serie(form, tipo_recorrencia, data_base, hora_inicio, hora_fim):
+    """Serie (sem dados da reunião) a partir dos campos de repetição do formulário.
+
+    O fim vem de `repetir_ate` ou, sem ele, da quantidade de ocorrências;
+    em ambos os casos limitado a MAX_DIAS_SERIE após a primeira data.
+    """
+    if tipo_recorrencia not in FREQUENCIAS:
+        raise ValueError(f'Repetição inválida: {tipo_recorrencia}')
+    frequencia, intervalo = FREQUENCIAS[tipo_recorrencia]
+    dias_semana = sorted({dia_da_semana(dia) for dia in form.getlist('dias_semana')})
+    limite = data_base + timedelta(days=current_app.config['MAX_DIAS_SERIE'])
+
+    repetir_ate = form.get('repetir_ate')
+    if repetir_ate:
+        data_fim = min(datetime.strptime(repetir_ate, '%Y-%m-%d').date(), limite)
+    else:
+        qtd_repeticoes = min(int(form.get('qtd_repeticoes', 1)), current_app.config['MAX_REPETICOES'])
+        data_fim = Regra(frequencia, intervalo, dias_semana, data_base, limite).data_da_ocorrencia(qtd_repeticoes)
+        if data_fim is None:
+            raise ValueError('A repetição escolhida não gera nenhuma data.')
+
+    regra = Regra(frequencia, intervalo, dias_semana, data_base, data_fim)
+    return Serie(
+        id=str(uuid.uuid4()), frequencia=frequencia, intervalo=intervalo,
+        dias_semana=','.join(map(str, regra.dias_semana)) if frequencia == 'semanal' else '',
+        hora_inicio=hora_inicio, hora_fim=hora_fim, data_inicio=data_base, data_fim=data_fim, excecoes=''
+    )
 
 @main_bp.route('/reservas')
 @login_required
 def lista_reservas():
-    query = Reserva.query
+    agora = get_now_br_naive()
+
+    # Versões lidas antes das reservas: uma gravação no meio muda a ETag da
+    # próxima requisição. O minuto cobre o status (acontecendo/concluída)
+    etag = etag_pagina(ler_versao('reservas'), catalogo_salas.versao(), agora.strftime('%Y%m%d%H%M'))
+    return resposta_condicional(etag, lambda: _renderizar_lista_reservas(agora))
+
+def _renderizar_lista_reservas(agora):
+    # Paginação por cursor (keyset) em (inicio, id): o custo de cada página
+    # não depende de quantas reservas vieram antes dela
+    max_por_pagina = current_app.config['MAX_RESERVAS_POR_PAGINA']
+    por_pagina = request.args.get('por_pagina', type=int) or current_app.config['RESERVAS_POR_PAGINA']
+    por_pagina = max(1, min(por_pagina, max_por_pagina))
+
+    cursor = _ler_cursor(request.args.get('apos'))
+    reservas = _pagina_reservas(Reserva, agora, cursor, por_pagina + 1)
+    # Reservas retroativas ou importadas podem ser mais antigas que as arquivadas:
+    # a mesma página é lida das duas tabelas e mesclada por (inicio, id), os mesmos ids nas duas
+    if _inclui_arquivo(request.args, agora):
+        reservas = sorted(reservas + _pagina_reservas(ReservaArquivo, agora, cursor, por_pagina + 1),
+                          key=_chave_ordem, reverse=True)[:por_pagina + 1]
+
+    proxima_url = None
+    if len(reservas) > por_pagina:
+        reservas = reservas[:por_pagina]
+        args = request.args.to_dict()
+        args['apos'] = _escrever_cursor(reservas[-1])
+        proxima_url = url_for('main.lista_reservas', **args)
+
+    primeira_url = None
+    if cursor:
+        args = request.args.to_dict()
+        args.pop('apos')
+        primeira_url = url_for('main.lista_reservas', **args)
+
+    filtros = {k: v for k, v in request.args.items() if k in FILTROS_RESERVAS and v}
     
-    if not current_user.is_admin:
-        query = query.filter_by(user_id=current_user.id)
-        
-    sala_id = request.args.get('sala_id')
+    return render_template('reservas.html', reservas=reservas, salas=catalogo_salas.por_nome(),
+                           salas_por_id=catalogo_salas.por_id(), agora=agora,
+                           proxima_url=proxima_url, primeira_url=primeira_url, filtros=filtros)
+
+@main_bp.route('/reservas/exportar')
+@login_required
+@admin_required
+def exportar_reservas():
+    """Exporta as reservas filtradas em CSV ou XLSX sem carregar o resultado inteiro na memória."""
+    formato = 'xlsx' if request.args.get('formato') == 'xlsx' else 'csv'
+    agora = get_now_br_naive()
+
+    # As duas tabelas são lidas em paralelo e mescladas por (inicio, id): há reservas
+    # recentes (retroativas, importadas) com datas anteriores às arquivadas
+    modelos = (ReservaArquivo, Reserva) if _inclui_arquivo(request.args, agora) else (Reserva,)
+    consultas = []
+    for modelo in modelos:
+        query = db.session.query(
+            modelo.id, Sala.nome, modelo.assunto, modelo.nome_solicitante, modelo.setor,
+            modelo.telefone, modelo.inicio, modelo.fim, Usuario.username, modelo.is_recorrente
+        ).join(Sala, modelo.sala_id == Sala.id).join(Usuario, modelo.user_id == Usuario.id)
+        consultas.append(_filtrar_reservas(query, request.args, agora, modelo).order_by(modelo.inicio, modelo.id))
+
+    # yield_per usa cursor do lado do servidor (PostgreSQL) e lê em lotes
+    ordenadas = heapq.merge(*(query.yield_per(LOTE_EXPORTACAO) for query in consultas), key=_chave_ordem)
+    linhas = (_linha_exportacao(linha) for linha in ordenadas)
+    nome_arquivo = f"reservas_{agora.strftime('%Y%m%d_%H%M')}.{formato}"
+
+    if formato == 'xlsx':
+        try:
+            corpo = _gerar_xlsx(linhas)
+        except ImportError:
+            flash('Exportação em XLSX indisponível: instale o pacote openpyxl.', 'error')
+            return redirect(url_for('main.lista_reservas'))
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        corpo = _gerar_csv(linhas)
+        mimetype = 'text/csv; charset=utf-8'
+
+    return Response(stream_with_context(corpo), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={nome_arquivo}'
+    })
+
+def _filtrar_reservas(query, args, agora, modelo=Reserva):
+    """Aplica os filtros da listagem (sala, data, status e usuário) à consulta sobre `modelo`."""
+    sala_id = args.get('sala_id')
     if sala_id:
-        query = query.filter_by(sala_id=sala_id)
+        query = query.filter(modelo.sala_id == sala_id)
+
+    user_id = args.get('user_id')
+    if user_id:
+        query = query.filter(modelo.user_id == user_id)
         
-    data_filtro = request.args.get('data')
+    data_filtro = args.get('data')
     if data_filtro:
         try:
             data_obj = datetime.strptime(data_filtro, '%Y-%m-%d')
             inicio_dia = data_obj.replace(hour=0, minute=0, second=0)
             fim_dia = data_obj.replace(hour=23, minute=59, second=59)
-            query = query.filter(Reserva.inicio >= inicio_dia, Reserva.inicio <= fim_dia)
+            query = query.filter(modelo.inicio >= inicio_dia, modelo.inicio <= fim_dia)
         except:
             pass
 
-    status = request.args.get('status')
-    agora = get_now_br_naive()
+    status = args.get('status')
     
     if status == 'agora':
-        query = query.filter(Reserva.inicio <= agora, Reserva.fim >= agora)
+        query = query.filter(modelo.inicio <= agora, modelo.fim >= agora)
     elif status == 'futuro':
-        query = query.filter(Reserva.inicio > agora)
+        query = query.filter(modelo.inicio > agora)
     elif status == 'concluido':
-        query = query.filter(Reserva.fim < agora)
+        query = query.filter(modelo.fim < agora)
 
-    reservas = query.order_by(Reserva.inicio.desc()).all()
-    salas = Sala.query.order_by(Sala.nome).all()
-    agora = get_now_br_naive()
-    
-    return render_template('reservas.html', reservas=reservas, salas=salas, agora=agora)
+    return query
+
+def _linha_exportacao(linha):
+    return [
+        linha.id, linha.nome, linha.assunto, linha.nome_solicitante, linha.setor, linha.telefone,
+        linha.inicio.strftime('%d/%m/%Y %H:%M'), linha.fim.strftime('%d/%m/%Y %H:%M'),
+        linha.username, 'Sim' if linha.is_recorrente else 'Não'
+    ]
+
+def _gerar_csv(linhas):
+    buffer = io.StringIO()
+    # BOM + ponto e vírgula: o Excel em pt-BR abre o arquivo com acentos e colunas corretos
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(CABECALHO_EXPORTACAO)
+    for linha in linhas:
+        writer.writerow(linha)
+        if buffer.tell() >= TAMANHO_BLOCO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _gerar_xlsx(linhas):
+    from openpyxl import Workbook
+
+    # write_only grava as linhas em disco à medida que chegam
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Reservas')
+    ws.append(CABECALHO_EXPORTACAO)
+    for linha in linhas:
+        ws.append(linha)
+
+    arquivo = tempfile.TemporaryFile()
+    wb.save(arquivo)
+    arquivo.seek(0)
+
+    def ler():
+        with arquivo:
+            while bloco := arquivo.read(TAMANHO_BLOCO):
+                yield bloco
+    return ler()
+
+def _chave_ordem(reserva):
+    return reserva.inicio, reserva.id
+
+def _escrever_cursor(reserva):
+    return f"{reserva.inicio.isoformat()}_{reserva.id}"
+
+def _pagina_reservas(modelo, agora, cursor, limite):
+    """Uma página da listagem em `modelo` (Reserva ou ReservaArquivo), após o cursor."""
+    query = modelo.query
+    if not current_user.is_admin:
+        query = query.filter(modelo.user_id == current_user.id)
+    query = _filtrar_reservas(query, request.args, agora, modelo)
+
+    if cursor:
+        cursor_inicio, cursor_id = cursor
+        query = query.filter(or_(
+            modelo.inicio < cursor_inicio,
+            and_(modelo.inicio == cursor_inicio, modelo.id < cursor_id)
+        ))
+
+    return query.order_by(modelo.inicio.desc(), modelo.id.desc()).limit(limite).all()
+
+def _inclui_arquivo(args, agora):
+    """Se os filtros podem alcançar reservas arquivadas (concluídas antes do corte do arquivo)."""
+    if args.get('status') in ('agora', 'futuro'):
+        return False
+    data_filtro = args.get('data')
+    if data_filtro:
+        try:
+            return datetime.strptime(data_filtro, '%Y-%m-%d') < corte_arquivo(agora, current_app.config['ARQUIVO_MESES'])
+        except ValueError:
+            pass
+    return True
+
+def _ler_cursor(valor):
+    """Converte o parâmetro `apos` em (inicio, id); None se ausente ou inválido."""
+    if not valor:
+        return None
+    try:
+        inicio_str, id_str = valor.rsplit('_', 1)
+        return datetime.fromisoformat(inicio_str), int(id_str)
+    except ValueError:
+        return None
 
 @main_bp.route('/cancelar/<int:id>')
 @login_required
@@ -185,14 +473,70 @@ def cancelar_reserva(id):
     tipo_cancelamento = request.args.get('tipo', 'unica')
     
     if tipo_cancelamento == 'serie' and reserva.recorrencia_id:
-        reservas_serie = Reserva.query.filter_by(recorrencia_id=reserva.recorrencia_id).all()
-        contagem = len(reservas_serie)
-        for r in reservas_serie:
-            db.session.delete(r)
+        contagem = cancelar_serie(reserva.recorrencia_id)
         flash(f'Série de {contagem} reservas cancelada com sucesso.', 'success')
+    elif tipo_cancelamento == 'futuras' and reserva.recorrencia_id:
+        contagem = cancelar_serie(reserva.recorrencia_id, a_partir_de=reserva.inicio)
+        flash(f'{contagem} reserva(s) da série cancelada(s) a partir de {reserva.inicio.strftime("%d/%m/%Y")}.', 'success')
     else:
-        db.session.delete(reserva)
+        cancelar_ocorrencia(reserva)
         flash('Reserva cancelada com sucesso.', 'success')
     
     db.session.commit()
+    invalidar_caches_reservas()
     return redirect(url_for('main.lista_reservas'))
+
+@main_bp.route('/api/horarios-livres')
+@login_required
+def api_horarios_livres():
+    """Horários livres por sala em um período, para uma duração mínima (em minutos)."""
+    try:
+        data_inicio = datetime.strptime(request.args.get('inicio', ''), '%Y-%m-%d').date()
+        data_fim = datetime.strptime(request.args.get('fim') or request.args['inicio'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return {'erro': 'Informe inicio (e opcionalmente fim) no formato AAAA-MM-DD.'}, 400
+
+    duracao = request.args.get('duracao', 60, type=int)
+    andar = request.args.get('andar') or None
+    if data_fim < data_inicio or (data_fim - data_inicio).days >= MAX_DIAS_HORARIOS_LIVRES:
+        return {'erro': f'O período deve ter entre 1 e {MAX_DIAS_HORARIOS_LIVRES} dias.'}, 400
+    if duracao <= 0:
+        return {'erro': 'A duração deve ser positiva.'}, 400
+
+    # Horários que já passaram não são oferecidos; a chave muda a cada minuto
+    agora = get_now_br_naive().replace(second=0, microsecond=0)
+    chave = (data_inicio, data_fim, duracao, andar, agora)
+    resposta = cache_horarios_livres.get(chave)
+    if resposta is not None:
+        return resposta
+
+    salas = [sala for sala in catalogo_salas.todas() if not andar or sala.andar == andar]
+
+    janelas = []
+    for i in range((data_fim - data_inicio).days + 1):
+        meia_noite = datetime.combine(data_inicio + timedelta(days=i), datetime.min.time())
+        inicio = max(meia_noite + timedelta(hours=current_app.config['EXPEDIENTE_INICIO']), agora)
+        fim = meia_noite + timedelta(hours=current_app.config['EXPEDIENTE_FIM'])
+        if inicio < fim:
+            janelas.append((inicio, fim))
+
+    livres = horarios_livres(salas, janelas, timedelta(minutes=duracao))
+    resposta = {
+        'inicio': data_inicio.isoformat(),
+        'fim': data_fim.isoformat(),
+        'duracao': duracao,
+        'salas': [
+            {
+                'id': sala.id,
+                'nome': sala.nome,
+                'andar': sala.andar,
+                'livres': [
+                    {'inicio': inicio.isoformat(timespec='minutes'), 'fim': fim.isoformat(timespec='minutes')}
+                    for inicio, fim in livres[sala.id]
+                ]
+            }
+            for sala in salas
+        ]
+    }
+    cache_horarios_livres.set(chave, resposta)
+    return resposta
@@ -0,0 +1,67 @@
+from datetime import datetime
+from sqlalchemy import delete, insert, select, text
+from app.models import db, Reserva, ReservaArquivo, AlteracaoCalendario
+from app.utils.reservas import registrar_alteracao_reservas, invalidar_caches_reservas
+
+# Reservas movidas por transação
+LOTE_ARQUIVO = 1000
+
+COLUNAS_ARQUIVO = ('id', 'sala_id', 'user_id', 'assunto', 'nome_solicitante', 'setor', 'telefone',
+                   'inicio', 'fim', 'data_criacao', 'recorrencia_id', 'is_recorrente')
+
+def _mes(indice):
+    # Índice absoluto de meses (ano * 12 + mês - 1) -> 1º dia do mês
+    return datetime(indice // 12, indice % 12 + 1, 1)
+
+def corte_arquivo(agora, meses):
+    """1º dia do mês `meses` meses antes de `agora`; reservas que terminam antes dele vão para o arquivo."""
+    return _mes(agora.year * 12 + agora.month - 1 - meses)
+
+def garantir_particoes(meses):
+    """PostgreSQL: cria as partições mensais de reserva_arquivo para os (ano, mês) informados."""
+    for ano, mes in sorted(meses):
+        inicio = _mes(ano * 12 + mes - 1)
+        fim = _mes(ano * 12 + mes)
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS reserva_arquivo_{ano:04d}_{mes:02d} PARTITION OF reserva_arquivo "
+            f"FOR VALUES FROM ('{inicio:%Y-%m-%d}') TO ('{fim:%Y-%m-%d}')"
+        ))
+
+def arquivar_reservas(corte, lote=LOTE_ARQUIVO):
+    """Move para reserva_arquivo, em lotes, as reservas que terminaram antes de `corte`.
+
+    Cada lote é copiado com INSERT ... SELECT e removido com um DELETE na
+    mesma transação. O agregado dos relatórios não muda: as reservas
+    arquivadas continuam contadas nele. As alterações dos feeds .ics
+    anteriores ao corte são descartadas. Retorna o total movido.
+    """
+    postgresql = db.session.get_bind().dialect.name == 'postgresql'
+    colunas = [getattr(Reserva, nome) for nome in COLUNAS_ARQUIVO]
+    total = 0
+    while True:
+        # inicio < fim: o filtro em inicio deixa a busca usar ix_reserva_inicio_id
+        linhas = db.session.execute(
+            select(Reserva.id, Reserva.inicio)
+            .where(Reserva.inicio < corte, Reserva.fim < corte)
+            .order_by(Reserva.inicio, Reserva.id).limit(lote)
+        ).all()
+        if not linhas:
+            break
+        ids = [linha.id for linha in linhas]
+        if postgresql:
+            garantir_particoes({(linha.inicio.year, linha.inicio.month) for linha in linhas})
+        db.session.execute(insert(ReservaArquivo).from_select(
+            list(COLUNAS_ARQUIVO), select(*colunas).where(Reserva.id.in_(ids))
+        ))
+        db.session.execute(
+            delete(Reserva).where(Reserva.id.in_(ids)),
+            execution_options={'synchronize_session': False}
+        )
+        registrar_alteracao_reservas()
+        db.session.commit()
+        total += len(ids)
+    # O registro dos feeds .ics também é podado: tokens `since` mais antigos recebem o feed completo
+    db.session.execute(delete(AlteracaoCalendario).where(AlteracaoCalendario.criado_em < corte))
+    db.session.commit()
+    invalidar_caches_reservas()
+    return total
@@ -0,0 +1,68 @@
+import os
+import time
+from sqlalchemy.pool import NullPool, QueuePool
+from app.utils.metricas import metricas_pool
+
+class QueuePoolMedido(QueuePool):
+    """QueuePool que registra quanto tempo cada checkout esperou por uma conexão."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metricas_pool.registrar_espera(time.perf_counter() - inicio)
+
+def _env_int(nome, padrao=None):
+    valor = os.environ.get(nome)
+    return int(valor) if valor else padrao
+
+def concorrencia_por_worker():
+    """Requisições simultâneas por worker, conforme o perfil do gunicorn.conf.py."""
+    modo = os.environ.get('GUNICORN_MODO', 'threads')
+    if modo == 'gevent':
+        # Greenlets são ilimitados; o pool é que limita as consultas simultâneas
+        return 10
+    if modo == 'threads':
+        return _env_int('GUNICORN_THREADS', 8)
+    return 1
+
+def opcoes_engine(database_url):
+    """Monta SQLALCHEMY_ENGINE_OPTIONS a partir da URL e das variáveis DB_*.
+
+    Pool dimensionado pela concorrência de cada worker (e limitado por
+    DB_MAX_CONEXOES / WEB_CONCURRENCY), pre-ping, reciclagem e statement
+    timeout. Com DB_PGBOUNCER=1 o pool local é desligado e nenhum parâmetro
+    de sessão é enviado na conexão.
+    """
+    if database_url.startswith('sqlite'):
+        if ':memory:' in database_url:
+            return {}
+        return {'poolclass': QueuePoolMedido}
+
+    if os.environ.get('DB_PGBOUNCER') == '1':
+        # Em transaction pooling quem mantém as conexões é o PgBouncer; o
+        # statement_timeout deve ficar no papel (ALTER ROLE ... SET statement_timeout)
+        return {'poolclass': NullPool, 'pool_pre_ping': True}
+
+    pool_size = _env_int('DB_POOL_SIZE', concorrencia_por_worker())
+    max_overflow = _env_int('DB_MAX_OVERFLOW', max(2, pool_size // 2))
+    max_conexoes = _env_int('DB_MAX_CONEXOES')
+    if max_conexoes:
+        por_worker = max(1, max_conexoes // _env_int('WEB_CONCURRENCY', 2))
+        pool_size = min(pool_size, por_worker)
+        max_overflow = min(max_overflow, por_worker - pool_size)
+
+    return {
+        'poolclass': QueuePoolMedido,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 10),
+        # O Render encerra conexões ociosas; o pre-ping descarta as que caíram
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 300),
+        'pool_pre_ping': True,
+        'connect_args': {
+            'connect_timeout': _env_int('DB_CONNECT_TIMEOUT', 10),
+            'options': f"-c statement_timeout={_env_int('DB_STATEMENT_TIMEOUT', 30000)}",
+        },
+    }
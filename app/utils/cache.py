@@ -0,0 +1,102 @@
+from collections import OrderedDict
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class CacheTTL:
+    """Cache LRU em memória, com expiração por tempo e seguro entre threads."""
+
+    def __init__(self, maximo=256, ttl=30):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave, padrao=None):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return padrao
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return padrao
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def incrementar(self, chave):
+        """Soma 1 ao contador (0 se ausente ou expirado) e renova o TTL; retorna o novo valor."""
+        with self._lock:
+            item = self._itens.get(chave)
+            valor = item[0] if item is not None and item[1] >= time.monotonic() else 0
+            valor += 1
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+            return valor
+
+    def delete(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+class CacheRedis:
+    """Mesma interface do CacheTTL, compartilhada entre os workers via Redis.
+
+    Os valores são serializados em JSON; `limpar` remove apenas as chaves
+    do próprio namespace.
+    """
+
+    def __init__(self, cliente, namespace, ttl=30):
+        self.cliente = cliente
+        self.prefixo = f'sistema:{namespace}:'
+        self.ttl = ttl
+
+    def get(self, chave, padrao=None):
+        valor = self.cliente.get(self.prefixo + str(chave))
+        return padrao if valor is None else json.loads(valor)
+
+    def set(self, chave, valor):
+        self.cliente.set(self.prefixo + str(chave), json.dumps(valor), ex=self.ttl)
+
+    def incrementar(self, chave):
+        # INCR e EXPIRE na mesma transação (MULTI): atômico entre workers
+        pipeline = self.cliente.pipeline()
+        pipeline.incr(self.prefixo + str(chave))
+        pipeline.expire(self.prefixo + str(chave), self.ttl)
+        return pipeline.execute()[0]
+
+    def delete(self, chave):
+        self.cliente.delete(self.prefixo + str(chave))
+
+    def limpar(self):
+        chaves = list(self.cliente.scan_iter(match=self.prefixo + '*'))
+        if chaves:
+            self.cliente.delete(*chaves)
+
+def criar_cache_compartilhado(namespace, maximo=256, ttl=30):
+    """CacheRedis quando CACHE_REDIS_URL está definida (e o pacote redis instalado); senão CacheTTL local."""
+    url = os.environ.get('CACHE_REDIS_URL')
+    if url:
+        try:
+            import redis
+        except ImportError:
+            logger.warning("CACHE_REDIS_URL definida, mas o pacote 'redis' não está instalado; usando cache local.")
+        else:
+            return CacheRedis(redis.Redis.from_url(url), namespace, ttl=ttl)
+    return CacheTTL(maximo=maximo, ttl=ttl)
@@ -0,0 +1,294 @@
+from datetime import datetime, time, timedelta
+import logging
+import pytz
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import func, insert, select
+from app.models import db, Reserva, Serie, AlteracaoCalendario
+from app.utils.recorrencia import ocorrencia_unica
+from app.utils.time_utils import get_now_br_naive
+from app.utils.versoes import incrementar_versoes
+
+FUSO = pytz.timezone('America/Recife')
+DOMINIO_UID = 'sistema-reunioes'
+
+# Muda quando o formato do feed muda (entra na ETag)
+VERSAO_FEED = 1
+
+# Eventos por lote lido do banco e tamanho aproximado de cada bloco enviado
+LOTE_FEED = 500
+TAMANHO_BLOCO = 64 * 1024
+
+DIAS_ICS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+logger = logging.getLogger(__name__)
+
+VTIMEZONE = (
+    'BEGIN:VTIMEZONE',
+    'TZID:America/Recife',
+    'BEGIN:STANDARD',
+    'DTSTART:19700101T000000',
+    'TZOFFSETFROM:-0300',
+    'TZOFFSETTO:-0300',
+    'TZNAME:-03',
+    'END:STANDARD',
+    'END:VTIMEZONE',
+)
+
+def corte_feed(agora):
+    """Início da janela dos feeds (CALENDARIO_DIAS antes de hoje); muda uma vez por dia."""
+    return datetime.combine(agora.date() - timedelta(days=current_app.config['CALENDARIO_DIAS']), time.min)
+
+def uid_reserva(reserva_id):
+    return f'reserva-{reserva_id}'
+
+def uid_serie(serie_id):
+    return f'serie-{serie_id}'
+
+# --- Tokens dos feeds ---
+
+def _serializador():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='calendario')
+
+def token_feed(tipo, alvo_id):
+    """Token assinado do feed ('sala' ou 'usuario', id), usado na URL no lugar do login."""
+    return _serializador().dumps([tipo, alvo_id])
+
+def ler_token_feed(token):
+    """(tipo, id) do token, ou None se a assinatura não confere."""
+    try:
+        tipo, alvo_id = _serializador().loads(token)
+    except (BadSignature, TypeError, ValueError):
+        return None
+    if tipo not in ('sala', 'usuario') or not isinstance(alvo_id, int):
+        return None
+    return tipo, alvo_id
+
+# --- Registro de alterações (tombstones incluídos) ---
+
+def primeira_ocorrencia(serie):
+    """Início (datetime) da primeira data da regra, contando as exceções (DTSTART do VEVENT)."""
+    regra = serie.regra
+    regra.excecoes = set()
+    data = next(regra.datas(), serie.data_inicio)
+    return ocorrencia_unica(data, serie.hora_inicio, serie.hora_fim)[1]
+
+def alteracao_reserva(reserva, removido=False):
+    return dict(sala_id=reserva.sala_id, user_id=reserva.user_id, uid=uid_reserva(reserva.id),
+                inicio=reserva.inicio, removido=removido)
+
+def alteracao_serie(serie, removido=False):
+    return dict(sala_id=serie.sala_id, user_id=serie.user_id, uid=uid_serie(serie.id),
+                inicio=primeira_ocorrencia(serie), removido=removido)
+
+def registrar_alteracao_calendario(alteracoes):
+    """Anota eventos criados, alterados ou removidos dos feeds; chamar antes do commit.
+
+    A versão 'calendario' é incrementada antes da inserção: o upsert trava
+    a linha até o commit, então os ids do registro (os tokens `since`)
+    ficam na mesma ordem dos commits e nenhum cliente pula uma alteração.
+    Toda alteração dos feeds é também uma alteração de reservas: as duas
+    versões sobem juntas, na ordem fixa de incrementar_versoes.
+    """
+    alteracoes = list(alteracoes)
+    if not alteracoes:
+        return
+    incrementar_versoes('reservas', 'calendario')
+    agora = get_now_br_naive()
+    db.session.execute(insert(AlteracaoCalendario), [dict(a, criado_em=agora) for a in alteracoes])
+
+def registrar_remocao_sala(sala_id, corte):
+    """Tombstones dos eventos de uma sala que vai ser excluída (somem dos feeds dos usuários)."""
+    reservas = db.session.execute(
+        _reservas_avulsas(Reserva.sala_id == sala_id, corte)
+        .with_only_columns(Reserva.id, Reserva.sala_id, Reserva.user_id, Reserva.inicio)
+    ).all()
+    series = Serie.query.filter(Serie.sala_id == sala_id, Serie.data_fim >= corte.date()).all()
+    registrar_alteracao_calendario(
+        [alteracao_reserva(r, removido=True) for r in reservas]
+        + [alteracao_serie(s, removido=True) for s in series]
+    )
+
+# --- Consultas dos feeds ---
+
+def _filtro(modelo, tipo, alvo_id):
+    return (modelo.sala_id if tipo == 'sala' else modelo.user_id) == alvo_id
+
+def _reservas_avulsas(filtro, corte):
+    # Reservas fora de séries (ou de séries antigas, sem regra gravada): um VEVENT cada.
+    # As das séries saem como um único VEVENT com RRULE.
+    return (select(Reserva).outerjoin(Serie, Serie.id == Reserva.recorrencia_id)
+            .where(filtro, Reserva.inicio >= corte, Serie.id.is_(None))
+            .order_by(Reserva.inicio, Reserva.id))
+
+def ultima_alteracao(tipo, alvo_id):
+    """(id, criado_em) da alteração mais recente do feed, ou None (índice (sala|user, id))."""
+    return db.session.execute(
+        select(AlteracaoCalendario.id, AlteracaoCalendario.criado_em)
+        .where(_filtro(AlteracaoCalendario, tipo, alvo_id))
+        .order_by(AlteracaoCalendario.id.desc()).limit(1)
+    ).first()
+
+def token_valido(desde):
+    """Se o registro ainda cobre tudo depois de `desde` (as entradas antigas são podadas)."""
+    menor = db.session.scalar(select(func.min(AlteracaoCalendario.id)))
+    return menor is not None and desde >= menor - 1
+
+def eventos_feed(tipo, alvo_id, corte):
+    """Reservas avulsas e séries do feed que terminam a partir de `corte`, lidas em lotes."""
+    reservas = db.session.scalars(
+        _reservas_avulsas(_filtro(Reserva, tipo, alvo_id), corte).execution_options(yield_per=LOTE_FEED)
+    )
+    series = Serie.query.filter(_filtro(Serie, tipo, alvo_id), Serie.data_fim >= corte.date()) \
+        .order_by(Serie.data_inicio, Serie.id)
+    return reservas, series
+
+def alteracoes_desde(tipo, alvo_id, desde):
+    """Eventos do feed alterados depois do token `desde`: (reservas, series, removidos).
+
+    Vale a última alteração de cada evento; os removidos voltam como as
+    próprias linhas do registro (uid e início).
+    """
+    ultimas = {}
+    for alteracao in AlteracaoCalendario.query.filter(
+        _filtro(AlteracaoCalendario, tipo, alvo_id), AlteracaoCalendario.id > desde
+    ).order_by(AlteracaoCalendario.id):
+        ultimas[alteracao.uid] = alteracao
+    removidos = [a for a in ultimas.values() if a.removido]
+    ids_reservas = [int(uid.split('-', 1)[1]) for uid, a in ultimas.items()
+                    if uid.startswith('reserva-') and not a.removido]
+    ids_series = [uid.split('-', 1)[1] for uid, a in ultimas.items()
+                  if uid.startswith('serie-') and not a.removido]
+    reservas = Reserva.query.filter(Reserva.id.in_(ids_reservas)).all() if ids_reservas else []
+    series = Serie.query.filter(Serie.id.in_(ids_series)).all() if ids_series else []
+    return reservas, series, removidos
+
+# --- Geração do iCalendar ---
+
+def _texto(valor):
+    return (str(valor or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def _dobrar(linha):
+    # Linhas de no máximo 75 octetos; as continuações começam com um espaço
+    if len(linha.encode('utf-8')) <= 75:
+        return linha + '\r\n'
+    partes, atual, tamanho = [], '', 0
+    for caractere in linha:
+        octetos = len(caractere.encode('utf-8'))
+        if tamanho + octetos > 75:
+            partes.append(atual)
+            atual, tamanho = ' ', 1
+        atual += caractere
+        tamanho += octetos
+    partes.append(atual)
+    return '\r\n'.join(partes) + '\r\n'
+
+def _local(valor):
+    return valor.strftime('%Y%m%dT%H%M%S')
+
+def _utc(valor):
+    return FUSO.localize(valor).astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def _evento(uid, criado_em, inicio, fim, assunto, local, descricao, extras=()):
+    return [
+        'BEGIN:VEVENT',
+        f'UID:{uid}@{DOMINIO_UID}',
+        f'DTSTAMP:{_utc(criado_em or inicio)}',
+        f'DTSTART;TZID=America/Recife:{_local(inicio)}',
+        f'DTEND;TZID=America/Recife:{_local(fim)}',
+        *extras,
+        f'SUMMARY:{_texto(assunto)}',
+        f'LOCATION:{_texto(local)}',
+        f'DESCRIPTION:{_texto(descricao)}',
+        'END:VEVENT',
+    ]
+
+def _local_sala(salas, sala_id):
+    sala = salas.get(sala_id)
+    if sala is None:
+        return ''
+    return f'{sala.nome} - {sala.andar}' if sala.andar else sala.nome
+
+def _descricao(item):
+    return f'Solicitante: {item.nome_solicitante}\nSetor: {item.setor}'
+
+def _rrule(serie):
+    partes = [f'FREQ={"WEEKLY" if serie.frequencia == "semanal" else "MONTHLY"}', f'INTERVAL={serie.intervalo}']
+    if serie.frequencia == 'semanal':
+        # WKST=MO: o intervalo conta semanas a partir da segunda-feira, como em Regra
+        dias = [DIAS_ICS[dia] for dia in serie.regra.dias_semana if 0 <= dia < len(DIAS_ICS)]
+        if len(dias) < len(serie.regra.dias_semana):
+            logger.warning('Série %s: dias da semana inválidos fora do feed: %s', serie.id, serie.dias_semana)
+        partes.append('BYDAY=' + ','.join(dias or [DIAS_ICS[serie.data_inicio.weekday()]]))
+        partes.append('WKST=MO')
+    elif serie.data_inicio.day > 28:
+        # Dia 29-31: nos meses mais curtos a regra cai no último dia do mês
+        dias = ','.join(str(dia) for dia in range(28, serie.data_inicio.day + 1))
+        partes.append(f'BYMONTHDAY={dias};BYSETPOS=-1')
+    else:
+        partes.append(f'BYMONTHDAY={serie.data_inicio.day}')
+    partes.append(f'UNTIL={_utc(datetime.combine(serie.data_fim, time(23, 59, 59)))}')
+    return 'RRULE:' + ';'.join(partes)
+
+def evento_reserva(reserva, salas):
+    return _evento(uid_reserva(reserva.id), reserva.data_criacao, reserva.inicio, reserva.fim,
+                   reserva.assunto, _local_sala(salas, reserva.sala_id), _descricao(reserva))
+
+def evento_serie(serie, salas):
+    """Um VEVENT para a série inteira: RRULE da regra e EXDATE das datas canceladas."""
+    inicio = primeira_ocorrencia(serie)
+    fim = ocorrencia_unica(inicio.date(), serie.hora_inicio, serie.hora_fim)[2]
+    extras = [_rrule(serie)]
+    excecoes = sorted(serie.regra.excecoes)
+    if excecoes:
+        extras.append('EXDATE;TZID=America/Recife:' + ','.join(
+            _local(datetime.combine(data, serie.hora_inicio)) for data in excecoes
+        ))
+    return _evento(uid_serie(serie.id), serie.data_criacao, inicio, fim, serie.assunto,
+                   _local_sala(salas, serie.sala_id), _descricao(serie), extras)
+
+def eventos_series(series, salas):
+    """VEVENTs das séries; uma série com regra inválida fica fora do feed (com aviso no log)."""
+    for serie in series:
+        try:
+            yield evento_serie(serie, salas)
+        except ValueError:
+            logger.warning('Série %s fora do feed: regra inválida', serie.id, exc_info=True)
+
+def evento_removido(alteracao):
+    return [
+        'BEGIN:VEVENT',
+        f'UID:{alteracao.uid}@{DOMINIO_UID}',
+        f'DTSTAMP:{_utc(alteracao.criado_em)}',
+        f'DTSTART;TZID=America/Recife:{_local(alteracao.inicio)}',
+        'STATUS:CANCELLED',
+        'END:VEVENT',
+    ]
+
+def gerar_ics(nome, eventos, token_sync):
+    """Gera o VCALENDAR em blocos de ~TAMANHO_BLOCO; `eventos` é um iterável de listas de linhas."""
+    cabecalho = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//SES-PE//Sistema de Reunioes//PT-BR',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_texto(nome)}',
+        'X-WR-TIMEZONE:America/Recife',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT15M',
+        'X-PUBLISHED-TTL:PT15M',
+        f'X-SISTEMA-SYNC-TOKEN:{token_sync}',
+        *VTIMEZONE,
+    ]
+    bloco = [_dobrar(linha) for linha in cabecalho]
+    tamanho = 0
+    for evento in eventos:
+        for linha in evento:
+            linha = _dobrar(linha)
+            bloco.append(linha)
+            tamanho += len(linha)
+        if tamanho >= TAMANHO_BLOCO:
+            yield ''.join(bloco)
+            bloco, tamanho = [], 0
+    bloco.append(_dobrar('END:VCALENDAR'))
+    yield ''.join(bloco)
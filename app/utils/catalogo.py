@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from app.models import db, Sala
+from app.utils.versoes import ler_versao, incrementar_versao
+
+class SalaInfo:
+    """Registro compacto de uma sala, lido do catálogo (não é instância ORM)."""
+    __slots__ = ('id', 'nome', 'andar', 'ordem')
+
+    def __init__(self, id, nome, andar, ordem):
+        self.id = id
+        self.nome = nome
+        self.andar = andar
+        self.ordem = ordem
+
+    def __repr__(self):
+        return f'<SalaInfo {self.nome}>'
+
+class CatalogoSalas:
+    """Cópia em memória das salas, recarregada quando a versão 'salas' muda.
+
+    A versão é conferida no banco no máximo a cada `intervalo` segundos, de
+    modo que as rotas não consultam a tabela sala no caminho quente.
+    """
+
+    def __init__(self, intervalo=5):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._versao = None
+        self._verificado_em = 0.0
+        self._salas = ()
+        self._por_nome = ()
+        self._por_id = {}
+
+    def _atualizar(self):
+        agora = time.monotonic()
+        if self._versao is not None and agora - self._verificado_em < self.intervalo:
+            return
+        with self._lock:
+            if self._versao is not None and agora - self._verificado_em < self.intervalo:
+                return
+            versao = ler_versao('salas')
+            if versao != self._versao:
+                linhas = db.session.query(Sala.id, Sala.nome, Sala.andar, Sala.ordem) \
+                    .order_by(Sala.ordem, Sala.id).all()
+                salas = tuple(SalaInfo(*linha) for linha in linhas)
+                self._salas = salas
+                self._por_nome = tuple(sorted(salas, key=lambda sala: sala.nome))
+                self._por_id = {sala.id: sala for sala in salas}
+                self._versao = versao
+            self._verificado_em = agora
+
+    def todas(self):
+        """Salas na ordem do painel (Sala.ordem)."""
+        self._atualizar()
+        return self._salas
+
+    def por_nome(self):
+        self._atualizar()
+        return self._por_nome
+
+    def por_id(self):
+        self._atualizar()
+        return self._por_id
+
+    def get(self, sala_id):
+        return self.por_id().get(sala_id)
+
+    def versao(self):
+        """Versão 'salas' da cópia em memória (a das salas devolvidas acima)."""
+        self._atualizar()
+        return self._versao
+
+    def invalidar(self):
+        """Força a releitura no próximo acesso (usado após gravar neste worker)."""
+        with self._lock:
+            self._versao = None
+
+catalogo_salas = CatalogoSalas(intervalo=float(os.environ.get('CATALOGO_INTERVALO', 5)))
+
+def registrar_alteracao_salas():
+    """Marca a tabela sala como alterada; chamar antes do commit da gravação."""
+    incrementar_versao('salas')
@@ -0,0 +1,44 @@
+import hashlib
+import os
+from flask import request, session, make_response
+from flask_login import current_user
+
+def _assinatura_templates():
+    # Muda a cada deploy que altera os templates; igual em todos os workers do mesmo deploy
+    pasta = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates')
+    partes = []
+    for nome in sorted(os.listdir(pasta)):
+        info = os.stat(os.path.join(pasta, nome))
+        partes.append(f'{nome}:{info.st_size}:{info.st_mtime_ns}')
+    return hashlib.sha1('|'.join(partes).encode()).hexdigest()[:8]
+
+ASSINATURA_TEMPLATES = _assinatura_templates()
+
+def etag_pagina(*partes):
+    """ETag da página atual para o usuário logado.
+
+    Combina os templates, o usuário (o menu depende do nome e de ser
+    admin), a URL com os argumentos e as `partes` que definem o conteúdo
+    (ex.: versões de reservas e salas, minuto atual).
+    """
+    chave = (ASSINATURA_TEMPLATES, current_user.id, current_user.username, current_user.is_admin,
+             request.full_path) + partes
+    return hashlib.sha1(repr(chave).encode()).hexdigest()[:20]
+
+def resposta_condicional(etag, renderizar):
+    """Responde 304 se o navegador já tem a página `etag`; senão chama `renderizar`.
+
+    Com mensagens flash pendentes a página é sempre renderizada (e sem
+    ETag): as mensagens são consumidas por esta resposta e não podem ser
+    reaproveitadas depois.
+    """
+    if '_flashes' in session:
+        return renderizar()
+    if request.if_none_match.contains_weak(etag):
+        resposta = make_response('', 304)
+    else:
+        resposta = make_response(renderizar())
+    resposta.set_etag(etag, weak=True)
+    # Por usuário e sempre revalidada: o navegador guarda, mas pergunta antes de usar
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
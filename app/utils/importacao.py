@@ -0,0 +1,336 @@
+"""Importação em massa de salas, usuários e reservas a partir de CSV.
+
+O arquivo é lido em fluxo, `lote` linhas por vez: cada lote é validado,
+conferido contra o banco com consultas por conjunto (IN e os conflitos
+de reservas.buscar_conflitos) e gravado com um único INSERT na sua
+própria transação. Linhas inválidas não interrompem a importação; ficam
+no relatório de erros com o número da linha no arquivo.
+
+Um arquivo que falha no meio (codificação, CSV malformado, erro do banco)
+deixa gravados os lotes anteriores: o resultado sai com `interrompida` e
+o aviso de ResultadoImportacao.aviso_interrupcao. Importar o mesmo arquivo
+de novo é seguro: salas e usuários repetidos e reservas em horário ocupado
+são recusados, então nenhuma linha é gravada duas vezes.
+"""
+import csv
+import logging
+import time
+import unicodedata
+from datetime import datetime
+from itertools import chain, islice
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app.models import db, Sala, Usuario
+from app.utils.catalogo import catalogo_salas, registrar_alteracao_salas
+from app.utils.reservas import ConflitoReserva, criar_reservas_em_lote, invalidar_caches_reservas
+from app.utils.senhas import gerar_hashes
+
+logger = logging.getLogger(__name__)
+
+# Linhas validadas e gravadas por transação
+LOTE_IMPORTACAO = 1000
+
+# Cabeçalhos aceitos (minúsculos e sem acento) de cada coluna. Os de reservas
+# são os da exportação da listagem; as colunas ID e Recorrente são ignoradas.
+COLUNAS = {
+    'salas': {
+        'nome': ('nome', 'sala'),
+        'andar': ('andar',),
+    },
+    'usuarios': {
+        'username': ('username', 'usuario', 'login'),
+        'senha': ('senha', 'password'),
+        'is_admin': ('admin', 'is_admin', 'administrador'),
+    },
+    'reservas': {
+        'sala': ('sala',),
+        'assunto': ('assunto',),
+        'nome_solicitante': ('solicitante', 'nome_solicitante'),
+        'setor': ('setor',),
+        'telefone': ('telefone',),
+        'inicio': ('inicio',),
+        'fim': ('fim',),
+        'usuario': ('usuario', 'username'),
+    },
+}
+OBRIGATORIAS = {
+    'salas': ('nome',),
+    'usuarios': ('username', 'senha'),
+    'reservas': ('sala', 'assunto', 'nome_solicitante', 'setor', 'telefone', 'inicio', 'fim'),
+}
+
+# Tamanho máximo de cada campo de texto (o das colunas do modelo)
+TAMANHOS = {'nome': 50, 'andar': 20, 'username': 50, 'assunto': 100, 'nome_solicitante': 100,
+            'setor': 100, 'telefone': 20}
+
+# O formato da exportação primeiro; depois ISO, com espaço ou T
+FORMATOS_DATA = ('%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S',
+                 '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S')
+
+VERDADEIRO = {'sim', 's', 'true', '1', 'x'}
+FALSO = {'', 'nao', 'n', 'false', '0'}
+
+class ErroImportacao(ValueError):
+    """O arquivo não pode ser importado (tipo desconhecido ou coluna obrigatória ausente)."""
+
+class ResultadoImportacao:
+    """Contagens, erros por linha e tempo de uma importação."""
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.lidas = 0
+        self.importadas = 0
+        self.erros = []  # (linha do arquivo, mensagem)
+        self.duracao = 0.0
+        self.interrompida = None  # motivo, se o arquivo parou no meio
+        self.ultima_linha = 0  # última linha do último lote processado
+
+    def erro(self, linha, mensagem):
+        self.erros.append((linha, mensagem))
+
+    def aviso_interrupcao(self):
+        """O que ficou gravado de uma importação interrompida e como retomá-la."""
+        if not self.interrompida:
+            return ''
+        if not self.importadas:
+            return f"{self.interrompida} Nenhuma linha foi gravada."
+        return (f"{self.interrompida} A importação parou depois da linha {self.ultima_linha}: as "
+                f"{self.importadas} linha(s) dos lotes anteriores ficaram gravadas. Corrija o arquivo e "
+                "importe-o de novo inteiro; as linhas já gravadas voltam como repetidas ou em horário "
+                "ocupado e não são importadas duas vezes.")
+
+    @property
+    def linhas_por_segundo(self):
+        return self.lidas / self.duracao if self.duracao else 0.0
+
+def _normalizar(texto):
+    sem_acento = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode()
+    return sem_acento.strip().lower()
+
+def _ler_registros(arquivo, tipo):
+    """(linha, {coluna: valor}) de cada registro não vazio do CSV aberto em modo texto."""
+    primeira = arquivo.readline()
+    # Ponto e vírgula (Excel pt-BR, exportação) ou vírgula, pelo que aparece mais no cabeçalho
+    delimitador = ';' if primeira.count(';') >= primeira.count(',') else ','
+    leitor = csv.reader(chain([primeira], arquivo), delimiter=delimitador)
+    cabecalho = [_normalizar(nome) for nome in next(leitor, [])]
+
+    posicoes = {}
+    for coluna, nomes in COLUNAS[tipo].items():
+        posicao = next((cabecalho.index(nome) for nome in nomes if nome in cabecalho), None)
+        if posicao is not None:
+            posicoes[coluna] = posicao
+    ausentes = [COLUNAS[tipo][coluna][0] for coluna in OBRIGATORIAS[tipo] if coluna not in posicoes]
+    if ausentes:
+        raise ErroImportacao(f"Coluna(s) obrigatória(s) ausente(s) no cabeçalho: {', '.join(ausentes)}.")
+
+    for campos in leitor:
+        if not any(campo.strip() for campo in campos):
+            continue
+        yield leitor.line_num, {coluna: campos[posicao].strip() if posicao < len(campos) else ''
+                                for coluna, posicao in posicoes.items()}
+
+def _texto(registro, coluna, obrigatorio=True):
+    valor = registro.get(coluna, '')
+    if obrigatorio and not valor:
+        raise ValueError(f"Campo '{coluna}' vazio.")
+    if len(valor) > TAMANHOS[coluna]:
+        raise ValueError(f"Campo '{coluna}' passa de {TAMANHOS[coluna]} caracteres.")
+    return valor
+
+def _data_hora(valor, coluna):
+    # dd/mm/aaaa hh:mm (o da exportação) sem strptime, que domina o tempo de validação
+    if len(valor) == 16 and valor[2] == valor[5] == '/' and valor[10] == ' ' and valor[13] == ':':
+        try:
+            return datetime(int(valor[6:10]), int(valor[3:5]), int(valor[:2]), int(valor[11:13]), int(valor[14:]))
+        except ValueError:
+            pass
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            pass
+    raise ValueError(f"Data/hora inválida em '{coluna}': {valor!r} (use dd/mm/aaaa hh:mm).")
+
+def _booleano(valor):
+    valor = _normalizar(valor)
+    if valor in VERDADEIRO:
+        return True
+    if valor in FALSO:
+        return False
+    raise ValueError(f"Valor de admin inválido: {valor!r} (use sim ou não).")
+
+def _importar_salas(lote, resultado, estado):
+    validas = []
+    for linha, registro in lote:
+        try:
+            nome = _texto(registro, 'nome')
+            andar = _texto(registro, 'andar', obrigatorio=False) or estado['andar_padrao']
+        except ValueError as e:
+            resultado.erro(linha, str(e))
+            continue
+        if nome in estado['vistos']:
+            resultado.erro(linha, f"Sala '{nome}' repetida no arquivo.")
+            continue
+        estado['vistos'].add(nome)
+        validas.append((linha, {'nome': nome, 'andar': andar}))
+
+    existentes = set(db.session.scalars(select(Sala.nome).where(Sala.nome.in_([s['nome'] for _, s in validas]))))
+    novas = []
+    for linha, sala in validas:
+        if sala['nome'] in existentes:
+            resultado.erro(linha, f"Já existe uma sala chamada '{sala['nome']}'.")
+        else:
+            estado['ordem'] += 1
+            novas.append(dict(sala, ordem=estado['ordem']))
+    if novas:
+        db.session.execute(insert(Sala), novas)
+        registrar_alteracao_salas()
+        db.session.commit()
+        resultado.importadas += len(novas)
+
+def _importar_usuarios(lote, resultado, estado):
+    validos = []
+    for linha, registro in lote:
+        try:
+            username = _texto(registro, 'username')
+            senha = registro['senha']
+            if not senha:
+                raise ValueError("Campo 'senha' vazio.")
+            is_admin = _booleano(registro.get('is_admin', ''))
+        except ValueError as e:
+            resultado.erro(linha, str(e))
+            continue
+        if username in estado['vistos']:
+            resultado.erro(linha, f"Usuário '{username}' repetido no arquivo.")
+            continue
+        estado['vistos'].add(username)
+        validos.append((linha, username, senha, is_admin))
+
+    existentes = set(db.session.scalars(
+        select(Usuario.username).where(Usuario.username.in_([u[1] for u in validos]))
+    ))
+    for linha, username, _, _ in validos:
+        if username in existentes:
+            resultado.erro(linha, f"Nome de usuário '{username}' já existe.")
+    novos = [u for u in validos if u[1] not in existentes]
+    if not novos:
+        return
+    # Os hashes (a parte cara da importação) são calculados em paralelo
+    hashes = gerar_hashes([u[2] for u in novos], estado['concorrencia_senhas'])
+    try:
+        db.session.execute(insert(Usuario), [
+            {'username': username, 'senha_hash': senha_hash, 'is_admin': is_admin}
+            for (_, username, _, is_admin), senha_hash in zip(novos, hashes)
+        ])
+        db.session.commit()
+    except IntegrityError:
+        # Alguém criou um destes usuários entre a consulta e o INSERT
+        db.session.rollback()
+        for linha, username, _, _ in novos:
+            resultado.erro(linha, f"Usuário '{username}' não gravado: o lote foi criado ao mesmo tempo em "
+                                  "outra sessão. Importe o arquivo de novo.")
+        return
+    resultado.importadas += len(novos)
+
+def _importar_reservas(lote, resultado, estado):
+    # Usuários do lote ainda não resolvidos: uma consulta por lote
+    nomes = {registro['usuario'] for _, registro in lote if registro.get('usuario')} - estado['usuarios'].keys()
+    if nomes:
+        estado['usuarios'].update(db.session.execute(
+            select(Usuario.username, Usuario.id).where(Usuario.username.in_(nomes))
+        ).all())
+        estado['usuarios'].update((nome, None) for nome in nomes - estado['usuarios'].keys())
+
+    linhas, numeros = [], []
+    for linha, registro in lote:
+        try:
+            sala_id = estado['salas'].get(registro['sala'].casefold())
+            if sala_id is None:
+                raise ValueError(f"Sala '{registro['sala']}' não encontrada.")
+            username = registro.get('usuario')
+            user_id = estado['usuarios'].get(username) if username else estado['usuario_padrao']
+            if user_id is None:
+                raise ValueError(f"Usuário '{username}' não encontrado." if username else "Usuário não informado.")
+            inicio = _data_hora(registro['inicio'], 'inicio')
+            fim = _data_hora(registro['fim'], 'fim')
+            if fim <= inicio:
+                raise ValueError("O fim deve ser depois do início.")
+            dados = {coluna: _texto(registro, coluna) for coluna in ('assunto', 'nome_solicitante', 'setor')}
+            dados['telefone'] = _texto(registro, 'telefone', obrigatorio=False)
+        except ValueError as e:
+            resultado.erro(linha, str(e))
+            continue
+        linhas.append(dict(dados, sala_id=sala_id, user_id=user_id, inicio=inicio, fim=fim,
+                           recorrencia_id=None, is_recorrente=False))
+        numeros.append(linha)
+    if not linhas:
+        return
+
+    try:
+        livres, conflitos = criar_reservas_em_lote(linhas)
+    except ConflitoReserva:
+        for linha in numeros:
+            resultado.erro(linha, "Salas do lote ocupadas por outra gravação; importe estas linhas de novo.")
+        return
+    for i in sorted(conflitos):
+        resultado.erro(numeros[i], "Horário ocupado: conflita com uma reserva existente ou com uma linha "
+                                   "anterior do arquivo.")
+    resultado.importadas += len(livres)
+
+IMPORTADORES = {
+    'salas': _importar_salas,
+    'usuarios': _importar_usuarios,
+    'reservas': _importar_reservas,
+}
+
+def importar_csv(tipo, arquivo, lote=LOTE_IMPORTACAO, usuario_padrao=None, concorrencia_senhas=None):
+    """Importa o CSV `arquivo` (aberto em modo texto) de salas, usuários ou reservas.
+
+    `usuario_padrao` é o id do dono das reservas sem a coluna Usuário
+    preenchida; `concorrencia_senhas`, o número de hashes calculados ao
+    mesmo tempo (padrão: um por núcleo). Levanta ErroImportacao se o
+    cabeçalho não servir; os demais problemas ficam em
+    ResultadoImportacao.erros, ou em ResultadoImportacao.interrompida se
+    o arquivo parar no meio (os lotes já gravados continuam gravados).
+    """
+    if tipo not in IMPORTADORES:
+        raise ErroImportacao(f"Tipo de importação desconhecido: {tipo}.")
+    resultado = ResultadoImportacao(tipo)
+    inicio = time.perf_counter()
+    estado = {'vistos': set(), 'concorrencia_senhas': concorrencia_senhas}
+    if tipo == 'salas':
+        estado['andar_padrao'] = Sala.__table__.c.andar.default.arg
+        estado['ordem'] = db.session.scalar(select(func.coalesce(func.max(Sala.ordem), -1)))
+    elif tipo == 'reservas':
+        estado['salas'] = {sala.nome.casefold(): sala.id for sala in catalogo_salas.todas()}
+        estado['usuarios'] = {}
+        estado['usuario_padrao'] = usuario_padrao
+
+    registros = _ler_registros(arquivo, tipo)
+    try:
+        while True:
+            bloco = list(islice(registros, lote))
+            if not bloco:
+                break
+            resultado.lidas += len(bloco)
+            IMPORTADORES[tipo](bloco, resultado, estado)
+            resultado.ultima_linha = bloco[-1][0]
+    except UnicodeDecodeError:
+        db.session.rollback()
+        resultado.interrompida = 'O arquivo não está em UTF-8 (no Excel, salve como "CSV UTF-8").'
+    except csv.Error as e:
+        db.session.rollback()
+        resultado.interrompida = f"CSV malformado: {e}."
+    except SQLAlchemyError:
+        db.session.rollback()
+        logger.exception("Importação de %s interrompida depois da linha %s", tipo, resultado.ultima_linha)
+        resultado.interrompida = "Erro ao gravar no banco de dados."
+    finally:
+        if tipo == 'salas' and resultado.importadas:
+            catalogo_salas.invalidar()
+            invalidar_caches_reservas()
+        resultado.duracao = time.perf_counter() - inicio
+        # Conflitos só aparecem depois da validação do lote: o relatório segue a ordem do arquivo
+        resultado.erros.sort(key=lambda erro: erro[0])
+    return resultado
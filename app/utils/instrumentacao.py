@@ -0,0 +1,200 @@
+from collections import defaultdict
+import cProfile
+import logging
+import os
+import threading
+import time
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos buckets do histograma de latência no /metrics
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class EstatisticasEndpoints:
+    """Acumula, por endpoint, tempo total, SQL e renderização de templates deste processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dados = defaultdict(lambda: {
+            'requisicoes': 0, 'tempo': 0.0, 'tempo_max': 0.0,
+            'sql': 0, 'sql_tempo': 0.0, 'template_tempo': 0.0,
+            'buckets': [0] * len(BUCKETS),
+        })
+
+    def registrar(self, endpoint, tempo, sql, sql_tempo, template_tempo):
+        with self._lock:
+            item = self._dados[endpoint]
+            item['requisicoes'] += 1
+            item['tempo'] += tempo
+            item['tempo_max'] = max(item['tempo_max'], tempo)
+            item['sql'] += sql
+            item['sql_tempo'] += sql_tempo
+            item['template_tempo'] += template_tempo
+            for i, limite in enumerate(BUCKETS):
+                if tempo <= limite:
+                    item['buckets'][i] += 1
+
+    def resumo(self):
+        """Lista de dicionários por endpoint, do maior tempo total para o menor."""
+        with self._lock:
+            itens = [dict(item, endpoint=endpoint, buckets=list(item['buckets']))
+                     for endpoint, item in self._dados.items()]
+        for item in itens:
+            n = item['requisicoes']
+            item['tempo_medio_ms'] = item['tempo'] / n * 1000
+            item['sql_medio'] = item['sql'] / n
+            item['sql_medio_ms'] = item['sql_tempo'] / n * 1000
+            item['template_medio_ms'] = item['template_tempo'] / n * 1000
+        return sorted(itens, key=lambda item: item['tempo'], reverse=True)
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+estatisticas_endpoints = EstatisticasEndpoints()
+
+def _medicao():
+    # Acumuladores da requisição atual (None fora de requisições instrumentadas)
+    return g.get('_instrumentacao') if has_request_context() else None
+
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    conn.info['_inicio_sql'] = time.perf_counter()
+
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info.pop('_inicio_sql', None)
+    medicao = _medicao()
+    if medicao is not None and inicio is not None:
+        medicao['sql'] += 1
+        medicao['sql_tempo'] += time.perf_counter() - inicio
+
+def _antes_template(app, template, context, **extra):
+    medicao = _medicao()
+    if medicao is not None:
+        medicao['templates'].append(time.perf_counter())
+
+def _depois_template(app, template, context, **extra):
+    medicao = _medicao()
+    if medicao is not None and medicao['templates']:
+        inicio = medicao['templates'].pop()
+        # Só a renderização mais externa conta, para não somar duas vezes
+        if not medicao['templates']:
+            medicao['template_tempo'] += time.perf_counter() - inicio
+
+def _iniciar_perfilador(ferramenta):
+    if ferramenta == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("PERFIL_FERRAMENTA=pyinstrument, mas o pacote não está instalado; usando cProfile.")
+        else:
+            perfilador = Profiler()
+            perfilador.start()
+            return perfilador
+    perfilador = cProfile.Profile()
+    try:
+        perfilador.enable()
+    except ValueError:
+        # Python 3.12+: só um cProfile ativo por processo; requisições simultâneas ficam sem perfil
+        return None
+    return perfilador
+
+def _salvar_perfil(perfilador, pasta, endpoint, duracao):
+    os.makedirs(pasta, exist_ok=True)
+    base = os.path.join(pasta, f"{time.strftime('%Y%m%d_%H%M%S')}_{endpoint}_{duracao * 1000:.0f}ms_{os.getpid()}")
+    if isinstance(perfilador, cProfile.Profile):
+        perfilador.dump_stats(base + '.prof')
+    else:
+        with open(base + '.html', 'w', encoding='utf-8') as arquivo:
+            arquivo.write(perfilador.output_html())
+
+def instrumentar_app(app, engine):
+    """Liga a coleta por endpoint: tempo total, SQL (eventos do engine) e templates (sinais do Flask).
+
+    Com PERFIL_LENTAS_MS configurado, cada requisição roda sob o perfilador e
+    as que passam do limite são gravadas em PERFIL_PASTA (.prof do cProfile
+    ou .html do pyinstrument).
+    """
+    limite_lentas = app.config['PERFIL_LENTAS_MS']
+    ferramenta = app.config['PERFIL_FERRAMENTA']
+    pasta = app.config['PERFIL_PASTA']
+
+    event.listen(engine, 'before_cursor_execute', _antes_sql)
+    event.listen(engine, 'after_cursor_execute', _depois_sql)
+    before_render_template.connect(_antes_template, app)
+    template_rendered.connect(_depois_template, app)
+
+    @app.before_request
+    def iniciar_medicao():
+        g._instrumentacao = {
+            'inicio': time.perf_counter(), 'sql': 0, 'sql_tempo': 0.0,
+            'template_tempo': 0.0, 'templates': [],
+            'perfilador': _iniciar_perfilador(ferramenta) if limite_lentas else None,
+        }
+
+    # No teardown: respostas em streaming (exportação, painel SSE) contam até o fim
+    @app.teardown_request
+    def encerrar_medicao(erro=None):
+        medicao = g.pop('_instrumentacao', None)
+        if medicao is None:
+            return
+        duracao = time.perf_counter() - medicao['inicio']
+        endpoint = request.endpoint or 'sem_rota'
+        estatisticas_endpoints.registrar(
+            endpoint, duracao, medicao['sql'], medicao['sql_tempo'], medicao['template_tempo']
+        )
+
+        perfilador = medicao['perfilador']
+        if perfilador is not None:
+            if isinstance(perfilador, cProfile.Profile):
+                perfilador.disable()
+            else:
+                perfilador.stop()
+            if duracao * 1000 >= limite_lentas:
+                _salvar_perfil(perfilador, pasta, endpoint, duracao)
+
+def _linha(nome, valor, **rotulos):
+    if rotulos:
+        texto = ','.join(f'{chave}="{valor_rotulo}"' for chave, valor_rotulo in rotulos.items())
+        return f'{nome}{{{texto}}} {valor}'
+    return f'{nome} {valor}'
+
+def formatar_prometheus(endpoints, pool):
+    """Texto no formato de exposição do Prometheus (métricas deste processo)."""
+    linhas = []
+
+    def metrica(nome, tipo, ajuda):
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+
+    metrica('sistema_requisicao_segundos', 'histogram', 'Tempo total das requisições por endpoint.')
+    for item in endpoints:
+        for limite, quantidade in zip(BUCKETS, item['buckets']):
+            linhas.append(_linha('sistema_requisicao_segundos_bucket', quantidade, endpoint=item['endpoint'], le=limite))
+        linhas.append(_linha('sistema_requisicao_segundos_bucket', item['requisicoes'], endpoint=item['endpoint'], le='+Inf'))
+        linhas.append(_linha('sistema_requisicao_segundos_sum', item['tempo'], endpoint=item['endpoint']))
+        linhas.append(_linha('sistema_requisicao_segundos_count', item['requisicoes'], endpoint=item['endpoint']))
+
+    for nome, campo, ajuda in (
+        ('sistema_sql_consultas_total', 'sql', 'Comandos SQL executados por endpoint.'),
+        ('sistema_sql_segundos_total', 'sql_tempo', 'Tempo gasto no banco por endpoint.'),
+        ('sistema_template_segundos_total', 'template_tempo', 'Tempo de renderização de templates por endpoint.'),
+    ):
+        metrica(nome, 'counter', ajuda)
+        for item in endpoints:
+            linhas.append(_linha(nome, item[campo], endpoint=item['endpoint']))
+
+    for nome, tipo, valor, ajuda in (
+        ('sistema_db_pool_checkouts_total', 'counter', pool['checkouts'], 'Conexões retiradas do pool.'),
+        ('sistema_db_pool_espera_segundos_total', 'counter', pool['espera_media_ms'] * pool['checkouts'] / 1000,
+         'Tempo total de espera por uma conexão do pool.'),
+        ('sistema_db_conexoes_abertas_total', 'counter', pool['conexoes_abertas'], 'Conexões novas abertas com o banco.'),
+        ('sistema_db_conexoes_fechadas_total', 'counter', pool['conexoes_fechadas'], 'Conexões com o banco encerradas.'),
+        ('sistema_db_conexoes_invalidadas_total', 'counter', pool['conexoes_invalidadas'], 'Conexões descartadas por erro ou pre-ping.'),
+        ('sistema_db_pool_em_uso', 'gauge', pool.get('em_uso', 0), 'Conexões do pool em uso agora.'),
+    ):
+        metrica(nome, tipo, ajuda)
+        linhas.append(_linha(nome, valor))
+
+    return '\n'.join(linhas) + '\n'
@@ -0,0 +1,53 @@
+from collections import deque
+import threading
+from sqlalchemy import event
+
+class MetricasPool:
+    """Contadores do pool de conexões deste processo (espera no checkout e rotatividade)."""
+
+    def __init__(self, amostras=1000):
+        self._lock = threading.Lock()
+        self._esperas = deque(maxlen=amostras)
+        self.checkouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.conexoes_abertas = 0
+        self.conexoes_fechadas = 0
+        self.conexoes_invalidadas = 0
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+            self._esperas.append(segundos)
+
+    def contar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def resumo(self, pool=None):
+        with self._lock:
+            esperas = sorted(self._esperas)
+            dados = {
+                'checkouts': self.checkouts,
+                'espera_media_ms': self.espera_total / self.checkouts * 1000 if self.checkouts else 0,
+                'espera_max_ms': self.espera_max * 1000,
+                'espera_p99_ms': esperas[min(len(esperas) - 1, int(len(esperas) * 0.99))] * 1000 if esperas else 0,
+                'conexoes_abertas': self.conexoes_abertas,
+                'conexoes_fechadas': self.conexoes_fechadas,
+                'conexoes_invalidadas': self.conexoes_invalidadas,
+            }
+        # Estado instantâneo, quando o pool é um QueuePool
+        if pool is not None and hasattr(pool, 'checkedout'):
+            dados.update(tamanho=pool.size(), em_uso=pool.checkedout(), overflow=pool.overflow())
+        return dados
+
+metricas_pool = MetricasPool()
+
+def instrumentar_engine(engine):
+    """Conta aberturas, fechamentos e invalidações de conexões do engine."""
+    event.listen(engine, 'connect', lambda *a: metricas_pool.contar('conexoes_abertas'))
+    event.listen(engine, 'close', lambda *a: metricas_pool.contar('conexoes_fechadas'))
+    event.listen(engine, 'close_detached', lambda *a: metricas_pool.contar('conexoes_fechadas'))
+    event.listen(engine, 'invalidate', lambda *a: metricas_pool.contar('conexoes_invalidadas'))
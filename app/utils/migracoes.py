@@ -0,0 +1,133 @@
+from sqlalchemy import text
+from sqlalchemy.schema import CreateTable
+from app.models import db, Usuario, Reserva, OcupacaoHora, OcupacaoSerie
+from app.utils.relatorios import reconstruir_ocupacao
+
+# Índices criados depois das tabelas (mesmos nomes dos __table_args__ dos modelos)
+INDICES = [
+    ("ix_reserva_sala_inicio_fim", "reserva (sala_id, inicio, fim)"),
+    ("ix_reserva_user_inicio", "reserva (user_id, inicio)"),
+    ("ix_reserva_inicio_id", "reserva (inicio, id)"),
+    ("ix_reserva_recorrencia_id", "reserva (recorrencia_id)"),
+    ("ix_serie_user_fim", "serie (user_id, data_fim)"),
+]
+
+def inicializar_banco():
+    """Cria as tabelas que faltam e o admin padrão (idempotente)."""
+    db.create_all()
+    if not Usuario.query.filter_by(username='admin').first():
+        print("Criando usuário admin padrão...")
+        admin = Usuario(username='admin', is_admin=True)
+        admin.set_senha('admin123')
+        db.session.add(admin)
+        db.session.commit()
+
+def adicionar_restricao_exclusao(conn):
+    """PostgreSQL: o próprio banco rejeita reservas sobrepostas na mesma sala."""
+    existe = conn.execute(text(
+        "SELECT 1 FROM pg_constraint WHERE conname = 'reserva_sem_sobreposicao'"
+    )).first()
+    if existe:
+        print("Restrição 'reserva_sem_sobreposicao' já existe.")
+        return
+    try:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        # tsrange usa o intervalo [inicio, fim), o mesmo critério de conflito da aplicação
+        conn.execute(text(
+            "ALTER TABLE reserva ADD CONSTRAINT reserva_sem_sobreposicao "
+            "EXCLUDE USING gist (sala_id WITH =, tsrange(inicio, fim) WITH &&)"
+        ))
+        conn.commit()
+        print("Restrição 'reserva_sem_sobreposicao' adicionada com sucesso.")
+    except Exception as e:
+        conn.rollback()
+        print(f"Aviso ao adicionar 'reserva_sem_sobreposicao' (há reservas sobrepostas?): {e}")
+
+def recriar_reserva_autoincrement(conn):
+    """SQLite: recria a tabela reserva com AUTOINCREMENT.
+
+    Sem ele o SQLite reutiliza o maior id depois que essa reserva é
+    arquivada. A sequência começa depois do maior id de reserva e de
+    reserva_arquivo. Os índices são recriados logo depois, pelo laço de
+    INDICES.
+    """
+    definicao = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'reserva'"
+    )).scalar()
+    if definicao is None or 'AUTOINCREMENT' in definicao.upper():
+        print("Tabela 'reserva' já usa AUTOINCREMENT.")
+        return
+    colunas = ', '.join(coluna.name for coluna in Reserva.__table__.columns)
+    criar = str(CreateTable(Reserva.__table__).compile(dialect=conn.dialect))
+    try:
+        # A cópia é feita antes de remover a tabela antiga: uma falha até aqui não perde nada
+        conn.execute(text("DROP TABLE IF EXISTS reserva_nova"))
+        conn.execute(text(criar.replace('CREATE TABLE reserva ', 'CREATE TABLE reserva_nova ', 1)))
+        conn.execute(text(f"INSERT INTO reserva_nova ({colunas}) SELECT {colunas} FROM reserva"))
+        conn.execute(text("DROP TABLE reserva"))
+        conn.execute(text("ALTER TABLE reserva_nova RENAME TO reserva"))
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name IN ('reserva', 'reserva_nova')"))
+        conn.execute(text(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'reserva', MAX("
+            "(SELECT COALESCE(MAX(id), 0) FROM reserva), (SELECT COALESCE(MAX(id), 0) FROM reserva_arquivo))"
+        ))
+        conn.commit()
+        print("Tabela 'reserva' recriada com AUTOINCREMENT.")
+    except Exception as e:
+        conn.rollback()
+        print(f"Aviso ao recriar 'reserva' com AUTOINCREMENT: {e}")
+
+def aplicar_patches():
+    """Ajustes de esquema de bancos antigos (colunas, índices, restrições e agregados)."""
+    # Verifica se estamos usando SQLite ou PostgreSQL
+    engine = db.engine
+
+    print(f"Detectado banco de dados: {engine.url}")
+
+    with engine.connect() as conn:
+        # Tenta adicionar as colunas uma por uma
+        try:
+            conn.execute(text("ALTER TABLE reserva ADD COLUMN recorrencia_id VARCHAR(50)"))
+            conn.commit()
+            print("Coluna 'recorrencia_id' adicionada com sucesso.")
+        except Exception as e:
+            conn.rollback()
+            print(f"Aviso ao adicionar 'recorrencia_id': {e}")
+
+        try:
+            conn.execute(text("ALTER TABLE reserva ADD COLUMN is_recorrente BOOLEAN DEFAULT FALSE"))
+            conn.commit()
+            print("Coluna 'is_recorrente' adicionada com sucesso.")
+        except Exception as e:
+            conn.rollback()
+            print(f"Aviso ao adicionar 'is_recorrente': {e}")
+
+        if engine.dialect.name == 'sqlite':
+            recriar_reserva_autoincrement(conn)
+
+        # IF NOT EXISTS torna a criação dos índices idempotente (SQLite e PostgreSQL)
+        for nome, definicao in INDICES:
+            try:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {nome} ON {definicao}"))
+                conn.commit()
+                print(f"Índice '{nome}' verificado.")
+            except Exception as e:
+                conn.rollback()
+                print(f"Aviso ao criar índice '{nome}': {e}")
+
+        if engine.dialect.name == 'postgresql':
+            adicionar_restricao_exclusao(conn)
+
+        # Atualiza as estatísticas do planejador para que os novos índices sejam usados
+        conn.execute(text("ANALYZE"))
+        conn.commit()
+
+    # Carga inicial dos agregados dos relatórios (só quando ainda estão vazios)
+    sem_hora = not db.session.query(OcupacaoHora.id).first() and db.session.query(Reserva.id).first()
+    sem_serie = not db.session.query(OcupacaoSerie.id).first() \
+        and db.session.query(Reserva.id).filter(Reserva.recorrencia_id.isnot(None)).first()
+    if sem_hora or sem_serie:
+        reconstruir_ocupacao()
+        print("Agregados 'ocupacao_hora' e 'ocupacao_serie' reconstruídos a partir das reservas.")
+
+    print("Migração concluída!")
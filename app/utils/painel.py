@@ -0,0 +1,151 @@
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+import os
+import threading
+import time
+from app.models import db, Reserva
+from app.utils.catalogo import catalogo_salas
+from app.utils.versoes import ler_versao
+
+# Quanto à frente do momento da montagem a linha do tempo carrega reservas
+HORIZONTE = timedelta(hours=6)
+
+ReservaAtual = namedtuple('ReservaAtual', 'id inicio fim nome_solicitante')
+
+class LinhaDoTempo:
+    """Reservas das próximas horas de cada sala e os instantes em que o status muda.
+
+    É compartilhada por todas as telas conectadas ao processo: o banco só é
+    consultado para conferir a versão 'reservas' (no máximo a cada
+    `intervalo` segundos) e para remontar a linha do tempo quando a versão
+    muda ou o horizonte se esgota.
+    """
+
+    def __init__(self, intervalo=2):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._versao = None
+        self._verificado_em = 0.0
+        self._valida_ate = None
+        self._salas = ()
+        self._por_sala = {}
+        self._transicoes = []
+
+    def _precisa_atualizar(self, agora):
+        return (self._versao is None or agora >= self._valida_ate
+                or time.monotonic() - self._verificado_em >= self.intervalo)
+
+    def _atualizar(self, agora):
+        if not self._precisa_atualizar(agora):
+            return
+        with self._lock:
+            if not self._precisa_atualizar(agora):
+                return
+            salas = catalogo_salas.todas()
+            versao = ler_versao('reservas')
+            if versao != self._versao or salas is not self._salas or agora >= self._valida_ate:
+                self._montar(agora, salas)
+                self._versao = versao
+            self._verificado_em = time.monotonic()
+
+    def _montar(self, agora, salas):
+        limite = agora + HORIZONTE
+        por_sala = defaultdict(list)
+        transicoes = set()
+        if salas:
+            linhas = db.session.query(
+                Reserva.id, Reserva.sala_id, Reserva.inicio, Reserva.fim, Reserva.nome_solicitante
+            ).filter(
+                Reserva.sala_id.in_([sala.id for sala in salas]),
+                Reserva.fim >= agora,
+                Reserva.inicio <= limite
+            ).order_by(Reserva.inicio, Reserva.id)
+            for linha in linhas:
+                por_sala[linha.sala_id].append(
+                    ReservaAtual(linha.id, linha.inicio, linha.fim, linha.nome_solicitante)
+                )
+                # O fim é inclusivo: a sala fica livre logo depois dele
+                transicoes.add(linha.inicio)
+                transicoes.add(linha.fim + timedelta(microseconds=1))
+
+        self._salas = salas
+        self._por_sala = dict(por_sala)
+        self._transicoes = sorted(transicoes)
+        self._valida_ate = limite
+
+    def estado(self, agora):
+        """Retorna (salas, {sala_id: ReservaAtual ou None}) no instante `agora`."""
+        self._atualizar(agora)
+        salas, por_sala = self._salas, self._por_sala
+        atuais = {}
+        for sala in salas:
+            # Em fronteiras exatas (fim de uma reserva == início da próxima) vale a mais antiga
+            atuais[sala.id] = next(
+                (r for r in por_sala.get(sala.id, ()) if r.inicio <= agora <= r.fim), None
+            )
+        return salas, atuais
+
+    def proxima_transicao(self, agora):
+        """Próximo instante, após `agora`, em que alguma sala muda de status (ou None)."""
+        transicoes = self._transicoes
+        i = bisect_right(transicoes, agora)
+        return transicoes[i] if i < len(transicoes) else None
+
+    def invalidar(self):
+        with self._lock:
+            self._versao = None
+
+linha_do_tempo = LinhaDoTempo(intervalo=float(os.environ.get('PAINEL_INTERVALO', 2)))
+
+class LimiteConexoes:
+    """Conexões SSE abertas neste processo; as que passam do máximo são recusadas.
+
+    Cada conexão prende uma thread (ou o processo, no modo sync) até
+    encerrar: acima do máximo a tela recebe 204 e passa a consultar o
+    estado periodicamente.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.abertas = 0
+
+    def entrar(self, maximo):
+        with self._lock:
+            if self.abertas >= maximo:
+                return False
+            self.abertas += 1
+            return True
+
+    def sair(self):
+        with self._lock:
+            self.abertas -= 1
+
+conexoes_painel = LimiteConexoes()
+
+def maximo_conexoes_painel():
+    """Padrão de PAINEL_SSE_MAX pelo perfil de workers do gunicorn.conf.py.
+
+    gevent: metade de GUNICORN_CONEXOES; threads: um quarto das threads, o
+    resto fica para as reservas e o login; sync: nenhuma (só consultas).
+    """
+    modo = os.environ.get('GUNICORN_MODO', 'threads')
+    if modo == 'gevent':
+        return int(os.environ.get('GUNICORN_CONEXOES', 1000)) // 2
+    if modo == 'threads':
+        return int(os.environ.get('GUNICORN_THREADS', 8)) // 4
+    return 0
+
+def chave_estado(atuais):
+    """Resumo 'sala:reserva,...' do estado, usado como id dos eventos SSE."""
+    return ','.join(f'{sala_id}:{reserva.id if reserva else 0}' for sala_id, reserva in atuais.items())
+
+def ler_chave_estado(valor):
+    estado = {}
+    for item in (valor or '').split(','):
+        try:
+            sala_id, reserva_id = item.split(':')
+            estado[int(sala_id)] = int(reserva_id)
+        except ValueError:
+            continue
+    return estado
@@ -0,0 +1,116 @@
+from datetime import date, datetime, timedelta
+import calendar
+
+# Frequências do formulário: (frequência da regra, intervalo)
+FREQUENCIAS = {
+    'semanal': ('semanal', 1),
+    'quinzenal': ('semanal', 2),
+    'mensal': ('mensal', 1),
+}
+
+NOMES_DIAS = ('Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom')
+
+def ler_datas(texto):
+    """'2025-01-06,2025-01-13' -> {date, ...} (formato de Serie.excecoes)."""
+    return {date.fromisoformat(parte) for parte in (texto or '').split(',') if parte}
+
+def formatar_datas(datas):
+    return ','.join(sorted(d.isoformat() for d in datas))
+
+def dia_da_semana(valor):
+    """'0'..'6' (ou int) -> 0..6, com 0 = segunda-feira; levanta ValueError fora disso."""
+    texto = str(valor).strip()
+    if not (texto.isdigit() and 0 <= int(texto) <= 6):
+        raise ValueError(f'Dia da semana inválido: {valor!r}')
+    return int(texto)
+
+class Regra:
+    """Regra de repetição ao estilo RRULE: frequência, intervalo, dias da semana, fim e exceções.
+
+    `dias_semana` usa 0 = segunda-feira (date.weekday()) e só vale para a
+    frequência semanal; a mensal repete o dia do mês de `data_inicio`
+    (limitado ao último dia dos meses mais curtos). As datas geradas ficam
+    entre `data_inicio` e `data_fim`, inclusive, sem as `excecoes`.
+    """
+    __slots__ = ('frequencia', 'intervalo', 'dias_semana', 'data_inicio', 'data_fim', 'excecoes')
+
+    def __init__(self, frequencia, intervalo, dias_semana, data_inicio, data_fim, excecoes=()):
+        if frequencia not in ('semanal', 'mensal'):
+            raise ValueError(f'Frequência inválida: {frequencia}')
+        if intervalo < 1:
+            raise ValueError('O intervalo da repetição deve ser positivo.')
+        if data_fim < data_inicio:
+            raise ValueError('A data final da repetição é anterior à data inicial.')
+        self.frequencia = frequencia
+        self.intervalo = intervalo
+        self.dias_semana = sorted({dia_da_semana(dia) for dia in dias_semana or [data_inicio.weekday()]})
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.excecoes = set(excecoes)
+
+    def datas(self, de=None, ate=None):
+        """Datas da regra dentro de [de, ate], em ordem, geradas sob demanda."""
+        de = max(de or self.data_inicio, self.data_inicio)
+        ate = min(ate or self.data_fim, self.data_fim)
+        if de > ate:
+            return
+        gerador = self._semanais if self.frequencia == 'semanal' else self._mensais
+        for data in gerador(de, ate):
+            if data not in self.excecoes:
+                yield data
+
+    def _semanais(self, de, ate):
+        # Salta direto para a primeira semana do período que pertence à regra
+        semana_base = self.data_inicio - timedelta(days=self.data_inicio.weekday())
+        semanas = (de - semana_base).days // 7
+        semanas += -semanas % self.intervalo
+        segunda = semana_base + timedelta(weeks=semanas)
+        while segunda <= ate:
+            for dia in self.dias_semana:
+                data = segunda + timedelta(days=dia)
+                if de <= data <= ate:
+                    yield data
+            segunda += timedelta(weeks=self.intervalo)
+
+    def _mensais(self, de, ate):
+        base = self.data_inicio.year * 12 + self.data_inicio.month - 1
+        meses = (de.year * 12 + de.month - 1) - base
+        meses += -meses % self.intervalo
+        while True:
+            ano, mes = divmod(base + meses, 12)
+            mes += 1
+            data = date(ano, mes, min(self.data_inicio.day, calendar.monthrange(ano, mes)[1]))
+            if data > ate:
+                return
+            if data >= de:
+                yield data
+            meses += self.intervalo
+
+    def data_da_ocorrencia(self, numero):
+        """Data da n-ésima ocorrência (1 = primeira), ou a última se a regra acabar antes."""
+        ultima = None
+        for i, data in enumerate(self.datas(), start=1):
+            ultima = data
+            if i >= numero:
+                break
+        return ultima
+
+def ocorrencias(regra, hora_inicio, hora_fim, de=None, ate=None):
+    """Ocorrências da regra como tuplas (data, inicio, fim) em horário local sem fuso."""
+    for data in regra.datas(de, ate):
+        yield ocorrencia_unica(data, hora_inicio, hora_fim)
+
+def ocorrencia_unica(data, hora_inicio, hora_fim):
+    """(data, inicio, fim) de uma reunião avulsa; termina no dia seguinte se o término não for posterior."""
+    inicio = datetime.combine(data, hora_inicio)
+    fim = datetime.combine(data, hora_fim)
+    if fim <= inicio:
+        fim += timedelta(days=1)
+    return data, inicio, fim
+
+def ocorrencias_entre(regra, hora_inicio, hora_fim, inicio, fim):
+    """Ocorrências que se sobrepõem ao intervalo [inicio, fim) (datetimes)."""
+    # Uma ocorrência que atravessa a meia-noite começa no dia anterior ao intervalo
+    for ocorrencia in ocorrencias(regra, hora_inicio, hora_fim, inicio.date() - timedelta(days=1), fim.date()):
+        if ocorrencia[1] < fim and ocorrencia[2] > inicio:
+            yield ocorrencia
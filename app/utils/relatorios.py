@@ -0,0 +1,211 @@
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import func, select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, Reserva, ReservaArquivo, Serie, OcupacaoHora, OcupacaoSerie
+from app.utils.catalogo import catalogo_salas
+
+# Reservas lidas por vez na reconstrução completa do agregado
+LOTE_RECONSTRUCAO = 5000
+
+METRICAS = ('minutos', 'reservas', 'recorrentes', 'canceladas')
+METRICAS_SERIE = ('recorrentes', 'canceladas')
+
+def _campo(reserva, nome):
+    # Aceita dicionários (inserção em lote), instâncias ORM e linhas de consulta
+    return reserva[nome] if isinstance(reserva, dict) else getattr(reserva, nome)
+
+def _deltas(reservas, sinal, cancelamento_avulso):
+    deltas = defaultdict(lambda: dict.fromkeys(METRICAS, 0))
+    for reserva in reservas:
+        sala_id = int(_campo(reserva, 'sala_id'))
+        setor = _campo(reserva, 'setor')
+        inicio = _campo(reserva, 'inicio')
+        fim = _campo(reserva, 'fim')
+        recorrente = bool(_campo(reserva, 'is_recorrente'))
+
+        chave = (inicio.date(), inicio.hour, sala_id, setor)
+        deltas[chave]['reservas'] += sinal
+        if recorrente:
+            deltas[chave]['recorrentes'] += sinal
+            if cancelamento_avulso:
+                deltas[chave]['canceladas'] += 1
+
+        # Distribui os minutos pelas horas (e dias) que a reserva ocupa
+        cursor = inicio
+        while cursor < fim:
+            proxima_hora = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            fim_trecho = min(fim, proxima_hora)
+            minutos = int((fim_trecho - cursor).total_seconds() // 60)
+            deltas[(cursor.date(), cursor.hour, sala_id, setor)]['minutos'] += sinal * minutos
+            cursor = fim_trecho
+    return deltas
+
+def _deltas_series(reservas, sinal, cancelamento_avulso):
+    # Por dia e série: só as reservas que pertencem a uma série
+    deltas = {}
+    for reserva in reservas:
+        recorrencia_id = _campo(reserva, 'recorrencia_id')
+        if not recorrencia_id:
+            continue
+        data = _campo(reserva, 'inicio').date()
+        valores = deltas.setdefault((data, recorrencia_id), dict(
+            dict.fromkeys(METRICAS_SERIE, 0), sala_id=int(_campo(reserva, 'sala_id')), setor=_campo(reserva, 'setor')
+        ))
+        valores['recorrentes'] += sinal
+        if cancelamento_avulso:
+            valores['canceladas'] += 1
+    return deltas
+
+def _somar(modelo, chaves, metricas, linhas):
+    dialeto = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialeto == 'postgresql' else sqlite.insert
+    stmt = insert(modelo)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(chaves),
+        set_={nome: getattr(modelo, nome) + stmt.excluded[nome] for nome in metricas}
+    )
+    db.session.execute(stmt, linhas)
+
+def registrar_ocupacao(reservas, sinal=1, cancelamento_avulso=False):
+    """Aplica ao agregado a inclusão (sinal=1) ou remoção (sinal=-1) de reservas.
+
+    Deve ser chamada na mesma transação que grava as reservas. Todas as
+    alterações vão em um único UPSERT (ON CONFLICT) em lote.
+    """
+    deltas = _deltas(reservas, sinal, cancelamento_avulso)
+    if deltas:
+        _somar(OcupacaoHora, ('data', 'sala_id', 'setor', 'hora'), METRICAS, [
+            dict(valores, data=data, hora=hora, sala_id=sala_id, setor=setor)
+            for (data, hora, sala_id, setor), valores in deltas.items()
+        ])
+    deltas = _deltas_series(reservas, sinal, cancelamento_avulso)
+    if deltas:
+        _somar(OcupacaoSerie, ('data', 'recorrencia_id'), METRICAS_SERIE, [
+            dict(valores, data=data, recorrencia_id=recorrencia_id)
+            for (data, recorrencia_id), valores in deltas.items()
+        ])
+
+def reconstruir_ocupacao():
+    """Recalcula os agregados a partir de Reserva e ReservaArquivo (carga inicial ou correção).
+
+    Os cancelamentos avulsos não deixam reserva: a contagem deles recomeça do zero.
+    """
+    db.session.execute(delete(OcupacaoHora))
+    db.session.execute(delete(OcupacaoSerie))
+    for modelo in (ReservaArquivo, Reserva):
+        ultimo_id = 0
+        while True:
+            lote = db.session.execute(
+                select(modelo.id, modelo.sala_id, modelo.setor, modelo.inicio, modelo.fim, modelo.is_recorrente,
+                       modelo.recorrencia_id)
+                .where(modelo.id > ultimo_id).order_by(modelo.id).limit(LOTE_RECONSTRUCAO)
+            ).all()
+            if not lote:
+                break
+            registrar_ocupacao(lote)
+            ultimo_id = lote[-1].id
+    db.session.commit()
+
+def _dias_uteis(inicio, fim):
+    return sum(1 for i in range((fim - inicio).days + 1) if (inicio + timedelta(days=i)).weekday() < 5)
+
+def _periodo(data, agrupamento):
+    if agrupamento == 'mes':
+        return data.replace(day=1)
+    return data - timedelta(days=data.weekday())
+
+def relatorio_ocupacao(inicio, fim, agrupamento, expediente):
+    """Monta os indicadores do período [inicio, fim] a partir do agregado.
+
+    `expediente` é a tupla (hora_inicio, hora_fim) usada como capacidade
+    diária de cada sala no cálculo da taxa de utilização.
+    """
+    capacidade = _dias_uteis(inicio, fim) * (expediente[1] - expediente[0]) * 60
+    nomes = {sala_id: sala.nome for sala_id, sala in catalogo_salas.por_id().items()}
+
+    # Todos os indicadores saem das mesmas linhas: as das salas que ainda existem
+    filtro = (OcupacaoHora.data.between(inicio, fim), OcupacaoHora.sala_id.in_(list(nomes)))
+    minutos = func.sum(OcupacaoHora.minutos)
+    reservas = func.sum(OcupacaoHora.reservas)
+
+    por_sala = [
+        {
+            'sala': nomes[sala_id],
+            'horas': (total or 0) / 60,
+            'reservas': qtd or 0,
+            'utilizacao': (total or 0) / capacidade * 100 if capacidade else 0,
+        }
+        for sala_id, total, qtd in db.session.query(OcupacaoHora.sala_id, minutos, reservas)
+        .filter(*filtro).group_by(OcupacaoHora.sala_id).having(minutos > 0).order_by(minutos.desc()).all()
+    ]
+
+    setores = db.session.query(OcupacaoHora.setor, minutos, reservas) \
+        .filter(*filtro).group_by(OcupacaoHora.setor).having(minutos > 0).order_by(minutos.desc()).all()
+    total_minutos = sum(total or 0 for _, total, _ in setores)
+    por_setor = [
+        {
+            'setor': setor,
+            'horas': (total or 0) / 60,
+            'reservas': qtd or 0,
+            'participacao': (total or 0) / total_minutos * 100 if total_minutos else 0,
+        }
+        for setor, total, qtd in setores
+    ]
+
+    por_hora = dict(
+        db.session.query(OcupacaoHora.hora, minutos).filter(*filtro).group_by(OcupacaoHora.hora).all()
+    )
+    maior_hora = max(por_hora.values(), default=0) or 1
+    horas_pico = [
+        {'hora': hora, 'horas': (por_hora.get(hora) or 0) / 60, 'relativo': (por_hora.get(hora) or 0) / maior_hora * 100}
+        for hora in range(24) if por_hora.get(hora) or expediente[0] <= hora < expediente[1]
+    ]
+
+    periodos = defaultdict(lambda: [0, 0])
+    for data, total, qtd in db.session.query(OcupacaoHora.data, minutos, reservas) \
+            .filter(*filtro).group_by(OcupacaoHora.data).all():
+        periodo = periodos[_periodo(data, agrupamento)]
+        periodo[0] += total or 0
+        periodo[1] += qtd or 0
+    por_periodo = [
+        {'inicio': inicio_periodo, 'horas': total / 60, 'reservas': qtd}
+        for inicio_periodo, (total, qtd) in sorted(periodos.items())
+    ]
+
+    # Séries com mais ocorrências canceladas avulsas em relação às agendadas
+    recorrentes = func.sum(OcupacaoSerie.recorrentes)
+    canceladas = func.sum(OcupacaoSerie.canceladas)
+    faltosas = db.session.query(
+        OcupacaoSerie.recorrencia_id, func.min(OcupacaoSerie.sala_id), func.min(OcupacaoSerie.setor),
+        recorrentes, canceladas
+    ).filter(OcupacaoSerie.data.between(inicio, fim), OcupacaoSerie.sala_id.in_(list(nomes))) \
+        .group_by(OcupacaoSerie.recorrencia_id).having(canceladas > 0) \
+        .order_by(canceladas.desc(), OcupacaoSerie.recorrencia_id).limit(10).all()
+    ids = [linha[0] for linha in faltosas]
+    assuntos = dict(db.session.query(Serie.id, Serie.assunto).filter(Serie.id.in_(ids)).all())
+    # Séries antigas (sem regra) ou já apagadas: o assunto vem das reservas restantes
+    assuntos.update(
+        (recorrencia_id, assunto) for recorrencia_id, assunto in db.session.query(
+            Reserva.recorrencia_id, func.min(Reserva.assunto)
+        ).filter(Reserva.recorrencia_id.in_(set(ids) - set(assuntos))).group_by(Reserva.recorrencia_id).all()
+    )
+    series_faltosas = [
+        {
+            'serie': recorrencia_id,
+            'assunto': assuntos.get(recorrencia_id, 'Série removida'),
+            'sala': nomes[sala_id],
+            'setor': setor,
+            'canceladas': qtd_canceladas,
+            'taxa': qtd_canceladas / ((qtd_recorrentes or 0) + qtd_canceladas) * 100,
+        }
+        for recorrencia_id, sala_id, setor, qtd_recorrentes, qtd_canceladas in faltosas
+    ]
+
+    return {
+        'por_sala': por_sala,
+        'por_setor': por_setor,
+        'horas_pico': horas_pico,
+        'por_periodo': por_periodo,
+        'series_faltosas': series_faltosas,
+    }
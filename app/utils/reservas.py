@@ -0,0 +1,455 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import accumulate
+import logging
+import threading
+import time
+from sqlalchemy import and_, or_, delete, func, insert, select, update, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app.models import db, Sala, Reserva, Serie
+from app.utils.relatorios import registrar_ocupacao
+from app.utils.cache import CacheTTL
+from app.utils.painel import linha_do_tempo
+from app.utils.versoes import incrementar_versao
+from app.utils.recorrencia import ocorrencias, ocorrencias_entre, ler_datas, formatar_datas
+from app.utils.time_utils import get_now_br_naive
+from app.utils.calendario import registrar_alteracao_calendario, alteracao_reserva, alteracao_serie
+
+logger = logging.getLogger(__name__)
+
+# Intervalos por consulta de conflito (limita a profundidade do OR no SQLite)
+LOTE_CONFLITOS = 200
+
+# Novas tentativas quando outra transação grava na mesma sala ao mesmo tempo
+TENTATIVAS_RESERVA = 3
+
+# Respostas recentes da busca de horários livres. É limpo a cada gravação
+# deste processo; o TTL limita quanto tempo gravações de outros workers
+# levam para aparecer.
+cache_horarios_livres = CacheTTL(maximo=128, ttl=30)
+
+class ConflitoReserva(Exception):
+    """A sala continuou disputada por outra transação após todas as tentativas."""
+
+def ocorrencias_series(sala_ids, inicio, fim, ignorar_serie=None):
+    """Ocorrências ainda não materializadas das séries das salas em [inicio, fim).
+
+    As já materializadas estão em Reserva e são lidas junto com as demais
+    reservas; aqui as regras são expandidas só depois de `materializado_ate`.
+    Retorna {sala_id: [(inicio, fim), ...]}.
+    """
+    ocupados = defaultdict(list)
+    query = Serie.query.filter(
+        Serie.sala_id.in_(sala_ids),
+        Serie.data_inicio <= fim.date(),
+        Serie.data_fim >= inicio.date() - timedelta(days=1),
+        Serie.data_fim > Serie.materializado_ate
+    )
+    if ignorar_serie:
+        query = query.filter(Serie.id != ignorar_serie)
+    for serie in query:
+        de = max(inicio, datetime.combine(serie.materializado_ate + timedelta(days=1), datetime.min.time()))
+        for _, ocorrencia_inicio, ocorrencia_fim in ocorrencias_entre(
+            serie.regra, serie.hora_inicio, serie.hora_fim, de, fim
+        ):
+            if ocorrencia_inicio.date() > serie.materializado_ate:
+                ocupados[serie.sala_id].append((ocorrencia_inicio, ocorrencia_fim))
+    return ocupados
+
+def buscar_conflitos(sala_id, intervalos, ignorar_serie=None):
+    """Retorna os índices de `intervalos` que colidem com reservas ou séries da sala.
+
+    As reservas gravadas vêm em uma única consulta (uma por lote de
+    LOTE_CONFLITOS) e as séries da sala são expandidas no mesmo período; o
+    casamento com as ocorrências é feito em memória, com busca binária
+    sobre os horários ocupados ordenados.
+    """
+    if not intervalos:
+        return set()
+    filtros = [Reserva.sala_id == sala_id]
+    if ignorar_serie:
+        filtros.append(or_(Reserva.recorrencia_id.is_(None), Reserva.recorrencia_id != ignorar_serie))
+
+    ocupados = []
+    for i in range(0, len(intervalos), LOTE_CONFLITOS):
+        lote = intervalos[i:i + LOTE_CONFLITOS]
+        ocupados += [tuple(linha) for linha in db.session.query(Reserva.inicio, Reserva.fim).filter(
+            *filtros, or_(*[and_(Reserva.inicio < fim, Reserva.fim > inicio) for inicio, fim in lote])
+        )]
+    periodo_inicio = min(inicio for inicio, _ in intervalos)
+    periodo_fim = max(fim for _, fim in intervalos)
+    ocupados += ocorrencias_series([sala_id], periodo_inicio, periodo_fim, ignorar_serie)[sala_id]
+
+    return _colisoes(ocupados, intervalos)
+
+def _colisoes(ocupados, intervalos):
+    """Índices de `intervalos` que colidem com algum dos horários `ocupados`."""
+    # Um intervalo colide se alguma ocupação que começa antes do seu fim termina depois do seu início
+    ocupados = sorted(ocupados)
+    inicios = [inicio for inicio, _ in ocupados]
+    maior_fim = list(accumulate((fim for _, fim in ocupados), max))
+    conflitos = set()
+    for i, (inicio, fim) in enumerate(intervalos):
+        anteriores = bisect_left(inicios, fim)
+        if anteriores and maior_fim[anteriores - 1] > inicio:
+            conflitos.add(i)
+    return conflitos
+
+def reservas_no_periodo(sala_id, inicio, fim):
+    """Horários (inicio, fim) das reservas gravadas da sala que invadem [inicio, fim).
+
+    As reservas de uma sala não se sobrepõem, então das que começam antes de
+    `inicio` só a última pode invadir o período: a consulta é uma leitura
+    de intervalo no índice (sala_id, inicio, fim), sem um OR por
+    intervalo como em buscar_conflitos. Serve a lotes grandes e próximos
+    no tempo (importação).
+    """
+    anterior = select(func.max(Reserva.inicio)).where(
+        Reserva.sala_id == sala_id, Reserva.inicio < inicio
+    ).scalar_subquery()
+    return [tuple(linha) for linha in db.session.execute(
+        select(Reserva.inicio, Reserva.fim).where(
+            Reserva.sala_id == sala_id, Reserva.inicio >= func.coalesce(anterior, inicio),
+            Reserva.inicio < fim, Reserva.fim > inicio
+        )
+    )]
+
+def bloquear_sala(sala_id):
+    """Serializa as gravações de reservas da sala até o fim da transação atual."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text('SELECT pg_advisory_xact_lock(:chave)'), {'chave': sala_id})
+    else:
+        # No SQLite a primeira escrita da transação obtém o lock de escrita do
+        # banco; as demais transações esperam (busy timeout) até o commit.
+        db.session.execute(
+            update(Sala).where(Sala.id == sala_id).values(ordem=Sala.ordem),
+            execution_options={'synchronize_session': False}
+        )
+
+def _erro_de_concorrencia(e):
+    codigo = getattr(e.orig, 'pgcode', None)
+    if isinstance(e, IntegrityError):
+        # 23P01: violação da restrição de exclusão reserva_sem_sobreposicao
+        return codigo == '23P01'
+    # 40001/40P01: falha de serialização/deadlock; no SQLite, banco bloqueado
+    return codigo in ('40001', '40P01') or 'database is locked' in str(e.orig)
+
+def _gravar_com_tentativas(gravar):
+    """Executa `gravar` e faz o commit, repetindo em conflitos de concorrência.
+
+    Após TENTATIVAS_RESERVA tentativas levanta ConflitoReserva.
+    """
+    for tentativa in range(TENTATIVAS_RESERVA):
+        try:
+            resultado = gravar()
+            db.session.commit()
+            invalidar_caches_reservas()
+            return resultado
+        except (IntegrityError, OperationalError) as e:
+            db.session.rollback()
+            if not _erro_de_concorrencia(e):
+                raise
+    raise ConflitoReserva()
+
+def criar_reservas(sala_id, ocorrencias, dados):
+    """Grava atomicamente as ocorrências livres e faz o commit.
+
+    `ocorrencias` são tuplas (data, inicio, fim) e `dados` os demais campos
+    comuns a todas as reservas. Retorna (linhas_criadas, indices_conflito).
+    Conflitos de concorrência são repetidos até TENTATIVAS_RESERVA vezes
+    antes de levantar ConflitoReserva.
+    """
+    intervalos = [(inicio, fim) for _, inicio, fim in ocorrencias]
+
+    def gravar():
+        bloquear_sala(sala_id)
+        indices_conflito = buscar_conflitos(sala_id, intervalos)
+        linhas = [
+            dict(dados, sala_id=sala_id, inicio=inicio, fim=fim)
+            for i, (inicio, fim) in enumerate(intervalos) if i not in indices_conflito
+        ]
+        if linhas:
+            # Inserção em lote: um único INSERT para todas as ocorrências livres
+            criadas = db.session.execute(
+                insert(Reserva).returning(Reserva.id, Reserva.sala_id, Reserva.user_id, Reserva.inicio,
+                                          sort_by_parameter_order=True), linhas
+            ).all()
+            registrar_ocupacao(linhas)
+            registrar_alteracao_reservas()
+            registrar_alteracao_calendario(alteracao_reserva(reserva) for reserva in criadas)
+        return linhas, indices_conflito
+
+    return _gravar_com_tentativas(gravar)
+
+def criar_reservas_em_lote(linhas):
+    """Grava atomicamente as reservas livres de um lote com várias salas e faz o commit.
+
+    `linhas` são dicts com as colunas de Reserva (importação em massa).
+    Por sala, as reservas gravadas no período do lote vêm de uma leitura
+    de intervalo (reservas_no_periodo) e as séries de todas as salas de
+    uma só consulta; as linhas do lote são conferidas contra elas e entre
+    si, pela ordem de início. Todas as livres entram em um único INSERT.
+    Retorna (linhas_criadas, indices_conflito), com as mesmas tentativas
+    de criar_reservas.
+    """
+    por_sala = defaultdict(list)
+    for i, linha in enumerate(linhas):
+        por_sala[linha['sala_id']].append(i)
+    periodo_inicio = min(linha['inicio'] for linha in linhas)
+    periodo_fim = max(linha['fim'] for linha in linhas)
+
+    def gravar():
+        # Bloqueios sempre na ordem dos ids: dois lotes simultâneos não se travam
+        for sala_id in sorted(por_sala):
+            bloquear_sala(sala_id)
+        series = ocorrencias_series(list(por_sala), periodo_inicio, periodo_fim)
+        indices_conflito = set()
+        for sala_id, indices in por_sala.items():
+            indices.sort(key=lambda i: (linhas[i]['inicio'], i))
+            intervalos = [(linhas[i]['inicio'], linhas[i]['fim']) for i in indices]
+            ocupados = reservas_no_periodo(sala_id, intervalos[0][0], max(fim for _, fim in intervalos))
+            gravados = _colisoes(ocupados + series[sala_id], intervalos)
+            maior_fim = None
+            for posicao, (inicio, fim) in enumerate(intervalos):
+                if posicao in gravados or (maior_fim is not None and inicio < maior_fim):
+                    indices_conflito.add(indices[posicao])
+                else:
+                    maior_fim = fim if maior_fim is None else max(maior_fim, fim)
+        livres = [linha for i, linha in enumerate(linhas) if i not in indices_conflito]
+        if livres:
+            # O registro do calendário só usa as colunas devolvidas: sem sort_by_parameter_order,
+            # que no SQLite faz um INSERT por linha
+            criadas = db.session.execute(
+                insert(Reserva).returning(Reserva.id, Reserva.sala_id, Reserva.user_id, Reserva.inicio), livres
+            ).all()
+            registrar_ocupacao(livres)
+            registrar_alteracao_reservas()
+            registrar_alteracao_calendario(alteracao_reserva(reserva) for reserva in criadas)
+        return livres, indices_conflito
+
+    return _gravar_com_tentativas(gravar)
+
+def _materializar(serie, ocorrencias_livres):
+    # Linhas de Reserva das ocorrências, na transação atual
+    linhas = [
+        dict(sala_id=serie.sala_id, user_id=serie.user_id, assunto=serie.assunto,
+             nome_solicitante=serie.nome_solicitante, setor=serie.setor, telefone=serie.telefone,
+             inicio=inicio, fim=fim, recorrencia_id=serie.id, is_recorrente=True)
+        for _, inicio, fim in ocorrencias_livres
+    ]
+    if linhas:
+        db.session.execute(insert(Reserva), linhas)
+        registrar_ocupacao(linhas)
+    registrar_alteracao_reservas()
+    return linhas
+
+def criar_serie(serie, horizonte):
+    """Grava a série (ainda não persistida) e materializa as ocorrências até `horizonte`.
+
+    Todas as ocorrências da regra são verificadas de uma vez contra as
+    reservas e as outras séries da sala; as que colidem viram exceções da
+    regra. Se nenhuma estiver livre, nada é gravado. Retorna
+    (ocorrencias, indices_conflito), com as tuplas (data, inicio, fim) de
+    toda a regra. Dias da semana fora de 0-6 levantam ValueError antes de
+    qualquer gravação.
+    """
+    serie.dias_gravados(estrito=True)
+    lista = list(ocorrencias(serie.regra, serie.hora_inicio, serie.hora_fim))
+    intervalos = [(inicio, fim) for _, inicio, fim in lista]
+
+    def gravar():
+        bloquear_sala(serie.sala_id)
+        indices_conflito = buscar_conflitos(serie.sala_id, intervalos)
+        livres = [ocorrencia for i, ocorrencia in enumerate(lista) if i not in indices_conflito]
+        if livres:
+            excecoes = ler_datas(serie.excecoes) | {lista[i][0] for i in indices_conflito}
+            serie.excecoes = formatar_datas(excecoes)
+            serie.materializado_ate = min(horizonte, serie.data_fim)
+            db.session.add(serie)
+            _materializar(serie, [o for o in livres if o[0] <= serie.materializado_ate])
+            registrar_alteracao_calendario([alteracao_serie(serie)])
+        return lista, indices_conflito
+
+    return _gravar_com_tentativas(gravar)
+
+def materializar_series(ate):
+    """Estende as séries até a data `ate`, criando as linhas de Reserva que faltam.
+
+    Idempotente: cada série é relida sob o bloqueio da sala e estendida a
+    partir de `materializado_ate`, em sua própria transação. Ocorrências que
+    passaram a colidir com outra reserva viram exceções. Retorna o total de
+    reservas criadas.
+    """
+    pendentes = db.session.execute(
+        select(Serie.id, Serie.sala_id).where(
+            Serie.materializado_ate < ate, Serie.materializado_ate < Serie.data_fim
+        )
+    ).all()
+    total = 0
+    for serie_id, sala_id in pendentes:
+        def gravar(serie_id=serie_id, sala_id=sala_id):
+            bloquear_sala(sala_id)
+            serie = db.session.get(Serie, serie_id, populate_existing=True)
+            limite = min(ate, serie.data_fim) if serie else None
+            if serie is None or serie.materializado_ate >= limite:
+                return 0
+            lista = list(ocorrencias(
+                serie.regra, serie.hora_inicio, serie.hora_fim, serie.materializado_ate + timedelta(days=1), limite
+            ))
+            indices_conflito = buscar_conflitos(
+                sala_id, [(inicio, fim) for _, inicio, fim in lista], ignorar_serie=serie_id
+            )
+            if indices_conflito:
+                excecoes = ler_datas(serie.excecoes) | {lista[i][0] for i in indices_conflito}
+                serie.excecoes = formatar_datas(excecoes)
+                registrar_alteracao_calendario([alteracao_serie(serie)])
+            serie.materializado_ate = limite
+            return len(_materializar(serie, [o for i, o in enumerate(lista) if i not in indices_conflito]))
+
+        total += _gravar_com_tentativas(gravar)
+    return total
+
+def cancelar_ocorrencia(reserva):
+    """Remove uma única reserva; se for de uma série, a data vira exceção da regra.
+
+    Não faz o commit (como cancelar_serie).
+    """
+    registrar_ocupacao([reserva], sinal=-1, cancelamento_avulso=True)
+    registrar_alteracao_reservas()
+    serie = db.session.get(Serie, reserva.recorrencia_id) if reserva.recorrencia_id else None
+    if serie is not None:
+        # Sem a exceção a data seria materializada de novo
+        serie.excecoes = formatar_datas(ler_datas(serie.excecoes) | {reserva.inicio.date()})
+        registrar_alteracao_calendario([alteracao_serie(serie)])
+    else:
+        registrar_alteracao_calendario([alteracao_reserva(reserva, removido=True)])
+    db.session.delete(reserva)
+
+def cancelar_serie(recorrencia_id, a_partir_de=None):
+    """Cancela a série inteira ou, com `a_partir_de`, as ocorrências que começam desde então.
+
+    Um único DELETE ... RETURNING apaga as linhas e devolve só as colunas
+    que o agregado e o registro dos feeds .ics precisam. A regra da série
+    é encerrada na véspera de `a_partir_de`, ou apagada se não sobrar
+    nenhuma data antes disso. Tudo na transação
+    atual, com a versão 'reservas' incrementada; o commit e
+    invalidar_caches_reservas() ficam com quem chama. Retorna o total de ocorrências canceladas,
+    incluindo as que ainda não tinham sido materializadas.
+    """
+    stmt = delete(Reserva).where(Reserva.recorrencia_id == recorrencia_id)
+    if a_partir_de is not None:
+        stmt = stmt.where(Reserva.inicio >= a_partir_de)
+    removidas = db.session.execute(
+        stmt.returning(Reserva.id, Reserva.sala_id, Reserva.user_id, Reserva.setor, Reserva.inicio, Reserva.fim,
+                       Reserva.is_recorrente, Reserva.recorrencia_id),
+        execution_options={'synchronize_session': False}
+    ).all()
+    registrar_ocupacao(removidas, sinal=-1)
+    registrar_alteracao_reservas()
+    total = len(removidas)
+
+    serie = db.session.get(Serie, recorrencia_id)
+    if serie is not None:
+        de = serie.materializado_ate + timedelta(days=1)
+        if a_partir_de is not None:
+            de = max(de, a_partir_de.date())
+        total += sum(1 for _ in serie.regra.datas(de=de))
+
+        ultimo_dia = a_partir_de.date() - timedelta(days=1) if a_partir_de is not None else None
+        # Sem nenhuma data antes de `a_partir_de` (ou só exceções) a série acabou: no feed seria um VEVENT vazio
+        if ultimo_dia is None or next(serie.regra.datas(ate=ultimo_dia), None) is None:
+            registrar_alteracao_calendario([alteracao_serie(serie, removido=True)])
+            db.session.execute(delete(Serie).where(Serie.id == recorrencia_id))
+        else:
+            serie.data_fim = ultimo_dia
+            serie.materializado_ate = min(serie.materializado_ate, ultimo_dia)
+            registrar_alteracao_calendario([alteracao_serie(serie)])
+    else:
+        # Série antiga, sem regra gravada: as linhas eram eventos avulsos nos feeds
+        registrar_alteracao_calendario(alteracao_reserva(linha, removido=True) for linha in removidas)
+    return total
+
+class ExtensaoSeries:
+    """Mantém as séries materializadas até o horizonte, conferindo no máximo a cada `intervalo` segundos.
+
+    Chamada no início das requisições: na maior parte delas só compara o
+    relógio; a cada intervalo, uma consulta procura séries atrasadas. A
+    requisição que faz a extensão não depende dela: uma falha é desfeita e
+    registrada no log, e `flask materializar-series` (cron) cobre o atraso.
+    """
+
+    def __init__(self, intervalo=3600):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._proxima = 0.0
+
+    def verificar(self, horizonte_dias):
+        agora = time.monotonic()
+        with self._lock:
+            if agora < self._proxima:
+                return
+            self._proxima = agora + self.intervalo
+        try:
+            materializar_series(get_now_br_naive().date() + timedelta(days=horizonte_dias))
+        except ConflitoReserva:
+            # Sala disputada: tenta de novo na próxima requisição
+            self._proxima = 0.0
+        except Exception:
+            # Ex.: lock timeout ou a restrição de exclusão no PostgreSQL; nova tentativa no próximo intervalo
+            db.session.rollback()
+            logger.exception('Falha ao estender as séries recorrentes; a requisição segue sem a extensão')
+
+extensao_series = ExtensaoSeries()
+
+def registrar_alteracao_reservas():
+    """Marca as reservas como alteradas (painéis dos outros workers); chamar antes do commit."""
+    incrementar_versao('reservas')
+
+def invalidar_caches_reservas():
+    """Descarta os caches derivados de reservas e salas após uma gravação."""
+    cache_horarios_livres.limpar()
+    linha_do_tempo.invalidar()
+
+def horarios_livres(salas, janelas, duracao):
+    """Intervalos livres de pelo menos `duracao` dentro das janelas, por sala.
+
+    `janelas` é uma lista ordenada de (inicio, fim) sem sobreposição. Uma
+    única consulta traz as reservas de todas as salas no período (mais uma
+    para as séries ainda não materializadas) e cada sala
+    é resolvida com uma varredura das reservas ordenadas contra as janelas.
+    Retorna {sala_id: [(inicio, fim), ...]}.
+    """
+    ocupados = defaultdict(list)
+    if salas and janelas:
+        for sala_id, inicio, fim in db.session.query(Reserva.sala_id, Reserva.inicio, Reserva.fim).filter(
+            Reserva.sala_id.in_([sala.id for sala in salas]),
+            Reserva.inicio < janelas[-1][1],
+            Reserva.fim > janelas[0][0]
+        ).order_by(Reserva.sala_id, Reserva.inicio):
+            ocupados[sala_id].append((inicio, fim))
+        # Séries além do trecho materializado entram expandidas das regras
+        series = ocorrencias_series([sala.id for sala in salas], janelas[0][0], janelas[-1][1])
+        for sala_id, intervalos in series.items():
+            ocupados[sala_id] = sorted(ocupados[sala_id] + intervalos)
+
+    livres = {}
+    for sala in salas:
+        reservas = ocupados[sala.id]
+        intervalos = []
+        primeira = 0
+        for janela_inicio, janela_fim in janelas:
+            while primeira < len(reservas) and reservas[primeira][1] <= janela_inicio:
+                primeira += 1
+            cursor = janela_inicio
+            i = primeira
+            while i < len(reservas) and reservas[i][0] < janela_fim:
+                inicio, fim = reservas[i]
+                if inicio - cursor >= duracao:
+                    intervalos.append((cursor, inicio))
+                cursor = max(cursor, fim)
+                i += 1
+            if janela_fim - cursor >= duracao:
+                intervalos.append((cursor, janela_fim))
+        livres[sala.id] = intervalos
+    return livres
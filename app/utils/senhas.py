@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TempoEsgotado
+import os
+import threading
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from app.utils.cache import criar_cache_compartilhado
+
+# Método dos hashes novos; hashes gravados com outros parâmetros são refeitos no login
+METODO_SENHA = os.environ.get('SENHA_METODO', 'scrypt')
+
+class SobrecargaSenhas(Exception):
+    """Há mais cálculos de senha pendentes que o limite do worker; a requisição deve ser recusada."""
+
+def _novo_executor(concorrencia):
+    # No modo gevent as threads do `threading` viram greenlets; o pool do
+    # gevent usa threads nativas e libera o hub enquanto o hash é calculado.
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from gevent.threadpool import ThreadPoolExecutor as ExecutorGevent
+            return ExecutorGevent(max_workers=concorrencia)
+    except ImportError:
+        pass
+    return ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix='senhas')
+
+class ExecutorSenhas:
+    """Calcula hashes de senha em um pool limitado de threads.
+
+    No máximo `concorrencia` hashes rodam ao mesmo tempo em cada worker
+    (scrypt e pbkdf2 liberam o GIL, mas ocupam um núcleo inteiro) e até
+    `fila` aguardam; além disso, ou após `espera` segundos na fila, a
+    chamada levanta SobrecargaSenhas em vez de disputar a CPU com as
+    demais requisições. Com `concorrencia` 0 o cálculo é feito na própria
+    thread, sem limite.
+    """
+
+    def __init__(self, concorrencia=2, fila=16, espera=10):
+        self.concorrencia = concorrencia
+        self.espera = espera
+        self._vagas = threading.BoundedSemaphore(max(concorrencia + fila, 1))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _obter_executor(self):
+        # Criado sob demanda e recriado após o fork do gunicorn (threads não sobrevivem ao fork)
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = _novo_executor(self.concorrencia)
+                    self._pid = pid
+        return self._executor
+
+    def executar(self, funcao, *args):
+        if self.concorrencia <= 0:
+            return funcao(*args)
+        if not self._vagas.acquire(blocking=False):
+            raise SobrecargaSenhas()
+        try:
+            futuro = self._obter_executor().submit(funcao, *args)
+        except BaseException:
+            self._vagas.release()
+            raise
+        # A vaga só volta quando o hash termina, mesmo que quem pediu já tenha desistido
+        futuro.add_done_callback(lambda _: self._vagas.release())
+        try:
+            return futuro.result(timeout=self.espera)
+        except TempoEsgotado:
+            raise SobrecargaSenhas()
+
+executor_senhas = ExecutorSenhas(
+    concorrencia=int(os.environ.get('SENHA_CONCORRENCIA', 2)),
+    fila=int(os.environ.get('SENHA_FILA', 16)),
+    espera=float(os.environ.get('SENHA_ESPERA', 10)),
+)
+
+def gerar_hash(senha):
+    return executor_senhas.executar(generate_password_hash, senha, METODO_SENHA)
+
+def verificar_senha(senha_hash, senha):
+    return executor_senhas.executar(check_password_hash, senha_hash, senha)
+
+def gerar_hashes(senhas, concorrencia=None):
+    """Hashes de um lote de senhas (importação em massa), em paralelo e na ordem recebida.
+
+    Usa um pool próprio de `concorrencia` threads (padrão: um por núcleo),
+    fora do limite de executor_senhas: na linha de comando não há outras
+    requisições disputando a CPU; no upload, quem chama passa o limite do
+    worker.
+    """
+    concorrencia = concorrencia or os.cpu_count() or 1
+    if concorrencia <= 1 or len(senhas) <= 1:
+        return [generate_password_hash(senha, METODO_SENHA) for senha in senhas]
+    with _novo_executor(concorrencia) as executor:
+        return list(executor.map(lambda senha: generate_password_hash(senha, METODO_SENHA), senhas))
+
+def _parametros(metodo):
+    # Prefixo que o werkzeug grava para o método (ex.: 'scrypt' -> 'scrypt:32768:8:1')
+    if metodo == 'scrypt':
+        return 'scrypt:32768:8:1'
+    if metodo.startswith('pbkdf2') and metodo.count(':') < 2:
+        nome = metodo if ':' in metodo else 'pbkdf2:sha256'
+        return f'{nome}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return metodo
+
+def precisa_rehash(senha_hash):
+    """Se o hash foi gerado com método ou parâmetros diferentes dos atuais."""
+    return senha_hash.split('$', 1)[0] != _parametros(METODO_SENHA)
+
+class LimitadorLogin:
+    """Conta falhas de login por usuário e por IP e bloqueia quem passa do limite.
+
+    O contador expira `janela` segundos após a última falha. Com
+    CACHE_REDIS_URL é compartilhado entre os workers; sem ele, cada worker
+    conta separadamente.
+    """
+
+    def __init__(self, por_usuario=5, por_ip=20, janela=300):
+        self.por_usuario = por_usuario
+        self.por_ip = por_ip
+        self._falhas = criar_cache_compartilhado('login_falhas', maximo=10000, ttl=janela)
+
+    def _chaves(self, username, ip):
+        return ((f'usuario:{(username or "").lower()}', self.por_usuario), (f'ip:{ip}', self.por_ip))
+
+    def bloqueado(self, username, ip):
+        return any((self._falhas.get(chave) or 0) >= limite for chave, limite in self._chaves(username, ip))
+
+    def registrar_falha(self, username, ip):
+        # Incremento atômico: falhas simultâneas em vários workers não se perdem
+        for chave, _ in self._chaves(username, ip):
+            self._falhas.incrementar(chave)
+
+    def registrar_sucesso(self, username):
+        self._falhas.delete(f'usuario:{(username or "").lower()}')
+
+limitador_login = LimitadorLogin(
+    por_usuario=int(os.environ.get('LOGIN_FALHAS_USUARIO', 5)),
+    por_ip=int(os.environ.get('LOGIN_FALHAS_IP', 20)),
+    janela=int(os.environ.get('LOGIN_JANELA', 300)),
+)
@@ -0,0 +1,39 @@
+from flask_login import UserMixin
+import os
+from app.models import db, Usuario
+from app.utils.cache import criar_cache_compartilhado
+
+# Identidade (id, username, is_admin) dos usuários logados, para que o
+# user_loader não consulte o banco a cada requisição. Sem CACHE_REDIS_URL a
+# invalidação só alcança o worker que fez a alteração; os demais enxergam a
+# mudança (ex.: perda de permissão de admin) quando o TTL expira.
+cache_usuarios = criar_cache_compartilhado(
+    'usuarios', maximo=1024, ttl=int(os.environ.get('CACHE_USUARIOS_TTL', 60))
+)
+
+class UsuarioSessao(UserMixin):
+    """current_user montado a partir do cache, sem instância ORM.
+
+    Rotas que precisam alterar o usuário (ex.: trocar a senha) devem
+    carregar o Usuario pelo id.
+    """
+
+    def __init__(self, id, username, is_admin):
+        self.id = id
+        self.username = username
+        self.is_admin = is_admin
+
+def carregar_usuario(user_id):
+    user_id = int(user_id)
+    dados = cache_usuarios.get(user_id)
+    if dados is None:
+        usuario = db.session.get(Usuario, user_id)
+        if usuario is None:
+            return None
+        dados = {'id': usuario.id, 'username': usuario.username, 'is_admin': bool(usuario.is_admin)}
+        cache_usuarios.set(user_id, dados)
+    return UsuarioSessao(**dados)
+
+def invalidar_usuario(user_id):
+    """Remove o usuário do cache após alteração ou remoção."""
+    cache_usuarios.delete(int(user_id))
@@ -0,0 +1,25 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, Versao
+
+def ler_versao(chave):
+    return db.session.scalar(select(Versao.valor).where(Versao.chave == chave)) or 0
+
+def incrementar_versao(chave):
+    """Incrementa o contador na transação atual (o commit fica com quem chama)."""
+    dialeto = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialeto == 'postgresql' else sqlite.insert
+    stmt = insert(Versao).values(chave=chave, valor=1)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['chave'], set_={'valor': Versao.valor + 1}
+    ))
+
+# Ordem fixa dos contadores numa transação: cada upsert trava a linha até o
+# commit, e duas transações que travam as mesmas linhas em ordens diferentes
+# podem entrar em deadlock no PostgreSQL
+ORDEM_VERSOES = ('salas', 'reservas', 'calendario')
+
+def incrementar_versoes(*chaves):
+    """Incrementa vários contadores sempre na ordem de ORDEM_VERSOES."""
+    for chave in sorted(set(chaves), key=ORDEM_VERSOES.index):
+        incrementar_versao(chave)
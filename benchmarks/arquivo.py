@@ -0,0 +1,90 @@
+"""Latência das consultas quentes antes e depois de arquivar as reservas antigas.
+
+Popula anos de reservas, mede as rotas e a verificação de conflitos sobre
+a tabela inteira, executa o arquivamento (como `flask arquivar-reservas`)
+e repete as medições com só os meses recentes em `reserva`.
+
+Uso:
+    python -m benchmarks.arquivo [--reservas 200000] [--anos 3] [--meses 12] [--database-url URL]
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.dados import criar_app, popular
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tempos)
+
+
+def cenarios(app, cliente, sala_id):
+    from app.utils.reservas import buscar_conflitos
+
+    amanha = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    recente = amanha.date().isoformat()
+
+    def conflito():
+        with app.app_context():
+            buscar_conflitos(sala_id, [(amanha + timedelta(weeks=i), amanha + timedelta(weeks=i, hours=1))
+                                       for i in range(12)])
+
+    return {
+        'listagem (1ª página)': lambda: cliente.get('/reservas'),
+        'listagem por sala': lambda: cliente.get(f'/reservas?sala_id={sala_id}'),
+        'listagem por data recente': lambda: cliente.get(f'/reservas?data={recente}'),
+        'conflito (12 semanas)': conflito,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservas', type=int, default=200_000)
+    parser.add_argument('--salas', type=int, default=50)
+    parser.add_argument('--anos', type=int, default=3)
+    parser.add_argument('--meses', type=int, default=12, help='Reservas concluídas há mais meses vão para o arquivo')
+    parser.add_argument('--repeticoes', type=int, default=30)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    print(f"Populando {args.reservas} reservas em {args.salas} salas ({args.anos} anos)...")
+    popular(app, n_salas=args.salas, n_reservas=args.reservas, anos=args.anos)
+
+    from app.models import db, Sala, Reserva, ReservaArquivo
+    from app.utils.arquivo import arquivar_reservas, corte_arquivo
+
+    with app.app_context():
+        sala_id = db.session.query(Sala.id).first().id
+
+    cliente = app.test_client()
+    cliente.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    medicoes = cenarios(app, cliente, sala_id)
+
+    antes = {nome: medir(funcao, args.repeticoes) for nome, funcao in medicoes.items()}
+
+    with app.app_context():
+        corte = corte_arquivo(datetime.now(), args.meses)
+        t0 = time.perf_counter()
+        movidas = arquivar_reservas(corte)
+        decorrido = time.perf_counter() - t0
+        restantes = Reserva.query.count()
+        arquivadas = ReservaArquivo.query.count()
+    print(f"Arquivadas {movidas} reservas terminadas antes de {corte:%d/%m/%Y} em {decorrido:.1f} s "
+          f"({movidas / decorrido:.0f}/s); {restantes} continuam em reserva, {arquivadas} no arquivo.\n")
+
+    depois = {nome: medir(funcao, args.repeticoes) for nome, funcao in medicoes.items()}
+
+    print(f"{'consulta':<28} {'antes ms':>10} {'depois ms':>10}")
+    for nome in medicoes:
+        print(f"{nome:<28} {antes[nome]:>10.2f} {depois[nome]:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
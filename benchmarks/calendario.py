@@ -0,0 +1,76 @@
+"""Custo dos feeds .ics: feed completo, 304 (ETag) e sincronização incremental (`since`).
+
+Simula um cliente de calendário consultando o feed de uma sala e de um
+usuário: a primeira leitura traz o feed inteiro, as seguintes mandam a
+ETag (304) e, depois de uma nova reserva, o token `since` traz só ela.
+
+Uso:
+    python -m benchmarks.calendario [--reservas 100000] [--repeticoes 30] [--database-url URL]
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, time as hora, timedelta
+
+from benchmarks.dados import criar_app, popular
+
+
+def medir(cliente, url, repeticoes, **headers):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resposta = cliente.get(url, headers=headers)
+        corpo = resposta.data
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tempos), resposta, corpo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservas', type=int, default=100_000)
+    parser.add_argument('--salas', type=int, default=20)
+    parser.add_argument('--repeticoes', type=int, default=30)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    print(f"Populando {args.reservas} reservas em {args.salas} salas...")
+    popular(app, n_salas=args.salas, n_reservas=args.reservas)
+
+    from app.models import db, Sala, Usuario
+    from app.utils.calendario import token_feed
+    from app.utils.recorrencia import ocorrencia_unica
+    from app.utils.reservas import criar_reservas
+
+    with app.test_request_context():
+        sala_id = db.session.query(Sala.id).first().id
+        user_id = db.session.query(Usuario.id).filter(Usuario.username == 'usuario0000').scalar()
+        urls = {'sala': f"/calendario/{token_feed('sala', sala_id)}.ics",
+                'usuário': f"/calendario/{token_feed('usuario', user_id)}.ics"}
+
+    # Duas reservas avulsas daqui a 100 dias, às 20:00 (fora do horário dos dados gerados), nos dois
+    # feeds; o `since` anterior à última traz só ela
+    with app.app_context():
+        dia = datetime.now().date() + timedelta(days=100)
+        criar_reservas(sala_id, [ocorrencia_unica(dia + timedelta(days=i), hora(20), hora(21)) for i in (0, 1)],
+                       dict(user_id=user_id, assunto='Nova', nome_solicitante='Benchmark', setor='TI',
+                            telefone='0', recorrencia_id=None, is_recorrente=False))
+
+    cliente = app.test_client()
+    print(f"\n{'feed':<10} {'cenário':<22} {'status':>6} {'ms':>8} {'KB':>8} {'eventos':>8}")
+    for nome, url in urls.items():
+        medir(cliente, url, 3)  # aquecimento
+        completo, resposta, corpo = medir(cliente, url, args.repeticoes)
+        etag, token = resposta.headers['ETag'], resposta.headers['X-Sync-Token']
+        cenarios = [('completo', completo, resposta, corpo),
+                    ('If-None-Match', *medir(cliente, url, args.repeticoes, **{'If-None-Match': etag})),
+                    ('since (sem mudança)', *medir(cliente, f'{url}?since={token}', args.repeticoes))]
+        anterior = int(token) - 1
+        cenarios.append(('since (1 alteração)', *medir(cliente, f'{url}?since={anterior}', args.repeticoes)))
+        for cenario, ms, resposta, corpo in cenarios:
+            print(f"{nome:<10} {cenario:<22} {resposta.status_code:>6} {ms:>8.2f} {len(corpo) / 1024:>8.1f} "
+                  f"{corpo.count(b'BEGIN:VEVENT'):>8}")
+
+
+if __name__ == '__main__':
+    main()
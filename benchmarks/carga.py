@@ -0,0 +1,199 @@
+"""Teste de carga: reservas e painel com telas SSE abertas, por perfil de workers do gunicorn.
+
+Sobe o gunicorn (gunicorn.conf.py) em cada modo, abre `--telas` conexões
+longas no painel ao vivo e mede vazão e latência das requisições curtas
+(dashboard e reservas) feitas por `--clientes` usuários simultâneos.
+
+Uso:
+    python -m benchmarks.carga [--modos sync,threads,gevent] [--telas 20] [--clientes 16]
+                               [--duracao 15] [--workers 2] [--database-url URL]
+"""
+import argparse
+import http.client
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import date, timedelta
+
+from benchmarks.dados import criar_app, popular, SENHA_PADRAO
+
+TIMEOUT_REQUISICAO = 10
+
+
+def esperar_servidor(porta, processo, limite=30):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            raise RuntimeError('O gunicorn encerrou durante a inicialização.')
+        try:
+            socket.create_connection(('127.0.0.1', porta), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('O gunicorn não respondeu a tempo.')
+
+
+def iniciar_gunicorn(modo, database_url, porta, workers, **ambiente_extra):
+    """Sobe o gunicorn com o gunicorn.conf.py no modo pedido e espera a porta abrir."""
+    ambiente = dict(os.environ, GUNICORN_MODO=modo, DATABASE_URL=database_url,
+                    WEB_CONCURRENCY=str(workers), **ambiente_extra)
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{porta}',
+         '--log-level', 'warning', 'run:app'],
+        env=ambiente
+    )
+    try:
+        esperar_servidor(porta, processo)
+    except RuntimeError:
+        processo.terminate()
+        raise
+    return processo
+
+
+def login(porta, usuario, senha):
+    conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=TIMEOUT_REQUISICAO)
+    corpo = urllib.parse.urlencode({'username': usuario, 'password': senha})
+    conexao.request('POST', '/login', corpo, {'Content-Type': 'application/x-www-form-urlencoded'})
+    resposta = conexao.getresponse()
+    resposta.read()
+    conexao.close()
+    return resposta.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def tela(porta, cookie, parar, intervalo_consulta=15):
+    """Mantém uma conexão SSE aberta, como um monitor de corredor.
+
+    Acima de PAINEL_SSE_MAX o worker responde 204 e a tela passa a
+    consultar /painel/estado, como o navegador.
+    """
+    while not parar.is_set():
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=TIMEOUT_REQUISICAO * 3)
+            conexao.request('GET', '/painel/eventos', headers={'Cookie': cookie})
+            resposta = conexao.getresponse()
+            if resposta.status == 204:
+                resposta.read()
+                while not parar.wait(intervalo_consulta):
+                    conexao.request('GET', '/painel/estado', headers={'Cookie': cookie})
+                    conexao.getresponse().read()
+            while not parar.is_set() and resposta.fp.readline():
+                pass
+            conexao.close()
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.5)
+
+
+def cliente(porta, cookie, sala_ids, parar, latencias, erros, semente):
+    rnd = random.Random(semente)
+    conexao = None
+    while not parar.is_set():
+        if rnd.random() < 0.5:
+            metodo, caminho, corpo = 'GET', '/', None
+        else:
+            dia = date.today() + timedelta(days=rnd.randint(30, 3000))
+            hora = rnd.randint(7, 17)
+            metodo, caminho = 'POST', '/reservar'
+            corpo = urllib.parse.urlencode({
+                'sala_id': rnd.choice(sala_ids), 'assunto': 'Carga', 'nome_solicitante': 'Benchmark',
+                'setor': 'TI', 'telefone': '0000', 'data': dia.isoformat(),
+                'hora_inicio': f'{hora:02d}:00', 'hora_fim': f'{hora + 1:02d}:00',
+            })
+        cabecalhos = {'Cookie': cookie, 'Content-Type': 'application/x-www-form-urlencoded'}
+        inicio = time.perf_counter()
+        try:
+            if conexao is None:
+                conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=TIMEOUT_REQUISICAO)
+            conexao.request(metodo, caminho, corpo, cabecalhos)
+            resposta = conexao.getresponse()
+            resposta.read()
+            if resposta.status >= 400:
+                raise OSError(resposta.status)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        except (OSError, http.client.HTTPException):
+            erros.append(1)
+            if conexao is not None:
+                conexao.close()
+            conexao = None
+
+
+def medir_modo(modo, args, database_url, sala_ids, porta):
+    processo = iniciar_gunicorn(modo, database_url, porta, args.workers, PAINEL_EVENTOS_DURACAO='3600')
+    try:
+        cookie = login(porta, 'admin', 'admin123')
+        # Logins antes das telas: no modo sync elas ocupam todos os workers
+        cookies = [login(porta, f'usuario{i:04d}', SENHA_PADRAO) for i in range(args.clientes)]
+        parar = threading.Event()
+        latencias, erros = [], []
+
+        telas = [threading.Thread(target=tela, args=(porta, cookie, parar), daemon=True)
+                 for _ in range(args.telas)]
+        for t in telas:
+            t.start()
+        time.sleep(1)
+
+        clientes = [
+            threading.Thread(target=cliente, args=(porta, cookies[i], sala_ids, parar, latencias, erros, i), daemon=True)
+            for i in range(args.clientes)
+        ]
+        inicio = time.perf_counter()
+        for t in clientes:
+            t.start()
+        time.sleep(args.duracao)
+        parar.set()
+        for t in clientes:
+            t.join()
+        decorrido = time.perf_counter() - inicio
+    finally:
+        processo.terminate()
+        processo.wait()
+
+    latencias.sort()
+    return {
+        'rps': len(latencias) / decorrido,
+        'p50': statistics.median(latencias) if latencias else float('nan'),
+        'p99': latencias[int(len(latencias) * 0.99) - 1] if latencias else float('nan'),
+        'ok': len(latencias),
+        'erros': len(erros),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modos', default='sync,threads,gevent')
+    parser.add_argument('--telas', type=int, default=20, help='Conexões SSE abertas durante o teste')
+    parser.add_argument('--clientes', type=int, default=16, help='Usuários simultâneos reservando')
+    parser.add_argument('--duracao', type=int, default=15, help='Segundos de medição por modo')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--reservas', type=int, default=20_000)
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    database_url = app.config['SQLALCHEMY_DATABASE_URI']
+    print(f"Populando {args.reservas} reservas...")
+    popular(app, n_reservas=args.reservas, n_usuarios=max(args.clientes, 1))
+    with app.app_context():
+        from app.models import Sala
+        sala_ids = [sala.id for sala in Sala.query.all()]
+
+    print(f"{args.telas} telas SSE abertas, {args.clientes} clientes, {args.duracao} s por modo, "
+          f"{args.workers} workers\n")
+    print(f"{'modo':<8} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'ok':>7} {'erros':>6}")
+    for modo in args.modos.split(','):
+        try:
+            r = medir_modo(modo, args, database_url, sala_ids, args.porta)
+        except RuntimeError as e:
+            print(f"{modo:<8} {e}")
+            continue
+        print(f"{modo:<8} {r['rps']:>8.1f} {r['p50']:>9.1f} {r['p99']:>9.1f} {r['ok']:>7} {r['erros']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Teste de estresse: vários processos reservando a mesma sala ao mesmo tempo.
+
+Cada processo faz login e dispara reservas de 1h em horários sorteados de
+um único dia, de modo que a maioria das tentativas disputa o mesmo
+intervalo. Ao final verifica que não há nenhuma sobreposição no banco.
+
+Uso:
+    python -m benchmarks.concorrencia [--processos 8] [--reservas 50] [--database-url URL]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import aliased
+
+from benchmarks.dados import criar_app
+
+
+def trabalhador(database_url, sala_id, n_reservas, semente, fila):
+    app = criar_app(database_url)
+    cliente = app.test_client()
+    cliente.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    rnd = random.Random(semente)
+    inicio = time.perf_counter()
+    for _ in range(n_reservas):
+        hora = rnd.randrange(8, 18)
+        minuto = rnd.choice(['00', '30'])
+        cliente.post('/reservar', data={
+            'sala_id': sala_id,
+            'assunto': 'Estresse',
+            'nome_solicitante': f'Processo {os.getpid()}',
+            'setor': 'TI',
+            'telefone': '0',
+            'data': '2030-06-03',
+            'hora_inicio': f'{hora:02d}:{minuto}',
+            'hora_fim': f'{hora + 1:02d}:{minuto}',
+        })
+    fila.put(time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processos', type=int, default=8)
+    parser.add_argument('--reservas', type=int, default=50, help='Tentativas por processo')
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    database_url = os.environ['DATABASE_URL']
+
+    from app.models import db, Sala, Reserva
+
+    with app.app_context():
+        sala = Sala(nome='Sala de Estresse')
+        db.session.add(sala)
+        db.session.commit()
+        sala_id = sala.id
+
+    # spawn: cada processo abre as próprias conexões, como um worker do gunicorn
+    contexto = multiprocessing.get_context('spawn')
+    fila = contexto.Queue()
+    processos = [
+        contexto.Process(target=trabalhador, args=(database_url, sala_id, args.reservas, i, fila))
+        for i in range(args.processos)
+    ]
+    inicio = time.perf_counter()
+    for p in processos:
+        p.start()
+    duracoes = [fila.get() for _ in processos]
+    for p in processos:
+        p.join()
+    total = time.perf_counter() - inicio
+
+    with app.app_context():
+        outra = aliased(Reserva)
+        sobreposicoes = db.session.scalar(
+            select(func.count()).select_from(Reserva).join(outra, and_(
+                outra.sala_id == Reserva.sala_id,
+                outra.id < Reserva.id,
+                outra.inicio < Reserva.fim,
+                outra.fim > Reserva.inicio,
+            )).where(Reserva.sala_id == sala_id)
+        )
+        criadas = Reserva.query.filter_by(sala_id=sala_id).count()
+
+    tentativas = args.processos * args.reservas
+    print(f"Tentativas: {tentativas} em {args.processos} processos")
+    print(f"Reservas gravadas: {criadas} | Sobreposições: {sobreposicoes}")
+    print(f"Tempo total: {total:.2f} s | Vazão: {tentativas / max(duracoes):.1f} tentativas/s")
+    sys.exit(1 if sobreposicoes else 0)
+
+
+if __name__ == '__main__':
+    main()
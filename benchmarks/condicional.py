@@ -0,0 +1,64 @@
+"""Custo do dashboard e da listagem: render completo, 304 pela ETag e cards em cache.
+
+Cada rota é medida sem If-None-Match (render completo), com a ETag da
+resposta anterior (304, como um painel de parede ou uma visita repetida) e,
+no dashboard, com a página renderizada mas os cards tirados do cache.
+
+Uso:
+    python -m benchmarks.condicional [--requisicoes 500] [--salas 30] [--database-url URL]
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.dados import criar_app, popular
+
+
+def medir(cliente, caminho, n, **headers):
+    tempos = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        resposta = cliente.get(caminho, headers=headers)
+        tempos.append((time.perf_counter() - t0) * 1000)
+    tempos.sort()
+    return statistics.median(tempos), tempos[int(len(tempos) * 0.99) - 1], resposta.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requisicoes', type=int, default=500)
+    parser.add_argument('--salas', type=int, default=30)
+    parser.add_argument('--reservas', type=int, default=50_000)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    popular(app, n_salas=args.salas, n_reservas=args.reservas)
+    cliente = app.test_client()
+    cliente.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    from app.routes import main as rotas
+    from app.utils.cache import CacheTTL
+
+    resultados = []
+    for caminho in ('/', '/reservas'):
+        etag = cliente.get(caminho).headers['ETag']
+        medir(cliente, caminho, 20)  # aquecimento (templates, conexões)
+        resultados.append((caminho, 'render completo', medir(cliente, caminho, args.requisicoes)))
+        resultados.append((caminho, 'If-None-Match',
+                           medir(cliente, caminho, args.requisicoes, **{'If-None-Match': etag})))
+
+    # maximo=0: todo set é descartado e cada card volta a ser renderizado
+    cache_cards = rotas.cache_cards
+    rotas.cache_cards = CacheTTL(maximo=0)
+    resultados.append(('/', 'sem cache de cards', medir(cliente, '/', args.requisicoes)))
+    rotas.cache_cards = cache_cards
+
+    print(f"{args.salas} salas, {args.reservas} reservas, {args.requisicoes} requisições por cenário\n")
+    print(f"{'rota':<10} {'cenário':<20} {'status':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for caminho, nome, (p50, p99, status) in resultados:
+        print(f"{caminho:<10} {nome:<20} {status:>6} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Geração de dados realistas para os benchmarks (salas, usuários e reservas)."""
+import os
+import random
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+
+SENHA_PADRAO = 'benchmark'
+
+# Máximo de reservas por sala em cada dia útil (08:00-19:00)
+RESERVAS_POR_DIA = 5
+
+
+def criar_app(database_url=None):
+    """Cria a aplicação apontando para o banco informado (ou um SQLite temporário)."""
+    if database_url is None:
+        pasta = tempfile.mkdtemp(prefix='bench_sistema_')
+        database_url = f"sqlite:///{os.path.join(pasta, 'bench.db')}"
+    # A URL precisa estar no ambiente antes do primeiro import de `app`
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app
+    from app.utils.migracoes import inicializar_banco
+    app = create_app()
+    with app.app_context():
+        inicializar_banco()
+    return app
+
+
+def _dias_uteis(ultimo, quantidade):
+    """Dias úteis (meia-noite) dos `quantidade` dias corridos que terminam em `ultimo`, em ordem."""
+    dias = (ultimo - timedelta(days=i) for i in range(quantidade - 1, -1, -1))
+    return [dia for dia in dias if dia.weekday() < 5]
+
+
+def popular(app, n_salas=20, n_reservas=100_000, n_usuarios=50, anos=3, seed=42):
+    """Insere reservas sem sobreposição, distribuídas em horário comercial.
+
+    As reservas cobrem os dias úteis dos últimos `anos` anos e dos próximos
+    90 dias; cada sala tem uma série semanal recorrente. Retorna a
+    quantidade de reservas inseridas.
+    """
+    from app.models import db, Sala, Usuario, Reserva
+
+    rnd = random.Random(seed)
+    setores = ['TI', 'RH', 'Financeiro', 'Jurídico', 'Vigilância', 'Atenção Básica', 'Gabinete']
+
+    with app.app_context():
+        db.session.execute(db.insert(Sala), [
+            {'nome': f'Sala {i:03d}', 'andar': f'{i % 8 + 1}º Andar', 'ordem': i}
+            for i in range(n_salas)
+        ])
+        # Um único hash para todos: a senha de todos os usuários gerados é SENHA_PADRAO
+        senha_hash = generate_password_hash(SENHA_PADRAO)
+        db.session.execute(db.insert(Usuario), [
+            {'username': f'usuario{i:04d}', 'senha_hash': senha_hash, 'is_admin': False}
+            for i in range(n_usuarios)
+        ])
+        sala_ids = [s.id for s in Sala.query.all()]
+        user_ids = [u.id for u in Usuario.query.all()]
+
+        # Período terminando 90 dias à frente; recua além de `anos` se a
+        # densidade necessária passar de RESERVAS_POR_DIA por sala
+        por_sala = n_reservas // len(sala_ids)
+        hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        dias_periodo = _dias_uteis(hoje + timedelta(days=90), 365 * anos + 90)
+        densidade = min(RESERVAS_POR_DIA, max(por_sala / len(dias_periodo), 0.1))
+        dias = _dias_uteis(hoje + timedelta(days=90), int(por_sala / densidade * 7 / 5) + 7)
+
+        lote = []
+        total = 0
+        for sala_id in sala_ids:
+            # Cada sala tem uma série semanal às 08:00 em um dia fixo, renovada a cada 12 semanas
+            dia_serie = rnd.randrange(5)
+            serie = None
+            restantes = por_sala
+            for dia in dias:
+                if restantes <= 0:
+                    break
+                cursor = dia + timedelta(hours=8)
+                quantidade = int(densidade) + (rnd.random() < densidade - int(densidade))
+                for i in range(min(quantidade, restantes)):
+                    recorrente = i == 0 and dia.weekday() == dia_serie
+                    if recorrente:
+                        if serie is None or serie[1] == 0:
+                            serie = [str(uuid.uuid4()), 12]
+                        serie[1] -= 1
+                        duracao = timedelta(hours=1)
+                    else:
+                        cursor += timedelta(minutes=rnd.choice([0, 0, 30, 60]))
+                        duracao = timedelta(minutes=rnd.choice([30, 60, 60, 90, 120]))
+                    if cursor + duracao > dia + timedelta(hours=19):
+                        break
+                    lote.append({
+                        'sala_id': sala_id,
+                        'user_id': rnd.choice(user_ids),
+                        'assunto': 'Reunião de acompanhamento',
+                        'nome_solicitante': 'Benchmark',
+                        'setor': rnd.choice(setores),
+                        'telefone': '81 3184-0000',
+                        'inicio': cursor,
+                        'fim': cursor + duracao,
+                        'data_criacao': cursor - timedelta(days=7),
+                        'recorrencia_id': serie[0] if recorrente else None,
+                        'is_recorrente': recorrente,
+                    })
+                    restantes -= 1
+                    cursor += duracao
+                    if len(lote) >= 5000:
+                        db.session.execute(db.insert(Reserva), lote)
+                        total += len(lote)
+                        lote = []
+        if lote:
+            db.session.execute(db.insert(Reserva), lote)
+            total += len(lote)
+        db.session.commit()
+    return total
@@ -0,0 +1,50 @@
+"""Vazão (linhas/s) e pico de memória da exportação de reservas.
+
+Uso:
+    python -m benchmarks.exportacao [--reservas 200000] [--formato csv|xlsx] [--database-url URL]
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.dados import criar_app, popular
+
+
+def exportar(cliente, formato):
+    inicio = time.perf_counter()
+    resposta = cliente.get(f'/reservas/exportar?formato={formato}', buffered=False)
+    tamanho = 0
+    for bloco in resposta.response:
+        tamanho += len(bloco)
+    resposta.close()
+    return time.perf_counter() - inicio, tamanho
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservas', type=int, default=200_000)
+    parser.add_argument('--formato', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    print(f"Populando {args.reservas} reservas...")
+    total = popular(app, n_reservas=args.reservas)
+
+    cliente = app.test_client()
+    cliente.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    # Duas passagens: o tracemalloc deixa a execução bem mais lenta
+    duracao, tamanho = exportar(cliente, args.formato)
+    tracemalloc.start()
+    exportar(cliente, args.formato)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Formato: {args.formato} | Linhas: {total} | Tamanho: {tamanho / 1024 / 1024:.1f} MiB")
+    print(f"Tempo: {duracao:.2f} s | Vazão: {total / duracao:,.0f} linhas/s")
+    print(f"Pico de memória Python durante a exportação: {pico / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Linha de base de vazão e latência dos fluxos login → dashboard → reservar → reservas → cancelar.
+
+Popula um banco (SQLite temporário ou --database-url) com centenas de
+salas e anos de reservas, e executa os fluxos pelo test client do Flask
+ou, com --gunicorn, por HTTP contra um gunicorn local. Com --salvar a
+linha de base é gravada em JSON; com --comparar a execução falha (código
+1) se o p95 de algum passo piorar além da tolerância.
+
+Uso:
+    python -m benchmarks.fluxos [--salas 200] [--reservas 200000] [--fluxos 200] [--simultaneos 4]
+                                [--gunicorn threads] [--salvar base.json | --comparar base.json]
+"""
+import argparse
+import http.client
+import json
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from datetime import date, timedelta
+
+from benchmarks.dados import criar_app, popular, SENHA_PADRAO
+
+PASSOS = ('login', 'dashboard', 'reservar', 'reservas', 'cancelar', 'logout')
+
+
+class ClienteTeste:
+    """Requisições pelo test client do Flask (sem rede)."""
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def requisitar(self, metodo, caminho, dados=None):
+        resposta = self.cliente.open(caminho, method=metodo, data=dados)
+        return resposta.status_code, resposta.get_data(as_text=True)
+
+
+class ClienteHttp:
+    """Requisições HTTP reais, guardando o cookie de sessão."""
+
+    def __init__(self, porta):
+        self.conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+        self.cookie = None
+
+    def requisitar(self, metodo, caminho, dados=None):
+        cabecalhos = {'Cookie': self.cookie} if self.cookie else {}
+        corpo = None
+        if dados is not None:
+            corpo = urllib.parse.urlencode(dados)
+            cabecalhos['Content-Type'] = 'application/x-www-form-urlencoded'
+        self.conexao.request(metodo, caminho, corpo, cabecalhos)
+        resposta = self.conexao.getresponse()
+        texto = resposta.read().decode('utf-8', 'replace')
+        cookie = resposta.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return resposta.status, texto
+
+
+def executar_fluxos(novo_cliente, usuario, sala_ids, quantidade, semente, medicoes, erros, lock):
+    rnd = random.Random(semente)
+    cliente = novo_cliente()
+
+    def passo(nome, metodo, caminho, dados=None, esperado=(200,)):
+        inicio = time.perf_counter()
+        try:
+            status, corpo = cliente.requisitar(metodo, caminho, dados)
+        except (OSError, http.client.HTTPException):
+            status, corpo = None, ''
+        duracao = (time.perf_counter() - inicio) * 1000
+        with lock:
+            if status in esperado:
+                medicoes[nome].append(duracao)
+            else:
+                erros[nome] += 1
+        return corpo if status in esperado else None
+
+    for _ in range(quantidade):
+        passo('login', 'POST', '/login', {'username': usuario, 'password': SENHA_PADRAO}, esperado=(302,))
+        passo('dashboard', 'GET', '/')
+
+        # Datas além do período populado: o conflito só ocorre entre os próprios fluxos
+        dia = date.today() + timedelta(days=rnd.randint(120, 3000))
+        sala_id = rnd.choice(sala_ids)
+        hora = rnd.randint(7, 17)
+        passo('reservar', 'POST', '/reservar', {
+            'sala_id': sala_id, 'assunto': 'Benchmark de fluxos', 'nome_solicitante': 'Benchmark',
+            'setor': 'TI', 'telefone': '0000', 'data': dia.isoformat(),
+            'hora_inicio': f'{hora:02d}:00', 'hora_fim': f'{hora + 1:02d}:00',
+        }, esperado=(302,))
+
+        corpo = passo('reservas', 'GET', f'/reservas?data={dia.isoformat()}&sala_id={sala_id}')
+        cancelar = re.search(r'/cancelar/\d+', corpo or '')
+        if cancelar:
+            passo('cancelar', 'GET', cancelar.group(0), esperado=(302,))
+        passo('logout', 'GET', '/logout', esperado=(302,))
+
+
+def percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--salas', type=int, default=200)
+    parser.add_argument('--reservas', type=int, default=200_000)
+    parser.add_argument('--anos', type=int, default=3)
+    parser.add_argument('--fluxos', type=int, default=200, help='Total de fluxos completos')
+    parser.add_argument('--simultaneos', type=int, default=4, help='Usuários executando fluxos ao mesmo tempo')
+    parser.add_argument('--gunicorn', metavar='MODO', help='Usa um gunicorn local (sync, threads ou gevent)')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--porta', type=int, default=8766)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    parser.add_argument('--salvar', metavar='ARQUIVO', help='Grava os percentis como linha de base (JSON)')
+    parser.add_argument('--comparar', metavar='ARQUIVO', help='Compara com uma linha de base gravada')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='Piora aceita no p95 (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    print(f"Populando {args.salas} salas e {args.reservas} reservas...")
+    popular(app, n_salas=args.salas, n_reservas=args.reservas, n_usuarios=max(args.simultaneos, 1), anos=args.anos)
+    with app.app_context():
+        from app.models import Sala
+        sala_ids = [sala.id for sala in Sala.query.all()]
+
+    processo = None
+    if args.gunicorn:
+        from benchmarks.carga import iniciar_gunicorn
+        processo = iniciar_gunicorn(args.gunicorn, app.config['SQLALCHEMY_DATABASE_URI'], args.porta, args.workers)
+        novo_cliente = lambda: ClienteHttp(args.porta)
+    else:
+        novo_cliente = lambda: ClienteTeste(app)
+
+    medicoes, erros, lock = defaultdict(list), defaultdict(int), threading.Lock()
+    por_usuario = [args.fluxos // args.simultaneos + (i < args.fluxos % args.simultaneos)
+                   for i in range(args.simultaneos)]
+    threads = [
+        threading.Thread(target=executar_fluxos, args=(
+            novo_cliente, f'usuario{i:04d}', sala_ids, quantidade, i, medicoes, erros, lock
+        ))
+        for i, quantidade in enumerate(por_usuario)
+    ]
+    inicio = time.perf_counter()
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait()
+    decorrido = time.perf_counter() - inicio
+
+    total = sum(len(v) for v in medicoes.values())
+    print(f"\n{args.fluxos} fluxos em {decorrido:.1f} s ({args.simultaneos} simultâneos, "
+          f"{'gunicorn ' + args.gunicorn if args.gunicorn else 'test client'}): "
+          f"{args.fluxos / decorrido:.1f} fluxos/s, {total / decorrido:.1f} req/s\n")
+    print(f"{'passo':<10} {'ok':>6} {'erros':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    resultado = {}
+    for nome in PASSOS:
+        tempos = sorted(medicoes[nome])
+        if not tempos:
+            print(f"{nome:<10} {0:>6} {erros[nome]:>6}")
+            continue
+        resultado[nome] = {
+            'p50': statistics.median(tempos), 'p95': percentil(tempos, 0.95), 'p99': percentil(tempos, 0.99),
+        }
+        r = resultado[nome]
+        print(f"{nome:<10} {len(tempos):>6} {erros[nome]:>6} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f}")
+
+    if args.salvar:
+        with open(args.salvar, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2)
+        print(f"\nLinha de base gravada em {args.salvar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)
+        regressoes = [
+            f"{nome}: p95 {resultado[nome]['p95']:.1f} ms (base {base[nome]['p95']:.1f} ms)"
+            for nome in base if nome in resultado
+            if resultado[nome]['p95'] > base[nome]['p95'] * (1 + args.tolerancia)
+        ]
+        if regressoes or any(erros.values()):
+            print("\nRegressões em relação à linha de base:")
+            for linha in regressoes:
+                print(f"  {linha}")
+            if any(erros.values()):
+                print(f"  erros: {dict(erros)}")
+            sys.exit(1)
+        print("\nSem regressões em relação à linha de base.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Vazão da importação em massa por CSV: reservas em lotes x linha a linha e hashes de senha.
+
+Gera um CSV de reservas no formato da exportação (com ~1% de linhas em
+conflito com a anterior) e o importa com o lote padrão e, numa amostra,
+com lote=1 (uma transação e uma consulta de conflitos por linha, como o
+cadastro pelo formulário). Depois importa usuários com os hashes em
+série e em paralelo.
+
+Uso:
+    python -m benchmarks.importacao [--linhas 100000] [--usuarios 100] [--database-url URL]
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.dados import criar_app, popular
+
+HORARIOS = range(8, 19)
+
+
+def gerar_reservas(caminho, n_linhas, salas, usuarios, ano, seed=42):
+    """Reservas de uma hora em dias seguidos a partir de `ano`; ~1% repete a linha anterior (conflito)."""
+    rnd = random.Random(seed)
+    dia = datetime(ano, 1, 1)
+    with open(caminho, 'w', encoding='utf-8-sig', newline='') as arquivo:
+        writer = csv.writer(arquivo, delimiter=';')
+        writer.writerow(['ID', 'Sala', 'Assunto', 'Solicitante', 'Setor', 'Telefone', 'Início', 'Fim',
+                         'Usuário', 'Recorrente'])
+        gravadas = 0
+        while True:
+            for sala in salas:
+                for hora in HORARIOS:
+                    inicio = dia.replace(hour=hora)
+                    linha = [gravadas, sala, f'Reunião {gravadas}', 'Benchmark', 'TI', '0',
+                             inicio.strftime('%d/%m/%Y %H:%M'),
+                             (inicio + timedelta(hours=1)).strftime('%d/%m/%Y %H:%M'), rnd.choice(usuarios), 'Não']
+                    for _ in range(2 if rnd.random() < 0.01 else 1):
+                        if gravadas == n_linhas:
+                            return
+                        writer.writerow(linha)
+                        gravadas += 1
+            dia += timedelta(days=1)
+
+
+def gerar_usuarios(caminho, n_usuarios, prefixo):
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        writer = csv.writer(arquivo)
+        writer.writerow(['username', 'senha', 'admin'])
+        for i in range(n_usuarios):
+            writer.writerow([f'{prefixo}{i:05d}', f'senha-{i}', 'não'])
+
+
+def importar(app, tipo, caminho, **opcoes):
+    from app.utils.importacao import importar_csv
+    with app.app_context(), open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+        return importar_csv(tipo, arquivo, **opcoes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--amostra-linha-a-linha', type=int, default=2_000)
+    parser.add_argument('--usuarios', type=int, default=100)
+    parser.add_argument('--reservas', type=int, default=100_000, help='Reservas já existentes no banco')
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    print(f"Populando {args.reservas} reservas existentes...")
+    popular(app, n_salas=20, n_reservas=args.reservas)
+
+    from app.utils.catalogo import catalogo_salas
+    from app.utils.importacao import LOTE_IMPORTACAO
+    with app.app_context():
+        salas = [sala.nome for sala in catalogo_salas.todas()]
+    usuarios = [f'usuario{i:04d}' for i in range(50)]
+
+    pasta = tempfile.mkdtemp(prefix='bench_importacao_')
+    cenarios = []
+    # Anos diferentes: cada cenário importa horários livres (fora os ~1% repetidos de propósito)
+    for nome, n_linhas, lote, ano in ((f'reservas lote={LOTE_IMPORTACAO}', args.linhas, LOTE_IMPORTACAO, 2040),
+                                      ('reservas lote=1', args.amostra_linha_a_linha, 1, 2080)):
+        caminho = os.path.join(pasta, f'reservas_{ano}.csv')
+        gerar_reservas(caminho, n_linhas, salas, usuarios, ano)
+        print(f"Importando {n_linhas} linhas ({nome})...")
+        cenarios.append((nome, importar(app, 'reservas', caminho, lote=lote)))
+
+    for nome, concorrencia in (('usuários em série', 1), (f'usuários {os.cpu_count()} threads', None)):
+        caminho = os.path.join(pasta, f'usuarios_{concorrencia}.csv')
+        gerar_usuarios(caminho, args.usuarios, f'imp{concorrencia}_')
+        cenarios.append((nome, importar(app, 'usuarios', caminho, concorrencia_senhas=concorrencia)))
+
+    print(f"\n{'cenário':<24} {'lidas':>8} {'gravadas':>9} {'erros':>7} {'s':>8} {'linhas/s':>10}")
+    for nome, resultado in cenarios:
+        print(f"{nome:<24} {resultado.lidas:>8} {resultado.importadas:>9} {len(resultado.erros):>7} "
+              f"{resultado.duracao:>8.2f} {resultado.linhas_por_segundo:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Planos de execução e latência das consultas quentes de Reserva, com e sem índices.
+
+Uso:
+    python -m benchmarks.indices [--reservas 100000] [--database-url URL]
+"""
+import argparse
+import statistics
+import time
+from datetime import timedelta
+
+from sqlalchemy import and_, select, text
+
+from benchmarks.dados import criar_app, popular
+
+
+def consultas(Sala, Reserva, referencia, sala_id, user_id, recorrencia_id):
+    """Mesmas consultas feitas por dashboard, reservar, lista_reservas e cancelar_reserva."""
+    return {
+        'conflito (reservar)': select(Reserva.id).where(
+            Reserva.sala_id == sala_id,
+            Reserva.inicio < referencia + timedelta(hours=1),
+            Reserva.fim > referencia,
+        ).limit(1),
+        'ocupação (dashboard)': select(Sala.id, Reserva.id).outerjoin(
+            Reserva,
+            and_(Reserva.sala_id == Sala.id, Reserva.inicio <= referencia, Reserva.fim >= referencia),
+        ).order_by(Sala.ordem),
+        'por usuário (lista_reservas)': select(Reserva.id).where(
+            Reserva.user_id == user_id
+        ).order_by(Reserva.inicio.desc()).limit(50),
+        'por data (lista_reservas)': select(Reserva.id).where(
+            Reserva.inicio >= referencia.replace(hour=0, minute=0),
+            Reserva.inicio <= referencia.replace(hour=23, minute=59),
+        ).order_by(Reserva.inicio.desc()),
+        'série (cancelar_reserva)': select(Reserva.id).where(
+            Reserva.recorrencia_id == recorrencia_id
+        ),
+    }
+
+
+def plano(conn, stmt):
+    # Parâmetros nomeados para reaproveitar o SQL compilado dentro de text()
+    compilado = stmt.compile(dialect=type(conn.dialect)(paramstyle='named'))
+    prefixo = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    linhas = conn.execute(text(prefixo + str(compilado)), compilado.params).all()
+    return [str(linha[-1]) for linha in linhas]
+
+
+def medir(conn, stmt, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        conn.execute(stmt).all()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tempos)
+
+
+def executar(conn, qs, repeticoes):
+    resultado = {}
+    for nome, stmt in qs.items():
+        resultado[nome] = (medir(conn, stmt, repeticoes), plano(conn, stmt))
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservas', type=int, default=100_000)
+    parser.add_argument('--salas', type=int, default=20)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    print(f"Populando {args.reservas} reservas em {args.salas} salas...")
+    popular(app, n_salas=args.salas, n_reservas=args.reservas)
+
+    from app.models import db, Sala, Reserva
+
+    with app.app_context():
+        engine = db.engine
+        amostra = db.session.execute(
+            select(Reserva.sala_id, Reserva.user_id, Reserva.inicio)
+            .order_by(Reserva.id).offset(args.reservas // 2).limit(1)
+        ).one()
+        recorrencia_id = db.session.scalar(
+            select(Reserva.recorrencia_id).where(Reserva.recorrencia_id.is_not(None)).limit(1)
+        )
+        qs = consultas(Sala, Reserva, amostra.inicio, amostra.sala_id, amostra.user_id, recorrencia_id)
+
+        indices = list(Reserva.__table__.indexes)
+        with engine.connect() as conn:
+            for indice in indices:
+                indice.drop(bind=conn, checkfirst=True)
+            conn.execute(text('ANALYZE'))
+            conn.commit()
+            sem = executar(conn, qs, args.repeticoes)
+
+            for indice in indices:
+                indice.create(bind=conn, checkfirst=True)
+            conn.execute(text('ANALYZE'))
+            conn.commit()
+            com = executar(conn, qs, args.repeticoes)
+
+    print(f"\nBanco: {engine.url.get_backend_name()} | mediana de {args.repeticoes} execuções\n")
+    for nome in qs:
+        print(f"{nome:32s} sem índices: {sem[nome][0]:9.3f} ms   com índices: {com[nome][0]:9.3f} ms")
+        for linha in com[nome][1]:
+            print(f"    {linha}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Tempo e consultas ao banco na inicialização da aplicação (import + create_app).
+
+Cada medição roda em um interpretador novo, como um worker do gunicorn
+subindo. Compara a fábrica atual com o comportamento antigo, em que cada
+create_app também executava create_all e a busca do admin padrão.
+
+Uso:
+    python -m benchmarks.inicializacao [--rodadas 10] [--database-url URL]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.dados import criar_app
+
+# Executado em um processo novo; imprime JSON com o tempo e o total de SQL
+MEDICAO = """
+import json, time
+t0 = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+consultas = []
+event.listen(Engine, 'before_cursor_execute', lambda *a: consultas.append(1))
+from app import create_app
+from app.utils.migracoes import inicializar_banco
+t1 = time.perf_counter()
+app = create_app()
+if {antigo}:
+    with app.app_context():
+        inicializar_banco()
+t2 = time.perf_counter()
+print(json.dumps({{'importacao': t1 - t0, 'fabrica': t2 - t1, 'consultas': len(consultas)}}))
+"""
+
+
+def medir_uma_vez(database_url, antigo):
+    saida = subprocess.run(
+        [sys.executable, '-c', MEDICAO.format(antigo=antigo)],
+        env=dict(os.environ, DATABASE_URL=database_url), capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rodadas', type=int, default=10)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    # Cria o esquema e o admin uma vez, como faria o `flask init-db` no deploy
+    app = criar_app(args.database_url)
+    database_url = app.config['SQLALCHEMY_DATABASE_URI']
+
+    # Rodadas intercaladas para que variações da máquina afetem os dois modos igualmente
+    variantes = (('com create_all + admin', True), ('atual (sem acesso ao banco)', False))
+    resultados = {nome: [] for nome, _ in variantes}
+    for _ in range(args.rodadas):
+        for nome, antigo in variantes:
+            resultados[nome].append(medir_uma_vez(database_url, antigo))
+
+    print(f"{'fábrica':<28} {'import ms':>10} {'create_app ms':>14} {'consultas':>10}")
+    for nome, _ in variantes:
+        rodadas = resultados[nome]
+        importacao = statistics.median(r['importacao'] for r in rodadas) * 1000
+        fabrica = statistics.median(r['fabrica'] for r in rodadas) * 1000
+        print(f"{nome:<28} {importacao:>10.1f} {fabrica:>14.1f} {rodadas[-1]['consultas']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Latência do dashboard durante uma tempestade de logins (início de expediente).
+
+Sobe o gunicorn (modo threads) e, enquanto `--painel` usuários já logados
+abrem o dashboard sem parar, `--logins` clientes fazem login em sequência.
+Compara o hash de senha sem limite (SENHA_CONCORRENCIA=0, como antes) com
+o pool limitado de app/utils/senhas.py.
+
+Uso:
+    python -m benchmarks.login [--logins 16] [--painel 4] [--duracao 15] [--concorrencia 1]
+                               [--workers 1] [--database-url URL]
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+import urllib.parse
+
+from benchmarks.carga import iniciar_gunicorn, login, TIMEOUT_REQUISICAO
+from benchmarks.dados import criar_app, popular, SENHA_PADRAO
+
+
+def painel(porta, cookie, parar, latencias, erros):
+    conexao = None
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        try:
+            if conexao is None:
+                conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=TIMEOUT_REQUISICAO * 3)
+            conexao.request('GET', '/', headers={'Cookie': cookie})
+            resposta = conexao.getresponse()
+            resposta.read()
+            if resposta.status != 200:
+                raise OSError(resposta.status)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        except (OSError, http.client.HTTPException):
+            erros.append(1)
+            if conexao is not None:
+                conexao.close()
+            conexao = None
+
+
+def tempestade(porta, usuario, parar, resultados):
+    corpo = urllib.parse.urlencode({'username': usuario, 'password': SENHA_PADRAO})
+    while not parar.is_set():
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=TIMEOUT_REQUISICAO * 3)
+            conexao.request('POST', '/login', corpo, {'Content-Type': 'application/x-www-form-urlencoded'})
+            resposta = conexao.getresponse()
+            resposta.read()
+            conexao.close()
+            resultados.append(resposta.status)
+        except (OSError, http.client.HTTPException):
+            resultados.append(None)
+
+
+def medir(args, database_url, nome, logins, **ambiente):
+    processo = iniciar_gunicorn('threads', database_url, args.porta, args.workers, **ambiente)
+    try:
+        cookies = [login(args.porta, f'usuario{i:04d}', SENHA_PADRAO) for i in range(args.painel)]
+        parar = threading.Event()
+        latencias, erros, resultados = [], [], []
+        threads = [threading.Thread(target=painel, args=(args.porta, cookie, parar, latencias, erros))
+                   for cookie in cookies]
+        threads += [threading.Thread(target=tempestade, args=(args.porta, f'usuario{i:04d}', parar, resultados))
+                    for i in range(args.painel, args.painel + logins)]
+        for t in threads:
+            t.start()
+        time.sleep(args.duracao)
+        parar.set()
+        for t in threads:
+            t.join()
+    finally:
+        processo.terminate()
+        processo.wait()
+
+    latencias.sort()
+    return {
+        'nome': nome,
+        'p50': statistics.median(latencias) if latencias else float('nan'),
+        'p99': latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))] if latencias else float('nan'),
+        'painel': len(latencias) / args.duracao,
+        'erros': len(erros),
+        'logins': resultados.count(302) / args.duracao,
+        'recusados': resultados.count(503),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=16, help='Clientes fazendo login sem parar')
+    parser.add_argument('--painel', type=int, default=4, help='Usuários logados abrindo o dashboard')
+    parser.add_argument('--duracao', type=int, default=15, help='Segundos de medição por cenário')
+    parser.add_argument('--concorrencia', type=int, default=1, help='SENHA_CONCORRENCIA do cenário limitado')
+    parser.add_argument('--fila', type=int, default=4, help='SENHA_FILA do cenário limitado')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--porta', type=int, default=8767)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    database_url = app.config['SQLALCHEMY_DATABASE_URI']
+    popular(app, n_reservas=5_000, n_usuarios=args.painel + args.logins)
+
+    cenarios = (
+        ('sem tempestade', 0, {}),
+        ('sem limite', args.logins, {'SENHA_CONCORRENCIA': '0'}),
+        (f'limite {args.concorrencia}+{args.fila}', args.logins,
+         {'SENHA_CONCORRENCIA': str(args.concorrencia), 'SENHA_FILA': str(args.fila)}),
+    )
+    print(f"{args.painel} usuários no dashboard, {args.logins} clientes fazendo login, "
+          f"{args.workers} worker(s), {args.duracao} s por cenário\n")
+    print(f"{'cenário':<16} {'dash p50':>9} {'dash p99':>9} {'dash/s':>8} {'logins/s':>9} {'recusados':>10}")
+    for nome, logins, ambiente in cenarios:
+        r = medir(args, database_url, nome, logins, **ambiente)
+        print(f"{r['nome']:<16} {r['p50']:>9.1f} {r['p99']:>9.1f} {r['painel']:>8.1f} "
+              f"{r['logins']:>9.1f} {r['recusados']:>10}")
+
+
+if __name__ == '__main__':
+    main()
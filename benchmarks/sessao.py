@@ -0,0 +1,50 @@
+"""Latência de uma requisição autenticada com e sem o cache do user_loader.
+
+Uso:
+    python -m benchmarks.sessao [--requisicoes 2000] [--database-url URL]
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.dados import criar_app
+
+
+def medir(cliente, caminho, n):
+    tempos = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        cliente.get(caminho)
+        tempos.append((time.perf_counter() - t0) * 1000)
+    tempos.sort()
+    return statistics.median(tempos), tempos[int(len(tempos) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requisicoes', type=int, default=2000)
+    parser.add_argument('--caminho', default='/perfil', help='Rota autenticada medida')
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite temporário')
+    args = parser.parse_args()
+
+    app = criar_app(args.database_url)
+    cliente = app.test_client()
+    cliente.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    from app.utils import sessao
+    from app.utils.cache import CacheTTL
+
+    medir(cliente, args.caminho, 50)  # aquecimento (templates, conexões)
+    com_cache = medir(cliente, args.caminho, args.requisicoes)
+
+    # maximo=0: todo set é descartado e cada requisição volta ao banco
+    sessao.cache_usuarios = CacheTTL(maximo=0)
+    sem_cache = medir(cliente, args.caminho, args.requisicoes)
+
+    print(f"GET {args.caminho} x {args.requisicoes}")
+    print(f"sem cache: p50 {sem_cache[0]:.3f} ms | p99 {sem_cache[1]:.3f} ms")
+    print(f"com cache: p50 {com_cache[0]:.3f} ms | p99 {com_cache[1]:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
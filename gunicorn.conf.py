@@ -0,0 +1,34 @@
+# Configuração do gunicorn (carregada automaticamente a partir da raiz do projeto).
+#
+# GUNICORN_MODO escolhe o perfil de workers:
+#   sync    - um processo atende uma requisição por vez (comportamento antigo)
+#   threads - gthread: cada worker atende GUNICORN_THREADS requisições (padrão);
+#             só um quarto delas atende telas SSE do painel (PAINEL_SSE_MAX)
+#   gevent  - assíncrono: milhares de conexões longas (painel SSE, exportações)
+#             por worker, sem bloquear as reservas. Requer gevent e psycogreen.
+import os
+
+modo = os.environ.get('GUNICORN_MODO', 'threads')
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+if modo == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_CONEXOES', 1000))
+elif modo == 'threads':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 8))
+else:
+    worker_class = 'sync'
+
+def post_fork(server, worker):
+    if modo != 'gevent' or not os.environ.get('DATABASE_URL', '').startswith('postgres'):
+        return
+    # Sem isto o psycopg2 bloqueia o loop do gevent durante cada consulta
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning("Pacote 'psycogreen' não instalado: consultas ao PostgreSQL bloquearão o worker gevent.")
+    else:
+        patch_psycopg()
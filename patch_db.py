@@ -1,33 +1,12 @@
-from app import create_app, db
-from sqlalchemy import text
-
-app = create_app()
-from sqlalchemy import text
+# Mantido por compatibilidade: equivale a `flask --app run init-db`
+from app import create_app
+from app.utils.migracoes import inicializar_banco, aplicar_patches
 
 def patch_database():
+    app = create_app()
     with app.app_context():
-        # Verifica se estamos usando SQLite ou PostgreSQL
-        engine = db.engine
-        
-        print(f"Detectado banco de dados: {engine.url}")
-        
-        with engine.connect() as conn:
-            # Tenta adicionar as colunas uma por uma
-            try:
-                conn.execute(text("ALTER TABLE reserva ADD COLUMN recorrencia_id VARCHAR(50)"))
-                conn.commit()
-                print("Coluna 'recorrencia_id' adicionada com sucesso.")
-            except Exception as e:
-                print(f"Aviso ao adicionar 'recorrencia_id': {e}")
-
-            try:
-                conn.execute(text("ALTER TABLE reserva ADD COLUMN is_recorrente BOOLEAN DEFAULT FALSE"))
-                conn.commit()
-                print("Coluna 'is_recorrente' adicionada com sucesso.")
-            except Exception as e:
-                print(f"Aviso ao adicionar 'is_recorrente': {e}")
-                
-        print("Migração concluída!")
+        inicializar_banco()
+        aplicar_patches()
 
 if __name__ == "__main__":
     patch_database()
@@ -0,0 +1,48 @@
+"""Base dos testes: cada classe ganha uma app com um banco SQLite temporário próprio."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from app import create_app
+from app.models import db
+from app.utils.catalogo import catalogo_salas
+from app.utils.migracoes import inicializar_banco
+from app.utils.reservas import invalidar_caches_reservas
+from app.utils.sessao import cache_usuarios
+
+
+class CasoComBanco(unittest.TestCase):
+    """App e banco novos por classe; o admin padrão (admin/admin123) já existe."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pasta = tempfile.mkdtemp(prefix='teste_')
+        # create_app lê a URL do ambiente a cada chamada
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(cls.pasta, 'teste.db')}"
+        cls.app = create_app()
+        with cls.app.app_context():
+            inicializar_banco()
+        # Os caches em memória são do processo: não podem carregar dados do banco da classe anterior
+        catalogo_salas.invalidar()
+        invalidar_caches_reservas()
+        cache_usuarios.limpar()
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(cls.pasta, ignore_errors=True)
+
+    def setUp(self):
+        self.contexto = self.app.app_context()
+        self.contexto.push()
+
+    def tearDown(self):
+        db.session.rollback()
+        self.contexto.pop()
+
+    def cliente_logado(self, username='admin', password='admin123'):
+        cliente = self.app.test_client()
+        cliente.post('/login', data={'username': username, 'password': password})
+        return cliente
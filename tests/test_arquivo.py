@@ -0,0 +1,76 @@
+"""Arquivamento: os ids de Reserva continuam únicos entre Reserva e ReservaArquivo."""
+import unittest
+from datetime import datetime
+
+from sqlalchemy import text
+
+from apoio import CasoComBanco
+from app.models import db, Sala, Reserva, ReservaArquivo
+from app.utils.arquivo import arquivar_reservas
+from app.utils.migracoes import recriar_reserva_autoincrement
+
+
+class TesteIdsArquivados(CasoComBanco):
+
+    def setUp(self):
+        super().setUp()
+        db.session.execute(text('DELETE FROM reserva'))
+        db.session.execute(text('DELETE FROM reserva_arquivo'))
+        sala = Sala.query.filter_by(nome='Sala Arquivo').first() or Sala(nome='Sala Arquivo')
+        db.session.add(sala)
+        db.session.commit()
+        self.sala_id = sala.id
+
+    def _reservar(self, dia):
+        reserva = Reserva(sala_id=self.sala_id, user_id=1, assunto='Teste', nome_solicitante='Fulano',
+                          setor='TI', telefone='0', inicio=datetime(2020, 1, dia, 9), fim=datetime(2020, 1, dia, 10))
+        db.session.add(reserva)
+        db.session.commit()
+        return reserva.id
+
+    def _ids(self):
+        return (set(db.session.scalars(db.select(Reserva.id))),
+                set(db.session.scalars(db.select(ReservaArquivo.id))))
+
+    def test_maior_id_arquivado_nao_e_reutilizado(self):
+        self._reservar(1)
+        antigo = self._reservar(2)
+        # Só a reserva do dia 2 (o maior id) termina antes do corte
+        db.session.execute(text('UPDATE reserva SET inicio = :inicio, fim = :fim WHERE id = :id'),
+                           {'inicio': datetime(2019, 1, 1, 9), 'fim': datetime(2019, 1, 1, 10), 'id': antigo})
+        db.session.commit()
+        self.assertEqual(arquivar_reservas(datetime(2019, 6, 1)), 1)
+
+        novo = self._reservar(3)
+        ativas, arquivadas = self._ids()
+        self.assertEqual(arquivadas, {antigo})
+        self.assertGreater(novo, antigo)
+        self.assertFalse(ativas & arquivadas)
+
+    def test_migracao_recria_a_tabela_sem_reutilizar_ids(self):
+        with db.engine.connect() as conn:
+            definicao = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'reserva'")).scalar()
+            self.assertIn('AUTOINCREMENT', definicao)
+            # Banco criado antes da correção: a mesma tabela, sem AUTOINCREMENT
+            conn.execute(text('DROP TABLE reserva'))
+            conn.execute(text(definicao.replace('AUTOINCREMENT', '')))
+            conn.commit()
+        primeiro = self._reservar(1)
+        db.session.add(ReservaArquivo(id=primeiro + 5, sala_id=self.sala_id, user_id=1, assunto='Arquivada',
+                                      nome_solicitante='Fulano', setor='TI', telefone='0',
+                                      inicio=datetime(2019, 1, 1, 9), fim=datetime(2019, 1, 1, 10)))
+        db.session.commit()
+
+        with db.engine.connect() as conn:
+            recriar_reserva_autoincrement(conn)
+            recriar_reserva_autoincrement(conn)  # idempotente
+            definicao = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'reserva'")).scalar()
+        self.assertIn('AUTOINCREMENT', definicao)
+        db.session.remove()
+
+        self.assertEqual(self._ids()[0], {primeiro})
+        self.assertEqual(self._reservar(2), primeiro + 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
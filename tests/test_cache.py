@@ -0,0 +1,23 @@
+"""Caches: escolha do backend compartilhado."""
+import unittest
+from unittest import mock
+
+from app.utils.cache import CacheTTL, criar_cache_compartilhado
+
+
+class TesteCacheCompartilhado(unittest.TestCase):
+
+    def test_sem_url_usa_cache_local(self):
+        with mock.patch.dict('os.environ', clear=True):
+            self.assertIsInstance(criar_cache_compartilhado('teste'), CacheTTL)
+
+    def test_sem_pacote_redis_avisa_no_log(self):
+        with mock.patch.dict('os.environ', {'CACHE_REDIS_URL': 'redis://localhost:6379/0'}), \
+                mock.patch.dict('sys.modules', {'redis': None}), \
+                self.assertLogs('app.utils.cache', 'WARNING') as logs:
+            self.assertIsInstance(criar_cache_compartilhado('teste'), CacheTTL)
+        self.assertIn('CACHE_REDIS_URL', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Feeds .ics: RRULE das séries e respostas incrementais com `since`."""
+import unittest
+from datetime import date, datetime, time, timedelta
+
+from apoio import CasoComBanco
+from app.models import db, Reserva, Sala, Serie
+from app.utils.calendario import _rrule, eventos_series, token_feed
+from app.utils.catalogo import registrar_alteracao_salas
+from app.utils.reservas import cancelar_ocorrencia, criar_reservas
+
+SEGUNDA = date(2030, 1, 7)
+
+
+def _serie(frequencia, dias_semana, data_inicio, data_fim, intervalo=2):
+    return Serie(id='s1', frequencia=frequencia, intervalo=intervalo, dias_semana=dias_semana,
+                 data_inicio=data_inicio, data_fim=data_fim, excecoes='')
+
+
+class TesteRrule(unittest.TestCase):
+
+    def test_semanal_com_e_sem_dias(self):
+        self.assertEqual(_rrule(_serie('semanal', '0,4', SEGUNDA, date(2030, 3, 1))),
+                         'RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR;WKST=MO;UNTIL=20300302T025959Z')
+        # Sem dias gravados vale o dia da data inicial (uma quarta)
+        self.assertIn('BYDAY=WE;', _rrule(_serie('semanal', '', date(2030, 1, 9), date(2030, 3, 1))))
+
+    def test_mensal_no_fim_do_mes_cai_no_ultimo_dia(self):
+        self.assertIn('BYMONTHDAY=28,29,30,31;BYSETPOS=-1',
+                      _rrule(_serie('mensal', '', date(2030, 1, 31), date(2030, 6, 30))))
+        self.assertIn('BYMONTHDAY=15;', _rrule(_serie('mensal', '', date(2030, 1, 15), date(2030, 6, 30))))
+
+    def test_dias_invalidos_gravados_sao_ignorados(self):
+        with self.assertLogs('app.models', 'WARNING'):
+            self.assertIn('BYDAY=WE;', _rrule(_serie('semanal', '2,7', SEGUNDA, date(2030, 3, 1))))
+        # Sem nenhum dia válido, vale o da data inicial (uma segunda)
+        with self.assertLogs('app.models', 'WARNING'):
+            self.assertIn('BYDAY=MO;', _rrule(_serie('semanal', '9', SEGUNDA, date(2030, 3, 1))))
+
+    def test_serie_com_regra_invalida_fica_fora_do_feed(self):
+        invalida = _serie('diaria', '', SEGUNDA, date(2030, 3, 1))
+        with self.assertLogs('app.utils.calendario', 'WARNING') as logs:
+            self.assertEqual(list(eventos_series([invalida], {})), [])
+        self.assertIn('s1', logs.output[0])
+
+
+class TesteFeedIncremental(CasoComBanco):
+
+    def setUp(self):
+        super().setUp()
+        sala = Sala.query.filter_by(nome='Sala Feed').first()
+        if sala is None:
+            sala = Sala(nome='Sala Feed')
+            db.session.add(sala)
+            registrar_alteracao_salas()
+            db.session.commit()
+        self.sala_id = sala.id
+        self.url = f"/calendario/{token_feed('sala', sala.id)}.ics"
+        self.cliente = self.app.test_client()
+
+    def _reservar(self, hora, assunto):
+        inicio = datetime.combine(SEGUNDA, time(hora))
+        criar_reservas(self.sala_id, [(SEGUNDA, inicio, inicio + timedelta(hours=1))],
+                       dict(user_id=1, assunto=assunto, nome_solicitante='Fulano', setor='TI', telefone='0',
+                            recorrencia_id=None, is_recorrente=False))
+        return Reserva.query.filter_by(sala_id=self.sala_id, assunto=assunto).one()
+
+    def _feed(self, **args):
+        resposta = self.cliente.get(self.url, query_string=args)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.get_data(as_text=True), int(resposta.headers['X-Sync-Token'])
+
+    def test_since_traz_so_o_que_mudou_e_os_removidos(self):
+        antiga = self._reservar(8, 'Antiga')
+        cancelada = self._reservar(10, 'Cancelada')
+        corpo, token = self._feed()
+        self.assertIn('SUMMARY:Antiga', corpo)
+
+        nova = self._reservar(14, 'Nova')
+        cancelar_ocorrencia(db.session.get(Reserva, cancelada.id))
+        db.session.commit()
+
+        corpo, novo_token = self._feed(since=token)
+        self.assertGreater(novo_token, token)
+        self.assertIn(f'UID:reserva-{nova.id}@', corpo)
+        self.assertNotIn(f'UID:reserva-{antiga.id}@', corpo)
+        self.assertEqual(corpo.count('STATUS:CANCELLED'), 1)
+        self.assertIn(f'UID:reserva-{cancelada.id}@', corpo)
+
+        # Nada mudou desde o último token: só o cabeçalho
+        corpo, _ = self._feed(since=novo_token)
+        self.assertNotIn('BEGIN:VEVENT', corpo)
+
+    def test_token_desconhecido_devolve_o_feed_completo(self):
+        self._reservar(9, 'Completa')
+        _, token = self._feed()
+        corpo, _ = self._feed(since=token + 1000)
+        self.assertIn('SUMMARY:Completa', corpo)
+        self.assertNotIn('STATUS:CANCELLED', corpo)
+
+    def test_etag_responde_304_sem_alteracoes(self):
+        self._reservar(16, 'Etag')
+        resposta = self.cliente.get(self.url)
+        self.assertEqual(self.cliente.get(self.url, headers={'If-None-Match': resposta.headers['ETag']})
+                         .status_code, 304)
+        self._reservar(17, 'Etag 2')
+        self.assertEqual(self.cliente.get(self.url, headers={'If-None-Match': resposta.headers['ETag']})
+                         .status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""Regressão do N+1 do dashboard: o número de instruções SQL não pode crescer com as salas.
+
+Uso:
+    python -m unittest discover -s tests
+"""
+import unittest
+from datetime import timedelta
+
+from sqlalchemy import event
+
+from apoio import CasoComBanco
+from app.models import db, Sala
+from app.utils.catalogo import catalogo_salas, registrar_alteracao_salas
+from app.utils.reservas import criar_reservas, invalidar_caches_reservas
+from app.utils.time_utils import get_now_br_naive
+
+
+class TesteConsultasDashboard(CasoComBanco):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cliente = cls.app.test_client()
+        cls.cliente.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    def _completar_salas(self, total):
+        """Cria salas até `total`, metade delas com uma reserva em andamento."""
+        with self.app.app_context():
+            existentes = Sala.query.count()
+            for i in range(existentes, total):
+                db.session.add(Sala(nome=f'Sala {i:03d}', andar='1º Andar', ordem=i))
+            registrar_alteracao_salas()
+            db.session.commit()
+            agora = get_now_br_naive()
+            for sala in Sala.query.filter(Sala.id % 2 == 0, Sala.ordem >= existentes):
+                inicio, fim = agora - timedelta(minutes=30), agora + timedelta(hours=1)
+                criar_reservas(sala.id, [(inicio.date(), inicio, fim)],
+                               dict(user_id=1, assunto='Em andamento', nome_solicitante='Solicitante do teste',
+                                    setor='TI', telefone='0', recorrencia_id=None, is_recorrente=False))
+
+    def _consultas_dashboard(self):
+        """Instruções SQL de um render completo do dashboard, com os caches em memória vazios."""
+        # Aquecimento: o usuário da sessão fica no cache do user_loader nas duas medições
+        self.cliente.get('/')
+        with self.app.app_context():
+            catalogo_salas.invalidar()
+            invalidar_caches_reservas()
+            engine = db.engine
+        instrucoes = []
+
+        def contar(conn, cursor, instrucao, *args):
+            instrucoes.append(instrucao)
+
+        event.listen(engine, 'before_cursor_execute', contar)
+        try:
+            resposta = self.cliente.get('/')
+        finally:
+            event.remove(engine, 'before_cursor_execute', contar)
+        self.assertEqual(resposta.status_code, 200)
+        return instrucoes, resposta.get_data(as_text=True)
+
+    def test_consultas_nao_crescem_com_as_salas(self):
+        self._completar_salas(3)
+        com_3, html = self._consultas_dashboard()
+        self.assertEqual(html.count('Solicitante do teste'), 1)
+
+        self._completar_salas(30)
+        com_30, html = self._consultas_dashboard()
+        self.assertEqual(html.count('Solicitante do teste'), 15)
+
+        self.assertGreater(len(com_3), 0)
+        self.assertEqual(len(com_3), len(com_30), f'3 salas: {com_3}\n30 salas: {com_30}')
+
+
+if __name__ == '__main__':
+    unittest.main()
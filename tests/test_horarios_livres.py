@@ -0,0 +1,94 @@
+"""Horários livres: varredura das reservas ordenadas contra as janelas do expediente."""
+import unittest
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from apoio import CasoComBanco
+from app.models import db, Reserva, Sala, Serie
+from app.utils.catalogo import registrar_alteracao_salas
+from app.utils.reservas import criar_serie, horarios_livres
+
+DIA = date(2030, 1, 7)
+CAMPOS = dict(user_id=1, assunto='Teste', nome_solicitante='Fulano', setor='TI', telefone='0')
+
+
+def h(hora, minuto=0, dias=0):
+    return datetime.combine(DIA + timedelta(days=dias), time(hora, minuto))
+
+
+class TesteHorariosLivres(CasoComBanco):
+
+    def setUp(self):
+        super().setUp()
+        db.session.execute(db.delete(Reserva))
+        db.session.execute(db.delete(Serie))
+        salas = []
+        for nome in ('Livre A', 'Livre B'):
+            sala = Sala.query.filter_by(nome=nome).first() or Sala(nome=nome)
+            db.session.add(sala)
+            salas.append(sala)
+        db.session.commit()
+        self.sala, self.vazia = salas
+        self.janelas = [(h(8), h(18)), (h(8, dias=1), h(18, dias=1))]
+
+    def _reservar(self, *intervalos):
+        db.session.add_all(Reserva(sala_id=self.sala.id, inicio=inicio, fim=fim, **CAMPOS)
+                           for inicio, fim in intervalos)
+        db.session.commit()
+
+    def test_sobreposicoes_e_reservas_longas(self):
+        self._reservar((h(9), h(10)), (h(9, 30), h(11)), (h(12), h(17)), (h(12, 30), h(13)))
+        livres = horarios_livres([self.sala, self.vazia], self.janelas, timedelta(minutes=60))
+        self.assertEqual(livres[self.sala.id], [(h(8), h(9)), (h(11), h(12)), (h(17), h(18)), self.janelas[1]])
+        self.assertEqual(livres[self.vazia.id], self.janelas)
+
+    def test_duracao_minima_descarta_intervalos_curtos(self):
+        self._reservar((h(8, 30), h(12)), (h(12, 30), h(18)))
+        self.assertEqual(horarios_livres([self.sala], self.janelas[:1], timedelta(minutes=30))[self.sala.id],
+                         [(h(8), h(8, 30)), (h(12), h(12, 30))])
+        self.assertEqual(horarios_livres([self.sala], self.janelas[:1], timedelta(minutes=31))[self.sala.id], [])
+
+    def test_reserva_que_atravessa_a_noite_ocupa_a_janela_seguinte(self):
+        self._reservar((h(16), h(10, dias=1)))
+        self.assertEqual(horarios_livres([self.sala], self.janelas, timedelta(minutes=60))[self.sala.id],
+                         [(h(8), h(16)), (h(10, dias=1), h(18, dias=1))])
+
+    def test_series_nao_materializadas_ocupam_a_sala(self):
+        serie = Serie(id=str(uuid.uuid4()), sala_id=self.sala.id, frequencia='semanal', intervalo=1,
+                      dias_semana=str(DIA.weekday() + 1), hora_inicio=time(14), hora_fim=time(15), data_inicio=DIA,
+                      data_fim=DIA + timedelta(weeks=4), excecoes='', materializado_ate=DIA, **CAMPOS)
+        criar_serie(serie, horizonte=DIA)
+        self.assertEqual(Reserva.query.filter_by(recorrencia_id=serie.id).count(), 0)
+        self.assertEqual(horarios_livres([self.sala], self.janelas, timedelta(minutes=60))[self.sala.id],
+                         [self.janelas[0], (h(8, dias=1), h(14, dias=1)), (h(15, dias=1), h(18, dias=1))])
+
+
+class TesteApiHorariosLivres(CasoComBanco):
+
+    def test_parametros_invalidos(self):
+        cliente = self.cliente_logado()
+        for args in ({}, {'inicio': '07/01/2030'}, {'inicio': '2030-01-07', 'fim': '2030-01-06'},
+                     {'inicio': '2030-01-07', 'fim': '2030-12-31'}, {'inicio': '2030-01-07', 'duracao': 0}):
+            with self.subTest(args=args):
+                resposta = cliente.get('/api/horarios-livres', query_string=args)
+                self.assertEqual(resposta.status_code, 400)
+                self.assertIn('erro', resposta.get_json())
+
+    def test_dia_sem_reservas_e_todo_o_expediente(self):
+        sala = Sala(nome='Sala API', andar='2')
+        db.session.add(sala)
+        registrar_alteracao_salas()
+        db.session.commit()
+        resposta = self.cliente_logado().get('/api/horarios-livres',
+                                             query_string={'inicio': '2030-01-07', 'andar': '2'})
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.get_json()
+        inicio, fim = self.app.config['EXPEDIENTE_INICIO'], self.app.config['EXPEDIENTE_FIM']
+        self.assertEqual(dados['salas'], [{
+            'id': sala.id, 'nome': 'Sala API', 'andar': '2',
+            'livres': [{'inicio': f'2030-01-07T{inicio:02d}:00', 'fim': f'2030-01-07T{fim:02d}:00'}],
+        }])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Importação de CSV: lotes, relatório de erros por linha e importações interrompidas."""
+import csv
+import io
+import unittest
+from unittest import mock
+
+from sqlalchemy.exc import OperationalError
+
+from apoio import CasoComBanco
+from app.models import db, Reserva, Sala
+from app.utils.catalogo import registrar_alteracao_salas
+from app.utils.importacao import ErroImportacao, importar_csv
+from app.utils.reservas import criar_reservas_em_lote
+
+CABECALHO = 'Sala;Assunto;Solicitante;Setor;Telefone;Inicio;Fim\n'
+
+
+def _reservas(*linhas):
+    return io.StringIO(CABECALHO + ''.join(
+        f'{sala};Reunião;Fulano;TI;0;{inicio};{fim}\n' for sala, inicio, fim in linhas
+    ))
+
+
+def _horas(dia, primeira, total, sala='Importada'):
+    """`total` reservas de uma hora seguidas, a partir de `primeira` hora do `dia` de jan/2030."""
+    return [(sala, f'{dia:02d}/01/2030 {hora:02d}:00', f'{dia:02d}/01/2030 {hora + 1:02d}:00')
+            for hora in range(primeira, primeira + total)]
+
+
+class TesteImportacao(CasoComBanco):
+
+    def setUp(self):
+        super().setUp()
+        db.session.execute(db.delete(Reserva))
+        if not Sala.query.filter_by(nome='Importada').first():
+            db.session.add(Sala(nome='Importada'))
+            registrar_alteracao_salas()
+        db.session.commit()
+
+    def _importar(self, arquivo, lote=2):
+        return importar_csv('reservas', arquivo, lote, usuario_padrao=1)
+
+    def test_erros_por_linha_e_conflitos_entre_lotes(self):
+        linhas = _horas(7, 8, 3) + [
+            ('Importada', '07/01/2030 08:30', '07/01/2030 09:30'),  # conflita com a linha 2, de outro lote
+            ('Inexistente', '07/01/2030 08:00', '07/01/2030 09:00'),
+            ('Importada', '31/02/2030 08:00', '31/02/2030 09:00'),
+            ('Importada', '08/01/2030 10:00', '08/01/2030 09:00'),
+        ]
+        resultado = self._importar(_reservas(*linhas))
+        self.assertEqual((resultado.lidas, resultado.importadas), (7, 3))
+        self.assertEqual([linha for linha, _ in resultado.erros], [5, 6, 7, 8])
+        self.assertIn('Horário ocupado', resultado.erros[0][1])
+        self.assertIn("Sala 'Inexistente'", resultado.erros[1][1])
+        self.assertIsNone(resultado.interrompida)
+        self.assertEqual(resultado.ultima_linha, 8)
+
+    def test_cabecalho_sem_coluna_obrigatoria(self):
+        with self.assertRaises(ErroImportacao):
+            self._importar(io.StringIO('Sala;Assunto\nImportada;Reunião\n'))
+
+    def test_erro_do_banco_mantem_os_lotes_anteriores_e_a_reimportacao_e_segura(self):
+        linhas = _horas(9, 8, 6)
+        erro = OperationalError('INSERT ...', {}, Exception('disk I/O error'))
+        with mock.patch('app.utils.importacao.criar_reservas_em_lote',
+                        side_effect=self._falhar_no_segundo_lote(erro)), \
+                self.assertLogs('app.utils.importacao', 'ERROR'):
+            resultado = self._importar(_reservas(*linhas))
+        self.assertEqual(resultado.interrompida, 'Erro ao gravar no banco de dados.')
+        self.assertEqual((resultado.importadas, resultado.ultima_linha), (2, 3))
+        self.assertIn('depois da linha 3', resultado.aviso_interrupcao())
+        self.assertEqual(Reserva.query.count(), 2)
+
+        # O mesmo arquivo de novo: as duas primeiras voltam como ocupadas, o resto entra
+        resultado = self._importar(_reservas(*linhas))
+        self.assertEqual(resultado.importadas, 4)
+        self.assertEqual([linha for linha, _ in resultado.erros], [2, 3])
+        self.assertEqual(Reserva.query.count(), 6)
+
+    @staticmethod
+    def _falhar_no_segundo_lote(erro):
+        chamadas = []
+
+        def gravar(linhas):
+            chamadas.append(linhas)
+            if len(chamadas) == 2:
+                raise erro
+            return criar_reservas_em_lote(linhas)
+        return gravar
+
+    def test_csv_malformado_no_meio_do_arquivo(self):
+        linhas = _horas(10, 8, 2) + [('Importada', 'x' * 200, '10/01/2030 11:00')]
+        limite = csv.field_size_limit(100)
+        try:
+            resultado = self._importar(_reservas(*linhas))
+        finally:
+            csv.field_size_limit(limite)
+        self.assertTrue(resultado.interrompida.startswith('CSV malformado'))
+        self.assertEqual((resultado.importadas, resultado.ultima_linha), (2, 3))
+        self.assertIn('2 linha(s) dos lotes anteriores', resultado.aviso_interrupcao())
+
+    def test_arquivo_fora_do_utf8_nao_grava_nada(self):
+        linha = 'Importada;Reunião;João;TI;0;11/01/2030 08:00;11/01/2030 09:00\n'
+        conteudo = CABECALHO.encode() + linha.encode('latin-1')
+        resultado = self._importar(io.TextIOWrapper(io.BytesIO(conteudo), encoding='utf-8'))
+        self.assertIn('UTF-8', resultado.interrompida)
+        self.assertTrue(resultado.aviso_interrupcao().endswith('Nenhuma linha foi gravada.'))
+        self.assertEqual(Reserva.query.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+"""Instrumentação: escolha do perfilador das requisições lentas."""
+import cProfile
+import unittest
+from unittest import mock
+
+from app.utils.instrumentacao import _iniciar_perfilador
+
+
+class TestePerfilador(unittest.TestCase):
+
+    def test_sem_pyinstrument_avisa_no_log_e_usa_cprofile(self):
+        with mock.patch.dict('sys.modules', {'pyinstrument': None}), \
+                self.assertLogs('app.utils.instrumentacao', 'WARNING') as logs:
+            perfilador = _iniciar_perfilador('pyinstrument')
+        self.assertIsInstance(perfilador, cProfile.Profile)
+        perfilador.disable()
+        self.assertIn('PERFIL_FERRAMENTA=pyinstrument', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
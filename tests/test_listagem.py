@@ -0,0 +1,75 @@
+"""Listagem de reservas: paginação por cursor (inicio, id) sobre Reserva e ReservaArquivo."""
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from apoio import CasoComBanco
+from app.models import db, Reserva, ReservaArquivo, Sala
+from app.utils.reservas import invalidar_caches_reservas, registrar_alteracao_reservas
+
+CAMPOS = dict(user_id=1, assunto='Teste', nome_solicitante='Fulano', setor='TI', telefone='0')
+
+
+class TesteListagemPorCursor(CasoComBanco):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            sala = Sala(nome='Sala Lista')
+            db.session.add(sala)
+            db.session.flush()
+            ativas = [
+                Reserva(sala_id=sala.id, inicio=datetime(2030, 1, 10, 9), fim=datetime(2030, 1, 10, 10), **CAMPOS),
+                Reserva(sala_id=sala.id, inicio=datetime(2030, 1, 10, 9), fim=datetime(2030, 1, 10, 10), **CAMPOS),
+                Reserva(sala_id=sala.id, inicio=datetime(2030, 1, 3, 9), fim=datetime(2030, 1, 3, 10), **CAMPOS),
+                # Retroativa: mais antiga que parte do arquivo
+                Reserva(sala_id=sala.id, inicio=datetime(2020, 1, 5, 9), fim=datetime(2020, 1, 5, 10), **CAMPOS),
+            ]
+            db.session.add_all(ativas)
+            db.session.flush()
+            arquivadas = [
+                ReservaArquivo(id=100 + i, sala_id=sala.id, inicio=inicio, fim=inicio.replace(hour=10), **CAMPOS)
+                for i, inicio in enumerate([datetime(2020, 1, 6, 9), datetime(2020, 1, 5, 9),
+                                            datetime(2020, 1, 4, 9)])
+            ]
+            db.session.add_all(arquivadas)
+            registrar_alteracao_reservas()
+            db.session.commit()
+            cls.ativas = [(r.inicio, r.id) for r in ativas]
+            cls.todas = sorted(cls.ativas + [(r.inicio, r.id) for r in arquivadas], reverse=True)
+        invalidar_caches_reservas()
+
+    def _paginas(self, **args):
+        """Percorre a listagem pelos links de próxima página; devolve as chaves (inicio, id) de cada uma."""
+        cliente = self.cliente_logado()
+        paginas, url = [], '/reservas'
+        with mock.patch('app.routes.main.render_template', return_value='') as render:
+            while url:
+                self.assertEqual(cliente.get(url, query_string=args if url == '/reservas' else None).status_code,
+                                 200)
+                contexto = render.call_args.kwargs
+                paginas.append([(r.inicio, r.id) for r in contexto['reservas']])
+                url = contexto['proxima_url']
+        return paginas
+
+    def test_paginas_mesclam_o_arquivo_sem_repetir_nem_pular(self):
+        paginas = self._paginas(por_pagina=2)
+        self.assertEqual([len(pagina) for pagina in paginas], [2, 2, 2, 1])
+        self.assertEqual(sum(paginas, []), self.todas)
+
+    def test_empate_no_inicio_desempata_pelo_id(self):
+        primeira = self._paginas(por_pagina=1)[0]
+        self.assertEqual(primeira, [max(self.ativas)])
+
+    def test_status_futuro_nao_le_o_arquivo(self):
+        with mock.patch('app.routes.main.get_now_br_naive', return_value=datetime(2025, 1, 1)):
+            paginas = self._paginas(status='futuro', por_pagina=10)
+        self.assertEqual(paginas, [sorted(self.ativas[:3], reverse=True)])
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        self.assertEqual(self._paginas(apos='nao-e-cursor', por_pagina=10), [self.todas])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Login: limite de tentativas por usuário e por IP e rehash das senhas antigas."""
+import threading
+import unittest
+from unittest import mock
+
+from werkzeug.security import generate_password_hash
+
+from apoio import CasoComBanco
+from app.models import db, Usuario
+from app.utils.cache import CacheTTL
+from app.utils.senhas import LimitadorLogin, limitador_login, precisa_rehash
+
+
+class TesteLimitadorLogin(unittest.TestCase):
+
+    def test_bloqueia_por_usuario_e_por_ip(self):
+        limitador = LimitadorLogin(por_usuario=2, por_ip=3, janela=60)
+        limitador.registrar_falha('Ana', '10.0.0.1')
+        self.assertFalse(limitador.bloqueado('ana', '10.0.0.1'))
+        limitador.registrar_falha('ana', '10.0.0.2')
+        # O nome não diferencia maiúsculas; o IP conta separado
+        self.assertTrue(limitador.bloqueado('ANA', '10.0.0.9'))
+        self.assertFalse(limitador.bloqueado('bia', '10.0.0.1'))
+
+        limitador.registrar_falha('bia', '10.0.0.1')
+        limitador.registrar_falha('caio', '10.0.0.1')
+        self.assertTrue(limitador.bloqueado('davi', '10.0.0.1'))
+
+        # O sucesso limpa só o contador do usuário
+        limitador.registrar_sucesso('ana')
+        self.assertFalse(limitador.bloqueado('ana', '10.0.0.2'))
+        self.assertTrue(limitador.bloqueado('ana', '10.0.0.1'))
+
+    def test_falhas_simultaneas_nao_se_perdem(self):
+        limitador = LimitadorLogin(por_usuario=1000, por_ip=1000, janela=60)
+        threads = [threading.Thread(target=lambda: [limitador.registrar_falha('ana', '10.0.0.1')
+                                                     for _ in range(100)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(limitador._falhas.get('usuario:ana'), 800)
+        self.assertEqual(limitador._falhas.get('ip:10.0.0.1'), 800)
+
+    def test_contador_expirado_recomeca(self):
+        cache = CacheTTL(ttl=60)
+        with mock.patch('app.utils.cache.time.monotonic', return_value=1000.0):
+            self.assertEqual(cache.incrementar('x'), 1)
+            self.assertEqual(cache.incrementar('x'), 2)
+        with mock.patch('app.utils.cache.time.monotonic', return_value=1061.0):
+            self.assertEqual(cache.incrementar('x'), 1)
+
+
+class TesteLoginIp(CasoComBanco):
+
+    def setUp(self):
+        super().setUp()
+        limitador_login._falhas.limpar()
+        self.addCleanup(limitador_login._falhas.limpar)
+
+    def _falhar(self, cliente, **cabecalhos):
+        return cliente.post('/login', data={'username': 'ninguem', 'password': 'x'}, headers=cabecalhos)
+
+    def test_x_forwarded_for_forjado_nao_escapa_do_limite(self):
+        cliente = self.app.test_client()
+        with mock.patch.object(limitador_login, 'por_ip', 3), mock.patch.object(limitador_login, 'por_usuario', 100):
+            for i in range(3):
+                self.assertEqual(self._falhar(cliente, **{'X-Forwarded-For': f'203.0.113.{i}'}).status_code, 200)
+            self.assertEqual(self._falhar(cliente, **{'X-Forwarded-For': '203.0.113.99'}).status_code, 429)
+
+    def test_com_proxy_confiavel_o_ip_vem_do_ultimo_salto(self):
+        from app import create_app
+        with mock.patch.dict('os.environ', {'PROXY_SALTOS': '1'}):
+            app = create_app()
+        cliente = app.test_client()
+        with mock.patch.object(limitador_login, 'por_ip', 2), mock.patch.object(limitador_login, 'por_usuario', 100):
+            # O proxy acrescenta o endereço real ao fim; o que o cliente mandou antes é ignorado
+            for forjado in ('1.1.1.1', '2.2.2.2'):
+                self._falhar(cliente, **{'X-Forwarded-For': f'{forjado}, 198.51.100.7'})
+            self.assertEqual(self._falhar(cliente, **{'X-Forwarded-For': '198.51.100.7'}).status_code, 429)
+            self.assertEqual(self._falhar(cliente, **{'X-Forwarded-For': '198.51.100.8'}).status_code, 200)
+        with app.app_context():
+            db.engine.dispose()
+
+
+class TesteRehash(CasoComBanco):
+
+    def test_login_refaz_hash_com_parametros_antigos(self):
+        usuario = Usuario(username='antigo', senha_hash=generate_password_hash('segredo', 'pbkdf2:sha256:1000'))
+        db.session.add(usuario)
+        db.session.commit()
+        self.assertTrue(precisa_rehash(usuario.senha_hash))
+
+        resposta = self.app.test_client().post('/login', data={'username': 'antigo', 'password': 'segredo'})
+        self.assertEqual(resposta.status_code, 302)
+        db.session.expire_all()
+        usuario = Usuario.query.filter_by(username='antigo').one()
+        self.assertFalse(precisa_rehash(usuario.senha_hash))
+        self.assertTrue(usuario.check_senha('segredo'))
+
+    def test_senha_errada_nao_refaz_o_hash(self):
+        antigo = generate_password_hash('segredo', 'pbkdf2:sha256:1000')
+        db.session.add(Usuario(username='antigo2', senha_hash=antigo))
+        db.session.commit()
+        self.app.test_client().post('/login', data={'username': 'antigo2', 'password': 'errada'})
+        db.session.expire_all()
+        self.assertEqual(Usuario.query.filter_by(username='antigo2').one().senha_hash, antigo)
+
+
+if __name__ == '__main__':
+    unittest.main()
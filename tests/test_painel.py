@@ -0,0 +1,77 @@
+"""Painel ao vivo: limite de conexões SSE por worker e consulta periódica do estado."""
+import unittest
+from datetime import timedelta
+
+from apoio import CasoComBanco
+from app.models import db, Sala
+from app.utils.catalogo import registrar_alteracao_salas
+from app.utils.painel import conexoes_painel
+from app.utils.reservas import criar_reservas
+from app.utils.time_utils import get_now_br_naive
+
+
+class TestePainel(CasoComBanco):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.app.config['PAINEL_SSE_MAX'] = 1
+        with cls.app.app_context():
+            db.session.add_all([Sala(nome='Sala 1', ordem=0), Sala(nome='Sala 2', ordem=1)])
+            registrar_alteracao_salas()
+            db.session.commit()
+            cls.sala_ids = [sala.id for sala in Sala.query.order_by(Sala.ordem)]
+
+    def setUp(self):
+        super().setUp()
+        self.cliente = self.cliente_logado()
+
+    def _estado(self, estado):
+        resposta = self.cliente.get('/painel/estado', query_string={'estado': estado})
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.get_json()
+
+    def test_conexoes_acima_do_limite_recebem_204(self):
+        primeira = self.cliente.get('/painel/eventos', buffered=False)
+        try:
+            self.assertEqual(primeira.status_code, 200)
+            self.assertEqual(conexoes_painel.abertas, 1)
+            self.assertEqual(self.cliente.get('/painel/eventos').status_code, 204)
+        finally:
+            primeira.close()
+        self.assertEqual(conexoes_painel.abertas, 0)
+
+        segunda = self.cliente.get('/painel/eventos', buffered=False)
+        self.assertEqual(segunda.status_code, 200)
+        segunda.close()
+
+    def test_sse_desligado_no_painel(self):
+        self.app.config['PAINEL_SSE_MAX'] = 0
+        try:
+            self.assertEqual(self.cliente.get('/painel/eventos').status_code, 204)
+            self.assertIn('window.EventSource && false', self.cliente.get('/').get_data(as_text=True))
+        finally:
+            self.app.config['PAINEL_SSE_MAX'] = 1
+
+    def test_consulta_devolve_so_os_cards_que_mudaram(self):
+        livre = ','.join(f'{sala_id}:0' for sala_id in self.sala_ids)
+        dados = self._estado(livre)
+        self.assertEqual(dados, {'estado': livre, 'salas': [], 'recarregar': False})
+
+        agora = get_now_br_naive()
+        inicio, fim = agora - timedelta(minutes=10), agora + timedelta(minutes=50)
+        criar_reservas(self.sala_ids[1], [(inicio.date(), inicio, fim)],
+                       dict(user_id=1, assunto='Painel', nome_solicitante='Solicitante do painel', setor='TI',
+                            telefone='0', recorrencia_id=None, is_recorrente=False))
+        dados = self._estado(livre)
+        self.assertFalse(dados['recarregar'])
+        self.assertEqual([card['id'] for card in dados['salas']], [self.sala_ids[1]])
+        self.assertIn('Solicitante do painel', dados['salas'][0]['html'])
+        self.assertEqual(self._estado(dados['estado'])['salas'], [])
+
+    def test_sala_nova_pede_recarregar(self):
+        self.assertTrue(self._estado(f'{self.sala_ids[0]}:0')['recarregar'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Relatórios de ocupação: participação por setor e séries com mais cancelamentos avulsos."""
+import unittest
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from apoio import CasoComBanco
+from app.models import db, OcupacaoHora, OcupacaoSerie, Reserva, Sala, Serie
+from app.utils.catalogo import registrar_alteracao_salas
+from app.utils.relatorios import reconstruir_ocupacao, relatorio_ocupacao
+from app.utils.reservas import cancelar_ocorrencia, criar_reservas, criar_serie
+
+SEGUNDA = date(2030, 1, 7)
+EXPEDIENTE = (8, 18)
+
+
+class TesteRelatorioOcupacao(CasoComBanco):
+
+    def setUp(self):
+        super().setUp()
+        for modelo in (Reserva, Serie, OcupacaoHora, OcupacaoSerie):
+            db.session.execute(db.delete(modelo))
+        sala = Sala.query.filter_by(nome='Sala Relatórios').first()
+        if sala is None:
+            sala = Sala(nome='Sala Relatórios')
+            db.session.add(sala)
+            registrar_alteracao_salas()
+        db.session.commit()
+        self.sala_id = sala.id
+
+    def _serie(self, assunto, setor, hora):
+        serie = Serie(id=str(uuid.uuid4()), sala_id=self.sala_id, user_id=1, assunto=assunto,
+                      nome_solicitante='Fulano', setor=setor, telefone='0', frequencia='semanal', intervalo=1,
+                      dias_semana='0', hora_inicio=time(hora), hora_fim=time(hora + 1), data_inicio=SEGUNDA,
+                      data_fim=SEGUNDA + timedelta(weeks=3), excecoes='', materializado_ate=SEGUNDA)
+        criar_serie(serie, horizonte=SEGUNDA + timedelta(weeks=3))
+        return serie.id
+
+    def _cancelar(self, serie_id, semanas, hora):
+        for semana in semanas:
+            cancelar_ocorrencia(Reserva.query.filter_by(recorrencia_id=serie_id, inicio=datetime.combine(
+                SEGUNDA + timedelta(weeks=semana), time(hora))).one())
+        db.session.commit()
+
+    def _relatorio(self):
+        return relatorio_ocupacao(SEGUNDA, SEGUNDA + timedelta(weeks=4), 'semana', EXPEDIENTE)
+
+    def test_series_faltosas_sao_agrupadas_por_serie(self):
+        # Duas séries na mesma sala e setor: antes apareciam somadas em uma linha só
+        frequente = self._serie('Reunião semanal', 'TI', 9)
+        rara = self._serie('Treinamento', 'TI', 14)
+        self._cancelar(frequente, (1, 2, 3), 9)
+        self._cancelar(rara, (0,), 14)
+
+        faltosas = self._relatorio()['series_faltosas']
+        self.assertEqual([(item['serie'], item['assunto'], item['canceladas']) for item in faltosas],
+                         [(frequente, 'Reunião semanal', 3), (rara, 'Treinamento', 1)])
+        self.assertEqual([item['taxa'] for item in faltosas], [75, 25])
+        self.assertEqual(faltosas[0]['sala'], 'Sala Relatórios')
+
+        # A série apagada continua no relatório do período em que faltou
+        db.session.execute(db.delete(Reserva).where(Reserva.recorrencia_id == rara))
+        db.session.execute(db.delete(Serie).where(Serie.id == rara))
+        db.session.commit()
+        self.assertEqual(self._relatorio()['series_faltosas'][1]['assunto'], 'Série removida')
+
+    def test_participacao_dos_setores_nao_passa_de_100(self):
+        inicio = datetime.combine(SEGUNDA, time(9))
+        for setor, horas in (('TI', 3), ('RH', 1)):
+            criar_reservas(self.sala_id, [(SEGUNDA, inicio, inicio + timedelta(hours=horas))],
+                           dict(user_id=1, assunto='Avulsa', nome_solicitante='Fulano', setor=setor, telefone='0',
+                                recorrencia_id=None, is_recorrente=False))
+            inicio += timedelta(hours=horas)
+        # Sobra de uma sala que já não existe no catálogo
+        db.session.add(OcupacaoHora(data=SEGUNDA, hora=9, sala_id=self.sala_id + 1000, setor='TI', minutos=600,
+                                    reservas=1, recorrentes=0, canceladas=0))
+        db.session.commit()
+
+        relatorio = self._relatorio()
+        self.assertEqual([(item['setor'], item['participacao']) for item in relatorio['por_setor']],
+                         [('TI', 75), ('RH', 25)])
+        self.assertEqual(sum(item['horas'] for item in relatorio['por_setor']),
+                         sum(item['horas'] for item in relatorio['por_sala']))
+
+    def test_reconstrucao_refaz_o_agregado_das_series(self):
+        serie_id = self._serie('Reunião semanal', 'TI', 9)
+        agendadas = db.session.scalar(db.select(db.func.sum(OcupacaoSerie.recorrentes))
+                                      .where(OcupacaoSerie.recorrencia_id == serie_id))
+        db.session.execute(db.delete(OcupacaoSerie))
+        db.session.commit()
+        reconstruir_ocupacao()
+        self.assertEqual(db.session.scalar(db.select(db.func.sum(OcupacaoSerie.recorrentes))
+                                           .where(OcupacaoSerie.recorrencia_id == serie_id)), agendadas)
+        self.assertEqual(agendadas, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
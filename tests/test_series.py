@@ -0,0 +1,214 @@
+"""Séries recorrentes: regra, colisões, materialização e extensão sob demanda."""
+import unittest
+import uuid
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+from sqlalchemy.exc import OperationalError
+
+from apoio import CasoComBanco
+from app.models import db, AlteracaoCalendario, Reserva, Sala, Serie, Usuario
+from app.utils.recorrencia import Regra, ocorrencias, ocorrencias_entre
+from app.utils.reservas import (ConflitoReserva, TENTATIVAS_RESERVA, _colisoes, _gravar_com_tentativas,
+                                buscar_conflitos, cancelar_ocorrencia, cancelar_serie, criar_reservas, criar_serie,
+                                extensao_series, materializar_series)
+
+SEGUNDA = date(2030, 1, 7)
+
+
+class TesteRegra(unittest.TestCase):
+
+    def test_semanal_com_dias_e_intervalo(self):
+        regra = Regra('semanal', 2, ['0', '2'], SEGUNDA, SEGUNDA + timedelta(days=30))
+        self.assertEqual(list(regra.datas()), [date(2030, 1, 7), date(2030, 1, 9), date(2030, 1, 21),
+                                               date(2030, 1, 23), date(2030, 2, 4), date(2030, 2, 6)])
+        # Um período no meio salta direto para a semana certa da regra
+        self.assertEqual(list(regra.datas(de=date(2030, 1, 14), ate=date(2030, 1, 22))), [date(2030, 1, 21)])
+
+    def test_sem_dias_usa_o_dia_da_data_inicial(self):
+        quarta = date(2030, 1, 9)
+        self.assertEqual(Regra('semanal', 1, [], quarta, quarta + timedelta(days=7)).dias_semana, [2])
+
+    def test_mensal_limita_ao_ultimo_dia_do_mes(self):
+        regra = Regra('mensal', 1, [], date(2030, 1, 31), date(2030, 4, 30))
+        self.assertEqual(list(regra.datas()), [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31),
+                                               date(2030, 4, 30)])
+
+    def test_excecoes_ficam_fora(self):
+        semanas = [SEGUNDA + timedelta(weeks=i) for i in range(4)]
+        regra = Regra('semanal', 1, [0], SEGUNDA, semanas[-1], excecoes={semanas[1]})
+        self.assertEqual(list(regra.datas()), [semanas[0], semanas[2], semanas[3]])
+        self.assertEqual(regra.data_da_ocorrencia(2), semanas[2])
+        self.assertEqual(regra.data_da_ocorrencia(10), semanas[3])
+
+    def test_valores_invalidos(self):
+        for args in (('diaria', 1, [0]), ('semanal', 0, [0]), ('semanal', 1, ['7']), ('semanal', 1, ['1;2'])):
+            with self.subTest(args=args), self.assertRaises(ValueError):
+                Regra(*args, SEGUNDA, SEGUNDA + timedelta(days=7))
+        with self.assertRaises(ValueError):
+            Regra('semanal', 1, [0], SEGUNDA, SEGUNDA - timedelta(days=1))
+
+    def test_ocorrencia_que_atravessa_a_meia_noite(self):
+        regra = Regra('semanal', 1, [0], SEGUNDA, SEGUNDA + timedelta(weeks=1))
+        primeira = next(ocorrencias(regra, time(22), time(1)))
+        self.assertEqual(primeira, (SEGUNDA, datetime(2030, 1, 7, 22), datetime(2030, 1, 8, 1)))
+        # A ocorrência da segunda invade a madrugada de terça
+        terca = datetime(2030, 1, 8)
+        self.assertEqual(list(ocorrencias_entre(regra, time(22), time(1), terca, terca + timedelta(hours=2))),
+                         [primeira])
+        self.assertEqual(list(ocorrencias_entre(regra, time(22), time(1), terca + timedelta(hours=1),
+                                                terca + timedelta(hours=2))), [])
+
+
+class TesteColisoes(unittest.TestCase):
+
+    def test_fronteiras_e_ocupacoes_longas(self):
+        h = lambda hora: datetime(2030, 1, 7, hora)
+        ocupados = [(h(8), h(18)), (h(9), h(10))]
+        intervalos = [(h(7), h(8)), (h(12), h(13)), (h(18), h(19)), (h(17), h(19))]
+        # A ocupação longa (8h-18h) cobre 12h-13h mesmo começando antes da de 9h-10h
+        self.assertEqual(_colisoes(ocupados, intervalos), {1, 3})
+        self.assertEqual(_colisoes([], intervalos), set())
+
+
+class TesteGravacaoComTentativas(CasoComBanco):
+
+    def test_repete_conflitos_de_concorrencia(self):
+        bloqueado = OperationalError('INSERT ...', {}, Exception('database is locked'))
+        gravar = mock.Mock(side_effect=[bloqueado, 'gravado'])
+        self.assertEqual(_gravar_com_tentativas(gravar), 'gravado')
+        self.assertEqual(gravar.call_count, 2)
+
+        gravar = mock.Mock(side_effect=bloqueado)
+        with self.assertRaises(ConflitoReserva):
+            _gravar_com_tentativas(gravar)
+        self.assertEqual(gravar.call_count, TENTATIVAS_RESERVA)
+
+    def test_outros_erros_nao_sao_repetidos(self):
+        gravar = mock.Mock(side_effect=OperationalError('INSERT ...', {}, Exception('no such table')))
+        with self.assertRaises(OperationalError):
+            _gravar_com_tentativas(gravar)
+        self.assertEqual(gravar.call_count, 1)
+
+
+class TesteMaterializacao(CasoComBanco):
+
+    def setUp(self):
+        super().setUp()
+        db.session.execute(db.delete(Reserva))
+        db.session.execute(db.delete(Serie))
+        sala = Sala.query.filter_by(nome='Sala Séries').first() or Sala(nome='Sala Séries')
+        db.session.add(sala)
+        db.session.commit()
+        self.sala_id = sala.id
+
+    def _serie(self, semanas, hora=9):
+        return Serie(id=str(uuid.uuid4()), sala_id=self.sala_id, user_id=1, assunto='Semanal',
+                     nome_solicitante='Fulano', setor='TI', telefone='0', frequencia='semanal', intervalo=1,
+                     dias_semana='0', hora_inicio=time(hora), hora_fim=time(hora + 1), data_inicio=SEGUNDA,
+                     data_fim=SEGUNDA + timedelta(weeks=semanas - 1), excecoes='', materializado_ate=SEGUNDA)
+
+    def _reservar(self, dia, hora=9):
+        inicio = datetime.combine(dia, time(hora))
+        return criar_reservas(self.sala_id, [(dia, inicio, inicio + timedelta(hours=1))],
+                              dict(user_id=1, assunto='Avulsa', nome_solicitante='Fulano', setor='TI', telefone='0',
+                                   recorrencia_id=None, is_recorrente=False))
+
+    def _datas_gravadas(self, serie_id):
+        return [inicio.date() for inicio in db.session.scalars(
+            db.select(Reserva.inicio).where(Reserva.recorrencia_id == serie_id).order_by(Reserva.inicio))]
+
+    def test_conflitos_viram_excecoes_e_so_o_horizonte_e_materializado(self):
+        self._reservar(SEGUNDA + timedelta(weeks=1))
+        serie = self._serie(semanas=6)
+        lista, conflitos = criar_serie(serie, horizonte=SEGUNDA + timedelta(weeks=2))
+        self.assertEqual(len(lista), 6)
+        self.assertEqual(conflitos, {1})
+
+        serie = db.session.get(Serie, serie.id)
+        self.assertEqual(serie.excecoes, (SEGUNDA + timedelta(weeks=1)).isoformat())
+        self.assertEqual(serie.materializado_ate, SEGUNDA + timedelta(weeks=2))
+        self.assertEqual(self._datas_gravadas(serie.id), [SEGUNDA, SEGUNDA + timedelta(weeks=2)])
+
+        # As ocorrências ainda não materializadas já ocupam a sala
+        inicio = datetime.combine(SEGUNDA + timedelta(weeks=4), time(9, 30))
+        self.assertEqual(buscar_conflitos(self.sala_id, [(inicio, inicio + timedelta(hours=1))]), {0})
+        _, recusadas = self._reservar(SEGUNDA + timedelta(weeks=4))
+        self.assertEqual(recusadas, {0})
+
+    def test_materializar_e_idempotente_e_respeita_excecoes(self):
+        serie = self._serie(semanas=6)
+        criar_serie(serie, horizonte=SEGUNDA)
+        serie_id = serie.id
+        self.assertEqual(materializar_series(SEGUNDA + timedelta(weeks=2)), 2)
+        self.assertEqual(materializar_series(SEGUNDA + timedelta(weeks=2)), 0)
+
+        # Ocorrência cancelada avulsa vira exceção e não volta na próxima extensão
+        segunda = Reserva.query.filter_by(recorrencia_id=serie_id, inicio=datetime.combine(
+            SEGUNDA + timedelta(weeks=1), time(9))).one()
+        cancelar_ocorrencia(segunda)
+        db.session.commit()
+        self.assertEqual(materializar_series(SEGUNDA + timedelta(weeks=10)), 3)
+        self.assertEqual(self._datas_gravadas(serie_id),
+                         [SEGUNDA + timedelta(weeks=semana) for semana in (0, 2, 3, 4, 5)])
+        self.assertEqual(db.session.get(Serie, serie_id).materializado_ate, SEGUNDA + timedelta(weeks=5))
+
+    def _ocorrencia(self, serie_id, semana):
+        return Reserva.query.filter_by(recorrencia_id=serie_id, inicio=datetime.combine(
+            SEGUNDA + timedelta(weeks=semana), time(9))).one()
+
+    def test_cancelar_futuras_encerra_a_regra_na_vespera(self):
+        serie = self._serie(semanas=4)
+        criar_serie(serie, horizonte=SEGUNDA + timedelta(weeks=3))
+        serie_id = serie.id
+        self.assertEqual(cancelar_serie(serie_id, a_partir_de=self._ocorrencia(serie_id, 2).inicio), 2)
+        db.session.commit()
+        serie = db.session.get(Serie, serie_id)
+        self.assertEqual(serie.data_fim, SEGUNDA + timedelta(weeks=2) - timedelta(days=1))
+        self.assertEqual(self._datas_gravadas(serie_id), [SEGUNDA, SEGUNDA + timedelta(weeks=1)])
+
+    def test_cancelar_futuras_sem_datas_restantes_apaga_a_serie(self):
+        serie = self._serie(semanas=4)
+        criar_serie(serie, horizonte=SEGUNDA + timedelta(weeks=3))
+        serie_id = serie.id
+        # A única data antes do corte já era uma exceção
+        cancelar_ocorrencia(self._ocorrencia(serie_id, 0))
+        db.session.commit()
+        self.assertEqual(cancelar_serie(serie_id, a_partir_de=self._ocorrencia(serie_id, 1).inicio), 3)
+        db.session.commit()
+        self.assertIsNone(db.session.get(Serie, serie_id))
+        self.assertEqual(self._datas_gravadas(serie_id), [])
+        ultima = AlteracaoCalendario.query.order_by(AlteracaoCalendario.id.desc()).first()
+        self.assertEqual((ultima.uid, ultima.removido), (f'serie-{serie_id}', True))
+
+    def test_serie_toda_em_conflito_nao_e_gravada(self):
+        self._reservar(SEGUNDA)
+        serie = self._serie(semanas=1)
+        _, conflitos = criar_serie(serie, horizonte=SEGUNDA)
+        self.assertEqual(conflitos, {0})
+        db.session.rollback()
+        self.assertIsNone(db.session.get(Serie, serie.id))
+
+
+class TesteExtensaoSeries(CasoComBanco):
+
+    def setUp(self):
+        super().setUp()
+        extensao_series._proxima = 0.0
+
+    def test_falha_na_extensao_nao_derruba_a_requisicao(self):
+        erro = OperationalError('UPDATE serie ...', {}, Exception('lock timeout'))
+        with mock.patch('app.utils.reservas.materializar_series', side_effect=erro) as materializar, \
+                self.assertLogs('app.utils.reservas', 'ERROR'):
+            resposta = self.app.test_client().get('/login')
+        self.assertEqual(resposta.status_code, 200)
+        materializar.assert_called_once()
+        # A sessão segue utilizável e a próxima tentativa fica para o próximo intervalo
+        self.assertIsNotNone(db.session.scalar(db.select(Usuario.id).where(Usuario.username == 'admin')))
+        with mock.patch('app.utils.reservas.materializar_series') as materializar:
+            self.app.test_client().get('/login')
+        materializar.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
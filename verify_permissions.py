@@ -1,5 +1,7 @@
+import re
 import requests
 import sys
+from datetime import date, timedelta
 
 BASE_URL = "http://127.0.0.1:5000"
 
@@ -11,7 +13,7 @@ def run_tests():
 
     # 1. Login as Admin
     log("Logging in as Admin...")
-    r = s.post(f"{BASE_URL}/login", data={"username": "admin", "senha": "admin"})
+    r = s.post(f"{BASE_URL}/login", data={"username": "admin", "password": "admin123"})
     if r.url == f"{BASE_URL}/":
         log("Admin login successful.")
     else:
@@ -27,9 +29,16 @@ def run_tests():
         log(f"Admin failed to access /salas. Status: {r.status_code}")
         sys.exit(1)
 
+    # Ensure there is a room to book (duplicate names are rejected with a flash message)
+    s.post(f"{BASE_URL}/salas", data={"action": "create", "nome": "Sala Teste", "andar": "4º Andar"})
+    sala = re.search(r'<option value="(\d+)"', s.get(f"{BASE_URL}/reservar").text)
+    if not sala:
+        log("No room available to book.")
+        sys.exit(1)
+
     # 3. Create a normal user
     log("Creating normal user 'usuario_teste'...")
-    r = s.post(f"{BASE_URL}/usuarios", data={"username": "usuario_teste", "senha": "123", "is_admin": ""}) # Checkbox not sent is empty
+    r = s.post(f"{BASE_URL}/usuarios", data={"action": "create", "username": "usuario_teste", "password": "123", "is_admin": "false"})
     if r.status_code == 200:
         log("User creation request sent.")
     else:
@@ -41,34 +50,33 @@ def run_tests():
 
     # 5. Login as Normal User
     log("Logging in as 'usuario_teste'...")
-    r = s.post(f"{BASE_URL}/login", data={"username": "usuario_teste", "senha": "123"})
+    r = s.post(f"{BASE_URL}/login", data={"username": "usuario_teste", "password": "123"})
     if r.url == f"{BASE_URL}/":
         log("User login successful.")
     else:
         log(f"User login failed. URL: {r.url}")
         sys.exit(1)
 
-    # 6. Check Normal User Access to /salas (Should fail/redirect)
+    # 6. Check Normal User Access to /salas (Should fail with 403)
     log("Checking User access to /salas (Should be denied)...")
     r = s.get(f"{BASE_URL}/salas")
-    # My code redirects to dashboard with 200 OK (render template) or 302. requests follows redirects by default.
-    # So the final URL should be dashboard, and maybe check content for "Acesso não autorizado" or just different content.
-    if r.url == f"{BASE_URL}/":
-        log("User denied access to /salas (Redirected to dashboard).")
+    # admin_required aborts with 403 Forbidden
+    if r.status_code == 403:
+        log("User denied access to /salas (403).")
     else:
-        log(f"User access check failed. URL: {r.url}")
-        #sys.exit(1) # Warning only, as it might stay on same page if flash error
+        log(f"User access check failed. Status: {r.status_code}")
+        sys.exit(1)
 
     # 7. Create Reservation as User
     log("Creating reservation as User...")
-    # Need a sala ID. Assuming sala with ID 1 exists (created by init_db).
+    data_reserva = (date.today() + timedelta(days=30)).isoformat()
     r = s.post(f"{BASE_URL}/reservar", data={
-        "sala_id": "1",
+        "sala_id": sala.group(1),
         "assunto": "Teste User",
         "nome_solicitante": "Teste",
         "setor": "TI",
         "telefone": "123",
-        "data": "2026-02-01",
+        "data": data_reserva,
         "hora_inicio": "10:00",
         "hora_fim": "11:00"
     })
@@ -79,10 +87,14 @@ def run_tests():
          log(f"Reservation creation failed. URL: {r.url}")
 
     # 8. Cancel own reservation (Should succeed)
-    # Need reservation ID. We can scrape it or just assume it's ID 1 if DB was clean.
-    # Let's try ID 1.
-    log("Cancelling own reservation (ID 1)...")
-    r = s.get(f"{BASE_URL}/cancelar/1")
+    # The reservation ID is scraped from the user's list, filtered by room and date
+    lista = s.get(f"{BASE_URL}/reservas", params={"sala_id": sala.group(1), "data": data_reserva}).text
+    cancelar = re.search(r'/cancelar/(\d+)', lista)
+    if not cancelar:
+        log("Created reservation not found in the list.")
+        sys.exit(1)
+    log(f"Cancelling own reservation (ID {cancelar.group(1)})...")
+    r = s.get(f"{BASE_URL}/cancelar/{cancelar.group(1)}")
     if "/reservas" in r.url:
         log("Cancellation request completed (Check messages for succeess).")
     else: